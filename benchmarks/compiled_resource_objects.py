@@ -0,0 +1,116 @@
+"""
+Compares building the primary resource objects of a list response the generic way (`serializer.data`, then
+`JSONRenderer.build_json_resource_obj` for every row) against the builder compiled for the serializer by
+`zc_common.remote_resource.compiler`, for pages of increasing size.
+
+The rows have five attributes, a foreign key and a many-to-many relation, and are loaded with `select_related()`
+and `prefetch_related()` up front so that only the building is timed.
+
+    python benchmarks/compiled_resource_objects.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# The renderers module takes the event client from the settings module
+os.environ['DJANGO_SETTINGS_MODULE'] = '__main__'
+event_client = None
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    INSTALLED_APPS=['django.contrib.contenttypes', 'zc_common'],
+    USE_TZ=True,
+    JSON_API_FORMAT_FIELD_NAMES='camelize',
+)
+django.setup()
+
+from django.db import connection, models  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework_json_api import serializers, utils  # noqa: E402
+from rest_framework_json_api.relations import ResourceRelatedField  # noqa: E402
+
+from zc_common.remote_resource.compiler import get_resource_builder  # noqa: E402
+from zc_common.remote_resource.renderers import JSONRenderer  # noqa: E402
+
+
+class Vendor(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'zc_common'
+
+
+class Tag(models.Model):
+    label = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'zc_common'
+
+
+class MenuItem(models.Model):
+    name = models.CharField(max_length=50)
+    description = models.CharField(max_length=200)
+    price = models.IntegerField()
+    is_available = models.BooleanField(default=True)
+    modified = models.DateTimeField()
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
+    tags = models.ManyToManyField(Tag)
+
+    class Meta:
+        app_label = 'zc_common'
+
+
+class MenuItemSerializer(serializers.ModelSerializer):
+    vendor = ResourceRelatedField(queryset=Vendor.objects.all())
+    tags = ResourceRelatedField(queryset=Tag.objects.all(), many=True)
+
+    class Meta:
+        model = MenuItem
+        fields = ('id', 'name', 'description', 'price', 'is_available', 'modified', 'vendor', 'tags')
+
+
+def create_rows(count):
+    with connection.schema_editor() as schema_editor:
+        for model in (Vendor, Tag, MenuItem):
+            schema_editor.create_model(model)
+
+    vendors = [Vendor.objects.create(name='Vendor {}'.format(i)) for i in range(10)]
+    tags = [Tag.objects.create(label='Tag {}'.format(i)) for i in range(5)]
+    for i in range(count):
+        menu_item = MenuItem.objects.create(
+            name='Menu item {}'.format(i), description='A description of menu item {}'.format(i), price=i * 100,
+            modified=timezone.now(), vendor=vendors[i % len(vendors)])
+        menu_item.tags.set(tags[:i % len(tags) + 1])
+
+
+def generic(menu_items):
+    serializer = MenuItemSerializer(menu_items, many=True, context={})
+    fields = utils.get_serializer_fields(serializer)
+    return [
+        JSONRenderer.build_json_resource_obj(fields, resource, resource_instance, 'MenuItem', serializer)
+        for resource, resource_instance in zip(serializer.data, menu_items)
+    ]
+
+
+def compiled(menu_items):
+    serializer = MenuItemSerializer(menu_items, many=True, context={})
+    return JSONRenderer.build_compiled_resources(get_resource_builder(serializer), menu_items, None)
+
+
+if __name__ == '__main__':
+    create_rows(1000)
+
+    print('{:>5} {:>14} {:>14} {:>8}'.format('rows', 'generic (ms)', 'compiled (ms)', 'ratio'))
+    for rows in (10, 100, 1000):
+        menu_items = list(MenuItem.objects.select_related('vendor').prefetch_related('tags').order_by('id')[:rows])
+        assert generic(menu_items) == compiled(menu_items)
+
+        generic_time = min(timeit.repeat(lambda: generic(menu_items), number=10, repeat=3)) / 10 * 1000
+        compiled_time = min(timeit.repeat(lambda: compiled(menu_items), number=10, repeat=3)) / 10 * 1000
+        print('{:>5} {:>14.2f} {:>14.2f} {:>8.1f}'.format(rows, generic_time, compiled_time,
+                                                          generic_time / compiled_time))
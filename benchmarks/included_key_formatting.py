@@ -0,0 +1,61 @@
+"""
+Compares formatting the keys of the included tree at every level of `extract_included` (how the renderer used to
+work) against formatting it once before encoding, for include paths of increasing depth (`a`, `a.b`, `a.b.c`...).
+
+Each level of the walk contributes `WIDTH` resource objects, as a to-many relation at every step of the path would.
+
+    python benchmarks/included_key_formatting.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from django.conf import settings  # noqa: E402
+
+settings.configure()
+
+from zc_common.remote_resource.utils import format_keys  # noqa: E402
+
+WIDTH = 50
+FORMAT_TYPE = 'camelize'
+
+
+def make_resource(level, position):
+    return {
+        'type': 'level_{}'.format(level),
+        'id': str(position),
+        'attributes': dict(('attribute_name_{}'.format(i), i) for i in range(10)),
+        'relationships': {
+            'child_resource': {'data': {'type': 'level_{}'.format(level + 1), 'id': str(position)}},
+        },
+    }
+
+
+def extract_included(level, depth, format_every_level):
+    included_data = [make_resource(level, position) for position in range(WIDTH)]
+    if level < depth:
+        included_data.extend(extract_included(level + 1, depth, format_every_level))
+
+    if format_every_level:
+        return format_keys(included_data, FORMAT_TYPE)
+    return included_data
+
+
+def format_every_level(depth):
+    return extract_included(1, depth, True)
+
+
+def format_once(depth):
+    return format_keys(extract_included(1, depth, False), FORMAT_TYPE)
+
+
+if __name__ == '__main__':
+    print('{:>5} {:>18} {:>14} {:>8}'.format('depth', 'every level (ms)', 'once (ms)', 'ratio'))
+    for depth in (1, 2, 4, 8, 16):
+        assert format_every_level(depth) == format_once(depth)
+
+        every_level = min(timeit.repeat(lambda: format_every_level(depth), number=10, repeat=3)) / 10 * 1000
+        once = min(timeit.repeat(lambda: format_once(depth), number=10, repeat=3)) / 10 * 1000
+        print('{:>5} {:>18.2f} {:>14.2f} {:>8.1f}'.format(depth, every_level, once, every_level / once))
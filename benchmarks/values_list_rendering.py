@@ -0,0 +1,126 @@
+"""
+Compares the rows per second of a read-only export built three ways, database fetch included:
+
+ * generic: model instances, `serializer.data`, then `JSONRenderer.build_json_resource_obj` for every row
+ * compiled: model instances, built by the builder compiled for the serializer
+ * values: `values_list()` rows, built by the builder compiled for them, so no model instances or
+   `RemoteResource`s are created
+
+The rows have five attributes, a foreign key and two remote foreign keys.
+
+    python benchmarks/values_list_rendering.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# The renderers module takes the event client from the settings module
+os.environ['DJANGO_SETTINGS_MODULE'] = '__main__'
+event_client = None
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    INSTALLED_APPS=['django.contrib.contenttypes', 'zc_common'],
+    USE_TZ=True,
+    JSON_API_FORMAT_FIELD_NAMES='camelize',
+    ALLOWED_HOSTS=['testserver'],
+)
+django.setup()
+
+from django.db import connection, models  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework_json_api import serializers, utils  # noqa: E402
+from rest_framework_json_api.relations import ResourceRelatedField  # noqa: E402
+
+from zc_common.remote_resource.compiler import get_resource_builder  # noqa: E402
+from zc_common.remote_resource.models import RemoteForeignKey, RemoteResource  # noqa: E402
+from zc_common.remote_resource.relations import RemoteResourceField  # noqa: E402
+from zc_common.remote_resource.renderers import JSONRenderer  # noqa: E402
+
+
+class Vendor(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'zc_common'
+
+
+class Order(models.Model):
+    title = models.CharField(max_length=50)
+    notes = models.CharField(max_length=200)
+    total = models.IntegerField()
+    is_paid = models.BooleanField(default=False)
+    modified = models.DateTimeField()
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
+    company = RemoteForeignKey('Company')
+    user = RemoteForeignKey('User')
+
+    class Meta:
+        app_label = 'zc_common'
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    vendor = ResourceRelatedField(queryset=Vendor.objects.all())
+    company = RemoteResourceField(related_resource_path='/companies/{pk}', read_only=True)
+    user = RemoteResourceField(related_resource_path='/users/{pk}', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'title', 'notes', 'total', 'is_paid', 'modified', 'vendor', 'company', 'user')
+
+
+def create_rows(count):
+    with connection.schema_editor() as schema_editor:
+        for model in (Vendor, Order):
+            schema_editor.create_model(model)
+
+    vendors = [Vendor.objects.create(name='Vendor {}'.format(i)) for i in range(10)]
+    Order.objects.bulk_create([
+        Order(title='Order {}'.format(i), notes='Notes on order {}'.format(i), total=i * 100, modified=timezone.now(),
+              vendor=vendors[i % len(vendors)], company=RemoteResource('Company', 'company{}'.format(i % 7)),
+              user=RemoteResource('User', 'user{}'.format(i)))
+        for i in range(count)
+    ])
+
+
+def generic(queryset, request):
+    orders = list(queryset)
+    serializer = OrderSerializer(orders, many=True, context={'request': request})
+    fields = utils.get_serializer_fields(serializer)
+    return [
+        JSONRenderer.build_json_resource_obj(fields, resource, resource_instance, 'Order', serializer)
+        for resource, resource_instance in zip(serializer.data, orders)
+    ]
+
+
+def compiled(queryset, request):
+    serializer = OrderSerializer(context={'request': request})
+    return JSONRenderer.build_compiled_resources(get_resource_builder(serializer), list(queryset), request)
+
+
+def values(queryset, request):
+    builder = get_resource_builder(OrderSerializer(context={'request': request}), values=True)
+    return JSONRenderer.build_compiled_resources(builder, list(queryset.values_list(*builder.values)), request)
+
+
+if __name__ == '__main__':
+    create_rows(5000)
+    request = Request(APIRequestFactory().get('/orders/'))
+
+    print('{:>5} {:>14} {:>14} {:>14}'.format('rows', 'generic (r/s)', 'compiled (r/s)', 'values (r/s)'))
+    for rows in (100, 1000, 5000):
+        queryset = Order.objects.order_by('id')[:rows]
+        assert generic(queryset, request) == compiled(queryset, request) == values(queryset, request)
+
+        rates = [
+            rows / min(timeit.repeat(lambda: build(queryset, request), number=3, repeat=3)) * 3
+            for build in (generic, compiled, values)
+        ]
+        print('{:>5} {:>14.0f} {:>14.0f} {:>14.0f}'.format(rows, *rates))
@@ -3,11 +3,16 @@ import unittest
 import django
 import datetime
 from django.conf import settings
+from django.core.management import call_command
 
 test_db = 'zc_common_test_db'
 
+# The renderer takes the event client from the package of the settings module, see tests/__init__.py
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+
 settings.configure(
     DEBUG=True,
+    ALLOWED_HOSTS=['testserver'],
     DATABASES={
         'default': {
             'NAME': test_db,
@@ -22,12 +27,21 @@ settings.configure(
     INSTALLED_APPS=[
         'zc_common',
         'tests',
-    ]
+    ],
+    REST_FRAMEWORK={
+        'DEFAULT_PARSER_CLASSES': ('zc_common.remote_resource.parsers.JSONParser',),
+        'DEFAULT_RENDERER_CLASSES': ('rest_framework_json_api.renderers.JSONRenderer',),
+        'DEFAULT_AUTHENTICATION_CLASSES': (),
+        'UNAUTHENTICATED_USER': None,
+    },
 
 )
 
 django.setup()
 
+# Creates the tables of the models in tests/models.py
+call_command('migrate', run_syncdb=True, verbosity=0)
+
 suite = unittest.TestLoader().discover('tests')
 runner = unittest.TextTestRunner(verbosity=2)
 runner.run(suite)
@@ -39,5 +39,9 @@ setup(
         'pytz>=2014.2',
         'python-dateutil>=2.7.3',
         'django-filter>=22.1',
-    ]
+    ],
+    extras_require={
+        # Incremental parsing of request bodies in `remote_resource.parsers.JSONParser`
+        'streaming': ['ijson>=3.1'],
+    },
 )
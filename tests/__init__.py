@@ -0,0 +1,2 @@
+# The event client that remote includes are requested with, which tests replace with a fake
+event_client = None
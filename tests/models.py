@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class Restaurant(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class Tag(models.Model):
+    label = models.CharField(max_length=50)
+
+
+class Order(models.Model):
+    title = models.CharField(max_length=50)
+    is_paid = models.BooleanField(default=False)
+    restaurant = models.ForeignKey(Restaurant, related_name='orders', on_delete=models.CASCADE)
+    # No related_name: the reverse relation is the `order` field, reached through `order_set`
+    tags = models.ManyToManyField(Tag, blank=True)
+    modified = models.DateTimeField(auto_now=True)
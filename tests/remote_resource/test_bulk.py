@@ -0,0 +1,190 @@
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import routers
+from rest_framework.exceptions import ErrorDetail
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource.viewsets import OrderViewSet, send
+from zc_common.remote_resource.bulk import get_error_objects
+from zc_common.remote_resource.fragment_cache import ResourceFragmentCache
+from zc_common.remote_resource.routers import BulkRouter
+
+
+class TestGetErrorObjects(TestCase):
+
+    def test_errors_point_at_their_resource_object(self):
+        errors = [
+            {},
+            {'first_name': [ErrorDetail('This field is required.', code='required')]},
+            {'non_field_errors': ['Invalid data.'], 'id': ['Not found.']},
+        ]
+
+        self.assertEqual(get_error_objects(errors), [
+            {'detail': 'This field is required.', 'status': '400', 'code': 'required',
+             'source': {'pointer': '/data/1/attributes/first_name'}},
+            {'detail': 'Invalid data.', 'status': '400', 'source': {'pointer': '/data/2'}},
+            {'detail': 'Not found.', 'status': '400', 'source': {'pointer': '/data/2/id'}},
+        ])
+
+    @override_settings(JSON_API_FORMAT_FIELD_NAMES='camelize')
+    def test_attribute_names_are_formatted(self):
+        error_objects = get_error_objects([{'first_name': ['Too long.', 'Not a name.']}])
+
+        self.assertEqual([error['source']['pointer'] for error in error_objects],
+                         ['/data/0/attributes/firstName', '/data/0/attributes/firstName'])
+
+
+def send_bulk(method, data, **attributes):
+    attributes.setdefault('bulk_writes', True)
+    return send(method, data, **attributes)
+
+
+def order_object(pk=None, **attributes):
+    resource = {'type': 'Order', 'attributes': attributes}
+    if pk is not None:
+        resource['id'] = str(pk)
+    return resource
+
+
+def pointers(response):
+    return [(error['source']['pointer'], str(error['detail'])) for error in response.data]
+
+
+class TestBulkWrites(TestCase):
+
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Cafe')
+        self.orders = [Order.objects.create(title='Order {}'.format(index), restaurant=self.restaurant)
+                       for index in range(3)]
+
+    def restaurant_linkage(self):
+        return {'restaurant': {'data': {'type': 'Restaurant', 'id': str(self.restaurant.pk)}}}
+
+    def test_create(self):
+        resources = [order_object(title='New {}'.format(index)) for index in range(2)]
+        for resource in resources:
+            resource['relationships'] = self.restaurant_linkage()
+
+        response = send_bulk('post', resources)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['title'] for item in response.data], ['New 0', 'New 1'])
+        self.assertEqual(Order.objects.filter(title__startswith='New').count(), 2)
+
+    def test_create_reports_the_errors_of_every_object(self):
+        valid = order_object(title='New')
+        valid['relationships'] = self.restaurant_linkage()
+        untitled = order_object()
+        untitled['relationships'] = self.restaurant_linkage()
+
+        response = send_bulk('post', [valid, untitled, order_object(title='No restaurant')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(pointers(response), [
+            ('/data/1/attributes/title', 'This field is required.'),
+            ('/data/2/attributes/restaurant', 'This field is required.'),
+        ])
+        self.assertFalse(Order.objects.filter(title='New').exists())
+
+    def test_update(self):
+        first, second, third = self.orders
+        tag = Tag.objects.create(label='Vegan')
+        Order.objects.update(modified=timezone.now() - timedelta(days=1))
+        resources = [order_object(first.pk, title='Renamed'), order_object(second.pk, is_paid=True)]
+        resources[1]['relationships'] = {'tags': {'data': [{'type': 'Tag', 'id': str(tag.pk)}]}}
+
+        with CaptureQueriesContext(connection) as context:
+            response = send_bulk('patch', resources)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('UPDATE "tests_order"')]), 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual((first.title, first.is_paid), ('Renamed', False))
+        self.assertEqual((second.title, second.is_paid), ('Order 1', True))
+        self.assertEqual(list(second.tags.all()), [tag])
+        # auto_now fields are brought up to date, as save() would
+        self.assertGreater(first.modified, third.modified)
+        self.assertGreater(second.modified, third.modified)
+
+    def test_update_reports_missing_and_duplicate_ids(self):
+        first, second, _ = self.orders
+        response = send_bulk('patch', [
+            order_object(first.pk, title='Renamed'),
+            order_object(first.pk, title='Again'),
+            order_object(0, title='Missing'),
+            order_object(title='No id'),
+            order_object('abc', title='Invalid'),
+            order_object(second.pk, title=''),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(pointers(response), [
+            ('/data/1/id', 'Duplicate id "{}".'.format(first.pk)),
+            ('/data/2/id', 'Not found.'),
+            ('/data/3/id', 'This field is required.'),
+            ('/data/4/id', 'Invalid id "abc".'),
+            ('/data/5/attributes/title', 'This field may not be blank.'),
+        ])
+        self.assertFalse(Order.objects.filter(title='Renamed').exists())
+
+    @override_settings(RESOURCE_FRAGMENT_CACHE_TIMEOUT=60)
+    def test_update_invalidates_cached_fragments(self):
+        first, second, _ = self.orders
+        cache = caches['default']
+        version_keys = [ResourceFragmentCache.version_key('tests.Order', order.pk) for order in self.orders]
+        cache.set_many(dict((key, 'cached') for key in version_keys))
+
+        send_bulk('patch', [order_object(first.pk, title='Renamed'), order_object(second.pk, title='Renamed')])
+
+        self.assertEqual([cache.get(key) == 'cached' for key in version_keys], [False, False, True])
+
+    def test_destroy(self):
+        first, second, third = self.orders
+
+        response = send_bulk('delete', [{'type': 'Order', 'id': str(order.pk)} for order in (first, third)])
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Order.objects.all()), [second])
+
+    def test_destroy_deletes_nothing_if_an_object_is_missing(self):
+        response = send_bulk('delete', [{'type': 'Order', 'id': str(self.orders[0].pk)}, {'type': 'Order', 'id': '0'}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(pointers(response), [('/data/1/id', 'Not found.')])
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_bulk_writes_are_off_by_default(self):
+        response = send('patch', [order_object(self.orders[0].pk, title='Renamed')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.filter(title='Renamed').exists())
+
+    def test_too_many_objects(self):
+        response = send_bulk('patch', [order_object(order.pk, title='Renamed') for order in self.orders],
+                             bulk_max_items=2)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.filter(title='Renamed').exists())
+
+
+class TestBulkRouter(TestCase):
+
+    def get_actions(self, router):
+        router.register('orders', OrderViewSet)
+        return dict((url.name, url.callback.actions) for url in router.urls if hasattr(url.callback, 'actions'))
+
+    def test_collection_routes(self):
+        actions = self.get_actions(BulkRouter())
+
+        self.assertEqual(actions['order-list'], {
+            'get': 'list', 'post': 'create', 'patch': 'bulk_update', 'delete': 'bulk_destroy'})
+        self.assertNotIn('patch', routers.DefaultRouter.routes[0].mapping)
+        self.assertEqual(actions['order-detail'], self.get_actions(routers.DefaultRouter())['order-detail'])
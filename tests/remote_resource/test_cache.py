@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from zc_common.remote_resource.cache import (
+    RemoteIncludeCache, get_remote_include_cache, group_by_primary_resource, invalidate_remote_resource)
+
+
+def resource(type_name, pk, **relationships):
+    obj = {'type': type_name, 'id': pk, 'attributes': {}}
+    if relationships:
+        obj['relationships'] = dict((name, {'data': data}) for name, data in relationships.items())
+    return obj
+
+
+class TestRemoteIncludeCache(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = RemoteIncludeCache(timeout=60)
+
+    def test_get_many_returns_only_cached_keys(self):
+        self.cache.set_many('Company', {'1': [resource('Company', '1')]}, '', ['user'])
+
+        cached = self.cache.get_many('Company', ['1', '2'], '', ['user'])
+
+        self.assertEqual(cached, {'1': [resource('Company', '1')]})
+
+    def test_entries_are_keyed_by_include_and_roles(self):
+        self.cache.set_many('Company', {'1': [resource('Company', '1')]}, '', ['user'])
+
+        self.assertEqual(self.cache.get_many('Company', ['1'], 'address', ['user']), {})
+        self.assertEqual(self.cache.get_many('Company', ['1'], '', ['user', 'staff']), {})
+        self.assertEqual(len(self.cache.get_many('Company', ['1'], '', ['user'])), 1)
+
+    def test_invalidate_single_resource(self):
+        self.cache.set_many('Company', {'1': [resource('Company', '1')], '2': [resource('Company', '2')]}, '', [])
+
+        self.cache.invalidate('Company', 1)
+
+        self.assertEqual(list(self.cache.get_many('Company', ['1', '2'], '', [])), ['2'])
+
+    def test_invalidate_whole_type(self):
+        self.cache.set_many('Company', {'1': [resource('Company', '1')]}, 'address', [])
+        self.cache.set_many('User', {'1': [resource('User', '1')]}, '', [])
+
+        self.cache.invalidate('Company')
+
+        self.assertEqual(self.cache.get_many('Company', ['1'], 'address', []), {})
+        self.assertEqual(len(self.cache.get_many('User', ['1'], '', [])), 1)
+
+    def test_disabled_without_timeout(self):
+        self.assertIsNone(get_remote_include_cache())
+        # Nothing to invalidate, but it must not fail either
+        invalidate_remote_resource('Company', '1')
+
+    @override_settings(REMOTE_INCLUDE_CACHE_TIMEOUT=60)
+    def test_invalidate_remote_resource_uses_configured_cache(self):
+        self.cache.set_many('Company', {'1': [resource('Company', '1')]}, '', [])
+
+        invalidate_remote_resource('Company', '1')
+
+        self.assertEqual(self.cache.get_many('Company', ['1'], '', []), {})
+
+
+class TestGroupByPrimaryResource(TestCase):
+
+    def test_groups_included_objects_reachable_from_each_resource(self):
+        address = resource('Address', '10')
+        owner = resource('User', '20', address={'type': 'Address', 'id': '10'})
+        unrelated = resource('User', '30')
+        first = resource('Company', '1', owner={'type': 'User', 'id': '20'})
+        second = resource('Company', '2', owner=None, employees=[{'type': 'User', 'id': '30'}])
+
+        grouped = group_by_primary_resource([first, second], [address, owner, unrelated])
+
+        self.assertEqual(grouped['1'], [first, owner, address])
+        self.assertEqual(grouped['2'], [second, unrelated])
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+import mock
+from django.test import override_settings
+
+from zc_common.remote_resource import circuit_breaker
+from zc_common.remote_resource.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_circuit_breaker
+
+
+@mock.patch.object(circuit_breaker, 'statsd')
+@mock.patch.object(circuit_breaker.time, 'time', return_value=100.0)
+class TestCircuitBreaker(TestCase):
+
+    def test_opens_after_consecutive_failures(self, now, statsd):
+        breaker = CircuitBreaker('company', failure_threshold=2, reset_timeout=30)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow_request())
+        statsd.incr.assert_called_once_with('remote_include_breaker.company.open')
+
+    def test_half_open_allows_a_single_trial(self, now, statsd):
+        breaker = CircuitBreaker('company', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+
+        now.return_value = 130.0
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_trial_opens_again(self, now, statsd):
+        breaker = CircuitBreaker('company', failure_threshold=3, reset_timeout=30)
+        for _ in range(3):
+            breaker.record_failure()
+
+        now.return_value = 130.0
+        breaker.allow_request()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+        now.return_value = 159.0
+        self.assertFalse(breaker.allow_request())
+
+    def test_zero_threshold_disables_breaker(self, now, statsd):
+        breaker = CircuitBreaker('company', failure_threshold=0)
+
+        for _ in range(10):
+            breaker.record_failure()
+
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(statsd.mock_calls, [])
+
+
+class TestGetCircuitBreaker(TestCase):
+
+    def tearDown(self):
+        circuit_breaker.breakers.clear()
+
+    @override_settings(REMOTE_INCLUDE_BREAKER_FAILURE_THRESHOLD=3, REMOTE_INCLUDE_BREAKER_RESET_TIMEOUT=10)
+    def test_one_breaker_per_resource_type(self):
+        breaker = get_circuit_breaker('company')
+
+        self.assertIs(get_circuit_breaker('company'), breaker)
+        self.assertIsNot(get_circuit_breaker('user'), breaker)
+        self.assertEqual((breaker.failure_threshold, breaker.reset_timeout), (3, 10))
@@ -0,0 +1,204 @@
+from unittest import skipIf
+
+import mock
+import ujson
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers as drf_serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_json_api import utils
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource.viewsets import list_orders
+from tests.serializers import OrderSerializer, TagSerializer
+from zc_common.remote_resource.compiler import get_resource_builder
+from zc_common.remote_resource.fieldsets import restrict_to_sparse_fieldset
+from zc_common.remote_resource.pagination import PageNumberPagination
+
+try:
+    from zc_common.remote_resource import renderers
+except ImportError:  # zc_events isn't installed
+    renderers = None
+
+
+class OrderSummarySerializer(OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        fields = ('id', 'title', 'is_paid', 'restaurant', 'modified')
+
+
+class OrderTitleSerializer(OrderSummarySerializer):
+    title = drf_serializers.SerializerMethodField()
+
+    def get_title(self, order):
+        return order.title.upper()
+
+
+class OrderUpperSerializer(OrderSummarySerializer):
+    def to_representation(self, instance):
+        representation = super(OrderUpperSerializer, self).to_representation(instance)
+        representation['title'] = representation['title'].upper()
+        return representation
+
+
+class OrderCopySerializer(OrderSummarySerializer):
+    copy = drf_serializers.CharField(source='*', read_only=True)
+
+    class Meta(OrderSummarySerializer.Meta):
+        fields = OrderSummarySerializer.Meta.fields + ('copy',)
+
+
+def render(query_string, **attributes):
+    with CaptureQueriesContext(connection) as context:
+        response = list_orders(query_string, renderer_classes=(renderers.JSONRenderer,), **attributes)
+        document = ujson.loads(response.render().content)
+    return document, len(context.captured_queries)
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestRenderFromValues(TestCase):
+
+    def setUp(self):
+        restaurants = [Restaurant.objects.create(name=name) for name in ('Cafe', 'Diner')]
+        tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        for index, title in enumerate(('Soup', 'Salad', 'Curry', 'Pie', 'Rice')):
+            order = Order.objects.create(title=title, is_paid=index % 2 == 0, restaurant=restaurants[index % 2])
+            order.tags.set(tags[:index % 3])
+
+    def assertRenderedLikeInstances(self, query_string='', **attributes):
+        """
+        Renders the list from `values_list()` rows, checking that no model instance was created, and returns the
+        document once compared with the one rendered from model instances.
+        """
+        with mock.patch.object(Order, 'from_db', wraps=Order.from_db) as from_db:
+            document, queries = render(query_string, render_from_values=True, **attributes)
+
+        self.assertEqual(from_db.call_count, 0)
+        self.assertEqual((document, queries), render(query_string, **attributes))
+        return document
+
+    def test_rows_are_rendered_without_instances(self):
+        document = self.assertRenderedLikeInstances(serializer_class=OrderSummarySerializer)
+
+        self.assertEqual([resource['attributes']['title'] for resource in document['data']],
+                         ['Soup', 'Salad', 'Curry', 'Pie', 'Rice'])
+        self.assertEqual(document['data'][1]['relationships']['restaurant']['data'],
+                         {'type': 'Restaurant', 'id': str(Restaurant.objects.get(name='Diner').pk)})
+
+    def test_pages(self):
+        document = self.assertRenderedLikeInstances(
+            'page_size=2&page=2', serializer_class=OrderSummarySerializer, pagination_class=PageNumberPagination)
+
+        self.assertEqual([resource['attributes']['title'] for resource in document['data']], ['Curry', 'Pie'])
+        self.assertEqual(document['meta']['pagination']['count'], 5)
+
+    def test_sparse_fieldsets(self):
+        with CaptureQueriesContext(connection) as context:
+            document = self.assertRenderedLikeInstances('fields[Order]=title', serializer_class=OrderSummarySerializer)
+
+        self.assertEqual(document['data'][0], {'type': 'Order', 'id': document['data'][0]['id'],
+                                               'attributes': {'title': 'Soup'}})
+        self.assertNotIn('"is_paid"', context.captured_queries[0]['sql'])
+
+    def test_to_many_relations_fall_back_to_instances(self):
+        build = mock.Mock(wraps=renderers.JSONRenderer.build_compiled_resources)
+
+        with mock.patch.object(renderers.JSONRenderer, 'build_compiled_resources', build):
+            document, queries = render('', serializer_class=OrderSerializer, render_from_values=True)
+
+        # Built by the builder compiled for model instances, rather than serialized
+        self.assertEqual(build.call_count, 1)
+        self.assertIsNone(build.call_args[0][0].values)
+        self.assertIsInstance(build.call_args[0][1][0], Order)
+        self.assertEqual((document, queries), render('', serializer_class=OrderSerializer))
+        self.assertEqual([len(resource['relationships']['tags']['data']) for resource in document['data']],
+                         [0, 1, 2, 0, 1])
+
+    def test_method_fields_fall_back_to_serializing(self):
+        with mock.patch.object(renderers.JSONRenderer, 'build_compiled_resources') as build:
+            document, queries = render('', serializer_class=OrderTitleSerializer, render_from_values=True)
+
+        self.assertEqual(build.call_count, 0)
+        self.assertEqual((document, queries), render('', serializer_class=OrderTitleSerializer))
+        self.assertEqual(document['data'][0]['attributes']['title'], 'SOUP')
+
+
+def set_up_orders():
+    restaurant = Restaurant.objects.create(name='Cafe')
+    tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+    for index, title in enumerate(('Soup', 'Salad', 'Curry')):
+        Order.objects.create(title=title, is_paid=index == 1, restaurant=restaurant).tags.set(tags[:index])
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestResourceBuilders(TestCase):
+
+    def setUp(self):
+        set_up_orders()
+        self.request = Request(APIRequestFactory().get('/orders/'))
+
+    def assertBuiltLikeSerializer(self, fieldsets=None):
+        instances = list(Order.objects.order_by('id'))
+        serializer = OrderSerializer(instances, many=True)
+        if fieldsets is not None:
+            restrict_to_sparse_fieldset(serializer, None, fieldsets=fieldsets)
+        builder = get_resource_builder(serializer)
+
+        fields = utils.get_serializer_fields(serializer.child)
+        self.assertIsNotNone(builder)
+        self.assertEqual(
+            [builder(instance, self.request) for instance in instances],
+            [renderers.JSONRenderer.build_json_resource_obj(fields, resource, instance, 'Order')
+             for resource, instance in zip(serializer.data, instances)])
+        return builder
+
+    def test_builders_match_generic_rendering(self):
+        self.assertBuiltLikeSerializer()
+
+    def test_sparse_fieldsets(self):
+        builder = self.assertBuiltLikeSerializer({'Order': frozenset(['title', 'tags'])})
+
+        self.assertNotIn('is_paid', builder.source)
+
+    @override_settings(JSON_API_FORMAT_FIELD_NAMES='dasherize')
+    def test_formatted_field_names(self):
+        builder = self.assertBuiltLikeSerializer()
+
+        self.assertIn('is-paid', builder.source)
+
+    def test_values_builders_match_instance_builders(self):
+        serializer = OrderSummarySerializer()
+        instance_builder = get_resource_builder(serializer)
+        values_builder = get_resource_builder(serializer, values=True)
+
+        rows = Order.objects.order_by('id').values_list(*values_builder.values)
+        self.assertEqual([values_builder(row, self.request) for row in rows],
+                         [instance_builder(instance, self.request) for instance in Order.objects.order_by('id')])
+
+    def test_builders_are_kept_per_serializer_class_and_fields(self):
+        builder = get_resource_builder(OrderSerializer())
+
+        self.assertIs(get_resource_builder(OrderSerializer(many=True)), builder)
+        self.assertIsNot(get_resource_builder(OrderSummarySerializer()), builder)
+        self.assertIsNot(get_resource_builder(OrderSerializer(), values=True), builder)
+
+
+class TestUncompilableSerializers(TestCase):
+
+    def test_method_fields(self):
+        self.assertIsNone(get_resource_builder(OrderTitleSerializer()))
+
+    def test_own_to_representation(self):
+        self.assertIsNone(get_resource_builder(OrderUpperSerializer()))
+
+    def test_fields_reading_the_whole_object(self):
+        self.assertIsNone(get_resource_builder(OrderCopySerializer()))
+
+    def test_to_many_relations_in_values_mode(self):
+        self.assertIsNone(get_resource_builder(OrderSerializer(), values=True))
+        self.assertIsNotNone(get_resource_builder(OrderSerializer()))
+
+    def test_plain_serializers(self):
+        self.assertIsNotNone(get_resource_builder(TagSerializer()))
+        self.assertIsNone(get_resource_builder(drf_serializers.Serializer()))
@@ -0,0 +1,150 @@
+from unittest import skipIf
+
+import mock
+import ujson
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers as drf_serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource.viewsets import get_list_view, list_orders
+from tests.serializers import OrderSerializer
+from zc_common.remote_resource import fieldsets
+from zc_common.remote_resource.fieldsets import get_only_fields, get_sparse_fieldsets, restrict_to_sparse_fieldset
+
+try:
+    from zc_common.remote_resource import renderers
+except ImportError:  # zc_events isn't installed
+    renderers = None
+
+
+class OrderTitleSerializer(OrderSerializer):
+    title = drf_serializers.SerializerMethodField()
+
+    def get_title(self, order):
+        return order.title.upper()
+
+
+def make_request(query_string):
+    return Request(APIRequestFactory().get('/orders/?' + query_string))
+
+
+class TestGetSparseFieldsets(TestCase):
+
+    def test_fieldsets(self):
+        request = make_request('fields[Order]=title, isPaid,&fields[Tag]=&include=tags')
+
+        self.assertEqual(get_sparse_fieldsets(request), {'Order': {'title', 'is_paid'}, 'Tag': frozenset()})
+        self.assertEqual(get_sparse_fieldsets(make_request('include=tags')), {})
+
+
+class TestRestrictToSparseFieldset(TestCase):
+
+    def test_fields_outside_the_fieldset_are_removed(self):
+        serializer = restrict_to_sparse_fieldset(OrderSerializer(), make_request('fields[Order]=title'))
+
+        self.assertEqual(list(serializer.fields), ['id', 'title'])
+        self.assertEqual(serializer.sparse_fieldset, {'title'})
+
+    def test_relations_to_include_are_kept(self):
+        serializer = restrict_to_sparse_fieldset(
+            OrderSerializer(many=True), make_request('fields[Order]=title'), ['restaurant', 'tags.order'])
+
+        self.assertEqual(sorted(serializer.fields), ['id', 'restaurant', 'tags', 'title'])
+        self.assertEqual(serializer.sparse_fieldset, {'title'})
+
+    def test_other_types_are_left_alone(self):
+        serializer = restrict_to_sparse_fieldset(OrderSerializer(), make_request('fields[Tag]=label'))
+
+        self.assertEqual(len(serializer.fields), 6)
+        self.assertFalse(hasattr(serializer, 'sparse_fieldset'))
+
+    def test_parsed_fieldsets(self):
+        serializer = restrict_to_sparse_fieldset(OrderSerializer(), None, fieldsets={'Order': frozenset(['tags'])})
+
+        self.assertEqual(list(serializer.fields), ['id', 'tags'])
+
+
+class TestGetOnlyFields(TestCase):
+
+    def test_columns_read_by_the_fields(self):
+        self.assertEqual(get_only_fields(Order, OrderSerializer()),
+                         ['id', 'is_paid', 'modified', 'restaurant', 'title'])
+
+    def test_relations_without_a_column(self):
+        serializer = restrict_to_sparse_fieldset(OrderSerializer(many=True), make_request('fields[Order]=title,tags'))
+
+        self.assertEqual(get_only_fields(Order, serializer), ['id', 'title'])
+
+    def test_fields_that_read_more_than_a_column(self):
+        self.assertIsNone(get_only_fields(Order, OrderTitleSerializer()))
+
+        serializer = OrderSerializer()
+        serializer.fields['summary'] = drf_serializers.CharField(source='get_summary')
+        self.assertIsNone(get_only_fields(Order, serializer))
+
+
+class TestDeferFields(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        tag = Tag.objects.create(label='Vegan')
+        for title in ('Soup', 'Salad'):
+            Order.objects.create(title=title, restaurant=restaurant).tags.set([tag])
+
+    def test_only_requested_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as context:
+            response = list_orders('fields[Order]=title')
+
+        self.assertEqual([dict(order) for order in response.data], [{'title': 'Soup'}, {'title': 'Salad'}])
+        self.assertNotIn('"is_paid"', context.captured_queries[0]['sql'])
+        self.assertIn('"title"', context.captured_queries[0]['sql'])
+
+    def test_queryset_narrowed_to_the_fieldset(self):
+        queryset = get_list_view('fields[Order]=title').defer_fields(Order.objects.all())
+
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'title'}, False))
+
+    def test_followed_foreign_keys_are_kept(self):
+        queryset = get_list_view('fields[Order]=title').defer_fields(Order.objects.select_related('restaurant'))
+
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'title', 'restaurant'}, False))
+
+    def test_columns_chosen_by_the_view_are_kept(self):
+        queryset = Order.objects.only('title', 'is_paid')
+
+        self.assertIs(get_list_view('fields[Order]=title').defer_fields(queryset), queryset)
+
+    def test_without_a_fieldset(self):
+        queryset = Order.objects.all()
+
+        self.assertIs(get_list_view('fields[Tag]=label').defer_fields(queryset), queryset)
+        view = get_list_view('fields[Order]=title', serializer_class=OrderTitleSerializer)
+        self.assertIs(view.defer_fields(queryset), queryset)
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestIncludedFieldsets(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        for title in ('Soup', 'Salad', 'Curry'):
+            Order.objects.create(title=title, restaurant=restaurant).tags.set(tags)
+
+    def test_fieldsets_are_parsed_once_per_render(self):
+        response = list_orders('include=tags,restaurant&fields[Restaurant]=name&fields[Tag]=label',
+                               renderer_classes=(renderers.JSONRenderer,))
+
+        parse = mock.Mock(wraps=get_sparse_fieldsets)
+        with mock.patch.object(renderers, 'get_sparse_fieldsets', parse), \
+                mock.patch.object(fieldsets, 'get_sparse_fieldsets', parse):
+            document = ujson.loads(response.render().content)
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(
+            sorted((obj['type'], sorted(obj.get('attributes', {}))) for obj in document['included']),
+            [('Restaurant', ['name']), ('Tag', ['label']), ('Tag', ['label'])])
@@ -0,0 +1,85 @@
+import mock
+from django.test import TestCase
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource.viewsets import OrderViewSet, list_orders
+from zc_common.remote_resource.filters import JSONAPIFilterBackend, filter_schemas
+
+
+# Filter schemas are kept per view class, so the views are declared once rather than made for each request
+class FilteredOrderViewSet(OrderViewSet):
+    filter_backends = (JSONAPIFilterBackend,)
+
+
+class OrderTitleViewSet(FilteredOrderViewSet):
+    filterset_fields = {'title': ['exact']}
+
+
+def list_titles(query_string, view_class=FilteredOrderViewSet):
+    return [order['title'] for order in list_orders(query_string, view_class).data]
+
+
+class TestJSONAPIFilterBackend(TestCase):
+
+    def setUp(self):
+        filter_schemas.clear()
+        restaurant = Restaurant.objects.create(name='Cafe')
+        self.tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        self.orders = [Order.objects.create(title=title, restaurant=restaurant, is_paid=is_paid)
+                       for title, is_paid in (('Salad', True), ('Soup', False), ('Curry', True))]
+        self.orders[0].tags.set([self.tags[0]])
+        self.orders[2].tags.set([self.tags[1]])
+
+    def test_in_lookup(self):
+        pks = '{},{}'.format(self.orders[0].pk, self.orders[2].pk)
+
+        self.assertEqual(list_titles('filter[id__in]=' + pks), ['Salad', 'Curry'])
+        self.assertEqual(list_titles('filter[id]={}'.format(self.orders[1].pk)), ['Soup'])
+
+    def test_lookups(self):
+        self.assertEqual(list_titles('filter[title]=Soup'), ['Soup'])
+        self.assertEqual(list_titles('filter[title__icontains]=s'), ['Salad', 'Soup'])
+
+    def test_boolean_values(self):
+        self.assertEqual(list_titles('filter[is_paid]=true'), ['Salad', 'Curry'])
+        self.assertEqual(list_titles('filter[is_paid]=0'), ['Soup'])
+
+    def test_many_to_many_values(self):
+        pks = '{},{}'.format(self.tags[0].pk, self.tags[1].pk)
+
+        self.assertEqual(list_titles('filter[tags]=' + pks), ['Salad', 'Curry'])
+
+    def test_unknown_filters_match_nothing(self):
+        self.assertEqual(list_titles('filter[colour]=red'), [])
+        self.assertEqual(list_titles('filter[title]=Soup&filter[colour]=red'), [])
+        self.assertEqual(list_titles('filter=Soup&filter[title=Soup'), ['Salad', 'Soup', 'Curry'])
+
+    def test_views_sharing_a_model_keep_their_own_fields(self):
+        self.assertEqual(list_titles('filter[is_paid]=true'), ['Salad', 'Curry'])
+        self.assertEqual(list_titles('filter[is_paid]=true', OrderTitleViewSet), [])
+        self.assertEqual(list_titles('filter[title]=Soup', OrderTitleViewSet), ['Soup'])
+        self.assertEqual(list_titles('filter[is_paid]=false'), ['Soup'])
+
+    def test_schema_is_built_once(self):
+        with mock.patch.object(JSONAPIFilterBackend, 'get_filterset_class', autospec=True,
+                               side_effect=JSONAPIFilterBackend.get_filterset_class) as get_filterset_class:
+            list_titles('filter[title]=Soup')
+            list_titles('filter[is_paid]=true')
+
+        self.assertEqual(get_filterset_class.call_count, 1)
+
+    def test_schema_has_the_filters_of_a_filterset_built_per_request(self):
+        view = FilteredOrderViewSet()
+        view.request = None
+        backend = JSONAPIFilterBackend()
+        queryset = view.get_queryset()
+
+        schema = backend.get_filter_schema(view, queryset)
+        filterset_class = backend.get_filterset_class(view, queryset)
+
+        self.assertIs(backend.get_filter_schema(view, queryset), schema)
+        self.assertEqual(schema.fields, view.filterset_fields)
+        # Lookups such as `in` get a filter class made for each FilterSet, so they're compared by name
+        self.assertEqual(
+            dict((name, (type(f).__name__, f.lookup_expr)) for name, f in schema.filter_class.base_filters.items()),
+            dict((name, (type(f).__name__, f.lookup_expr)) for name, f in filterset_class.base_filters.items()))
@@ -0,0 +1,135 @@
+from unittest import TestCase
+
+from django.core.cache import caches
+from django.db import models
+from django.test import override_settings
+from rest_framework import serializers
+
+from zc_common.remote_resource.fragment_cache import (
+    ResourceFragmentCache, get_fragment_cache, invalidate_related_resources, invalidate_resource_fragments,
+    invalidate_saved_resource)
+
+
+class Vendor(models.Model):
+    name = models.CharField(max_length=50)
+    modified = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'tests'
+
+
+class Menu(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
+    modified = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'tests'
+
+
+class VendorSerializer(serializers.Serializer):
+    name = serializers.CharField()
+
+    class JSONAPIMeta:
+        fragment_cache_version_field = 'modified'
+
+
+class VendorNameSerializer(VendorSerializer):
+    title = serializers.CharField(source='name')
+
+
+class TestResourceFragmentCache(TestCase):
+
+    def setUp(self):
+        settings = override_settings(RESOURCE_FRAGMENT_CACHE_TIMEOUT=60)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        caches['default'].clear()
+        self.cache = ResourceFragmentCache(VendorSerializer(), None, 'modified')
+        self.vendors = [Vendor(pk=1, name='a'), Vendor(pk=2, name='b')]
+
+    def store(self, vendors):
+        keys = self.cache.make_keys(vendors)
+        self.cache.set_many(dict((key, {'id': str(vendor.pk)}) for key, vendor in zip(keys, vendors)))
+        return keys
+
+    def test_get_many_returns_only_cached_keys(self):
+        self.store(self.vendors[:1])
+
+        keys = self.cache.make_keys(self.vendors)
+
+        self.assertEqual(self.cache.get_many(keys), {keys[0]: {'id': '1'}})
+
+    def test_keys_follow_version_field(self):
+        key = self.store(self.vendors[:1])[0]
+        self.assertEqual(self.cache.make_keys(self.vendors[:1]), [key])
+
+        self.vendors[0].modified = 1
+
+        self.assertNotEqual(self.cache.make_keys(self.vendors[:1]), [key])
+
+    def test_keys_differ_by_part_and_fields(self):
+        key = self.cache.make_keys(self.vendors[:1])[0]
+        other_fields = ResourceFragmentCache(VendorNameSerializer(), None, 'modified')
+
+        self.assertNotEqual(self.cache.make_keys(self.vendors[:1], 'included')[0], key)
+        self.assertNotEqual(other_fields.make_keys(self.vendors[:1])[0], key)
+
+    def test_invalidate_single_row(self):
+        self.store(self.vendors)
+
+        invalidate_resource_fragments(Vendor, 1)
+
+        self.assertEqual(list(self.cache.get_many(self.cache.make_keys(self.vendors)).values()), [{'id': '2'}])
+
+    def test_invalidate_whole_model(self):
+        self.store(self.vendors)
+
+        invalidate_resource_fragments(Vendor)
+
+        self.assertEqual(self.cache.get_many(self.cache.make_keys(self.vendors)), {})
+
+    def test_saving_a_row_invalidates_it(self):
+        self.store(self.vendors)
+
+        invalidate_saved_resource(Vendor, self.vendors[1], created=False)
+
+        self.assertEqual(list(self.cache.get_many(self.cache.make_keys(self.vendors)).values()), [{'id': '1'}])
+
+    def test_saving_a_row_invalidates_the_rows_it_points_to(self):
+        self.store(self.vendors)
+
+        invalidate_saved_resource(Menu, Menu(pk=1, vendor_id=2), created=True)
+
+        self.assertEqual(list(self.cache.get_many(self.cache.make_keys(self.vendors)).values()), [{'id': '1'}])
+
+    def test_linking_rows_invalidates_both_sides(self):
+        self.store(self.vendors)
+        menu_cache = ResourceFragmentCache(VendorSerializer(), None, 'modified')
+        menus = [Menu(pk=1, vendor_id=1), Menu(pk=2, vendor_id=1)]
+        menu_cache.set_many(dict((key, {'id': str(menu.pk)}) for key, menu in zip(menu_cache.make_keys(menus), menus)))
+
+        invalidate_related_resources(None, menus[0], 'pre_add', False, Vendor, {2})
+        self.assertEqual(len(self.cache.get_many(self.cache.make_keys(self.vendors))), 2)
+
+        invalidate_related_resources(None, menus[0], 'post_add', False, Vendor, {2})
+        self.assertEqual(list(self.cache.get_many(self.cache.make_keys(self.vendors)).values()), [{'id': '1'}])
+        self.assertEqual(list(menu_cache.get_many(menu_cache.make_keys(menus)).values()), [{'id': '2'}])
+
+        invalidate_related_resources(None, menus[1], 'post_clear', False, Vendor, None)
+        self.assertEqual(self.cache.get_many(self.cache.make_keys(self.vendors)), {})
+        self.assertEqual(menu_cache.get_many(menu_cache.make_keys(menus)), {})
+
+
+class TestGetFragmentCache(TestCase):
+
+    def test_disabled_without_timeout(self):
+        self.assertIsNone(get_fragment_cache(VendorSerializer(), None))
+        # Nothing to invalidate, but it must not fail either
+        invalidate_resource_fragments(Vendor, 1)
+
+    @override_settings(RESOURCE_FRAGMENT_CACHE_TIMEOUT=60)
+    def test_serializers_opt_in(self):
+        self.assertIsNone(get_fragment_cache(serializers.Serializer(), None))
+        self.assertEqual(get_fragment_cache(VendorSerializer(), None).version_field, 'modified')
+        self.assertEqual(get_fragment_cache(VendorSerializer(many=True), None).version_field, 'modified')
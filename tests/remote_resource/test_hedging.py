@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent import futures
+from unittest import TestCase
+
+import mock
+
+from zc_common.remote_resource import hedging
+from zc_common.remote_resource.hedging import LatencyTracker, get_executor, hedged_call
+
+
+class FakeEventClient(object):
+    """
+    Answers with the latencies it's given, one per call, in order.
+    """
+
+    def __init__(self, *latencies):
+        self.latencies = list(latencies)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_remote_resource_data(self):
+        with self.lock:
+            call = self.calls
+            self.calls += 1
+        time.sleep(self.latencies[call])
+        return call
+
+
+def warmed_up_tracker(latency=0.01, **kwargs):
+    tracker = LatencyTracker('company', min_samples=5, **kwargs)
+    for _ in range(20):
+        tracker.record(latency)
+    return tracker
+
+
+@mock.patch.object(hedging, 'statsd')
+class TestHedgedCall(TestCase):
+
+    def test_percentile(self, statsd):
+        tracker = LatencyTracker('company', min_samples=3)
+        tracker.record(0.3)
+        tracker.record(0.1)
+        self.assertIsNone(tracker.percentile(95))
+
+        tracker.record(0.2)
+        self.assertEqual(tracker.percentile(95), 0.3)
+        self.assertEqual(tracker.percentile(50), 0.2)
+
+    def test_no_hedge_without_enough_samples(self, statsd):
+        event_client = FakeEventClient(0.05)
+        tracker = LatencyTracker('company', min_samples=5, hedge_rate=1)
+
+        self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 0)
+        self.assertEqual(event_client.calls, 1)
+        self.assertEqual(len(tracker.latencies), 1)
+
+    def test_slow_request_is_hedged(self, statsd):
+        event_client = FakeEventClient(1, 0.01)
+        tracker = warmed_up_tracker(hedge_rate=1)
+
+        self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 1)
+        self.assertEqual(event_client.calls, 2)
+        statsd.incr.assert_called_once_with('remote_include_hedge.company')
+
+    def test_fast_request_is_not_hedged(self, statsd):
+        event_client = FakeEventClient(0, 0)
+        tracker = warmed_up_tracker(latency=0.5, hedge_rate=1)
+
+        self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 0)
+        self.assertEqual(event_client.calls, 1)
+
+    def test_hedges_are_limited_by_budget(self, statsd):
+        event_client = FakeEventClient(0.1, 0.1, 0.01)
+        tracker = warmed_up_tracker(hedge_rate=0.5)
+
+        # Two requests earn a single hedge
+        self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 0)
+        self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 2)
+        self.assertEqual(event_client.calls, 3)
+
+    def test_falls_back_to_the_other_request_on_error(self, statsd):
+        tracker = warmed_up_tracker(hedge_rate=1)
+        calls = list()
+
+        def request():
+            calls.append(None)
+            if len(calls) == 1:
+                time.sleep(0.05)
+                raise ValueError()
+            time.sleep(0.1)
+            return 'hedge'
+
+        self.assertEqual(hedged_call(tracker, request, 95), 'hedge')
+
+    def test_requests_share_the_executor(self, statsd):
+        self.assertIs(get_executor(), get_executor())
+        executor = mock.Mock(wraps=get_executor())
+        event_client = FakeEventClient(1, 0.01, 0.01)
+        tracker = warmed_up_tracker(hedge_rate=1)
+
+        with mock.patch.object(hedging, 'get_executor', return_value=executor), \
+                mock.patch.object(futures, 'ThreadPoolExecutor') as thread_pool_executor:
+            self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 1)
+            self.assertEqual(hedged_call(tracker, event_client.get_remote_resource_data, 95), 2)
+
+        self.assertEqual(executor.submit.call_count, 3)
+        thread_pool_executor.assert_not_called()
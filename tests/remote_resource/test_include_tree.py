@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from zc_common.remote_resource.include_tree import IncludeNode, IncludeTree
+
+
+class TestIncludeTree(TestCase):
+
+    def test_parse(self):
+        tree = IncludeTree.parse(['restaurant.company.address', 'restaurant.company', 'restaurant.menus', 'tags'])
+
+        self.assertEqual(tree.names, ('restaurant', 'tags'))
+        restaurant = tree.get('restaurant')
+        self.assertEqual(restaurant.paths, 'company.address,menus')
+        self.assertEqual(restaurant.children.names, ('company', 'menus'))
+        self.assertEqual(restaurant.children.get('company').paths, 'address')
+        self.assertEqual(tree.get('tags'), IncludeNode('tags', IncludeTree(), ''))
+        self.assertIsNone(tree.get('company'))
+        self.assertEqual(tree.depth, 3)
+
+    def test_paths_are_underscored(self):
+        tree = IncludeTree.parse(['lineItems.menuItem', ''])
+
+        self.assertEqual(tree.names, ('line_items',))
+        self.assertEqual(tree.get('line_items').paths, 'menu_item')
+
+    def test_trees_are_reused_and_hashable(self):
+        tree = IncludeTree.parse(['restaurant.company', 'tags'])
+
+        self.assertIs(IncludeTree.parse(tree), tree)
+        self.assertEqual(hash(tree), hash(IncludeTree.parse(['restaurant.company', 'tags'])))
+        self.assertFalse(IncludeTree.parse(None))
+        self.assertEqual(IncludeTree.parse([]).depth, 0)
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+import mock
+from django.test import override_settings
+
+from zc_common.remote_resource import metrics
+from zc_common.remote_resource.metrics import NOOP_TIMER, RenderMetrics
+
+
+class TestRenderMetrics(TestCase):
+
+    @mock.patch.object(metrics, 'statsd')
+    def test_disabled_without_statsd(self, statsd):
+        render_metrics = RenderMetrics('orders')
+
+        with render_metrics.phase('resources'):
+            pass
+        render_metrics.count('rows', 10)
+        render_metrics.send()
+
+        self.assertIs(render_metrics.phase('resources'), NOOP_TIMER)
+        self.assertEqual(statsd.mock_calls, [])
+
+    @override_settings(STATSD_ENABLED=True)
+    @mock.patch.object(metrics, 'statsd')
+    def test_phases_add_up_and_are_sent_per_resource_name(self, statsd):
+        with mock.patch.object(metrics, 'default_timer', side_effect=[1.0, 1.5, 2.0, 2.25, 2.5, 3.0]):
+            render_metrics = RenderMetrics('orders')
+            with render_metrics.phase('resources'):
+                pass
+            with render_metrics.phase('resources'):
+                pass
+            render_metrics.count('rows', 2)
+            render_metrics.count('rows', 3)
+            render_metrics.send()
+
+        statsd.timing.assert_has_calls([
+            mock.call('jsonapi.render.orders.resources', 750.0),
+            mock.call('jsonapi.render.orders.total', 2000.0),
+        ])
+        statsd.incr.assert_called_once_with('jsonapi.render.orders.rows', 5)
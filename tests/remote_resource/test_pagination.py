@@ -0,0 +1,194 @@
+from base64 import b64decode
+
+import mock
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from six.moves.urllib import parse as urlparse
+
+from tests.models import Order, Restaurant
+from tests.remote_resource import viewsets
+from zc_common.remote_resource import pagination
+from zc_common.remote_resource.filters import JSONAPIFilterBackend
+from zc_common.remote_resource.pagination import CursorPagination, PageNumberPagination, estimate_count
+
+
+def list_orders(query_string, strategy=None):
+    with CaptureQueriesContext(connection) as context:
+        response = viewsets.list_orders(query_string, pagination_class=PageNumberPagination,
+                                        filter_backends=(JSONAPIFilterBackend,), pagination_count_strategy=strategy)
+    response.counts = len([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+    return response
+
+
+def get_cursor(link):
+    return urlparse.parse_qs(urlparse.urlsplit(link).query)['page[cursor]'][0]
+
+
+def titles(response):
+    return [order['title'] for order in response.data['results']]
+
+
+class TestCountStrategies(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        restaurant = Restaurant.objects.create(name='Cafe')
+        for index in range(5):
+            Order.objects.create(title='Order {}'.format(index), restaurant=restaurant)
+
+    def test_exact(self):
+        response = list_orders('page_size=2&page=last')
+
+        self.assertEqual(titles(response), ['Order 4'])
+        self.assertEqual(response.data['meta']['pagination'],
+                         {'page': 3, 'pages': 3, 'count': 5, 'count_strategy': 'exact'})
+        self.assertEqual(response.counts, 1)
+
+    def test_cached(self):
+        first = list_orders('page_size=2', 'cached')
+        second = list_orders('page_size=2&page=2', 'cached')
+        filtered = list_orders('page_size=2&filter[title]=Order 1', 'cached')
+
+        self.assertEqual((first.counts, second.counts), (1, 0))
+        self.assertEqual(titles(second), ['Order 2', 'Order 3'])
+        self.assertEqual(second.data['meta']['pagination'],
+                         {'page': 2, 'pages': 3, 'count': 5, 'count_strategy': 'cached'})
+        self.assertEqual(filtered.counts, 1)
+        self.assertEqual(filtered.data['meta']['pagination']['count'], 1)
+
+    def test_cached_page_past_the_end(self):
+        self.assertEqual(list_orders('page_size=2&page=4', 'cached').status_code, 404)
+
+    def test_estimate(self):
+        with mock.patch.object(pagination, 'estimate_count', return_value=50000):
+            response = list_orders('page_size=2&page=4', 'estimate')
+
+        self.assertEqual(titles(response), [])
+        self.assertEqual(response.data['meta']['pagination'],
+                         {'page': 4, 'pages': 25000, 'count': 50000, 'count_strategy': 'estimate'})
+        self.assertEqual(response.counts, 0)
+
+    def test_estimate_falls_back_to_counting(self):
+        # The planner can't estimate on SQLite
+        response = list_orders('page_size=2', 'estimate')
+
+        self.assertEqual(response.data['meta']['pagination']['count_strategy'], 'exact')
+        self.assertEqual(response.data['meta']['pagination']['count'], 5)
+
+        with mock.patch.object(pagination, 'estimate_count', return_value=50):
+            response = list_orders('page_size=2', 'estimate')
+        self.assertEqual(response.data['meta']['pagination']['count'], 5)
+
+    def test_has_more(self):
+        first = list_orders('page_size=2', 'has_more')
+        last = list_orders('page_size=2&page=3', 'has_more')
+
+        self.assertEqual(first.data['meta']['pagination'], {'page': 1, 'has_more': True, 'count_strategy': 'has_more'})
+        self.assertIsNone(first.data['links']['last'])
+        self.assertTrue(first.data['links']['next'].endswith('page=2&page_size=2'))
+        self.assertEqual(titles(last), ['Order 4'])
+        self.assertEqual(last.data['meta']['pagination'], {'page': 3, 'has_more': False, 'count_strategy': 'has_more'})
+        self.assertIsNone(last.data['links']['next'])
+        self.assertEqual(first.counts + last.counts, 0)
+
+    def test_has_more_pages(self):
+        self.assertEqual(titles(list_orders('page_size=2&page=9', 'has_more')), [])
+        self.assertEqual(list_orders('page_size=2&page=last', 'has_more').status_code, 404)
+        self.assertEqual(list_orders('page_size=2&page=0', 'has_more').status_code, 404)
+        self.assertEqual(list_orders('page_size=2&page=abc', 'has_more').status_code, 404)
+
+
+class TestEstimateCount(TestCase):
+
+    def test_other_databases(self):
+        self.assertIsNone(estimate_count(Order.objects.all()))
+
+    def test_postgresql(self):
+        postgresql = mock.MagicMock(vendor='postgresql')
+        cursor = postgresql.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = ('[{"Plan": {"Plan Rows": 12345}}]',)
+
+        with mock.patch.object(pagination, 'connections', {'default': postgresql}):
+            self.assertEqual(estimate_count(Order.objects.filter(title='Salad').order_by('title')), 12345)
+            self.assertEqual(estimate_count(Order.objects.filter(pk__in=[])), 0)
+
+        self.assertEqual(cursor.execute.call_count, 1)
+        sql = cursor.execute.call_args[0][0]
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+        self.assertNotIn('ORDER BY', sql)
+
+
+class TestCursorPagination(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        for title in ('Soup', 'Curry', 'Salad', 'Pie', 'Rice'):
+            Order.objects.create(title=title, restaurant=restaurant)
+
+    def list_orders(self, query_string, **attributes):
+        return viewsets.list_orders(query_string, pagination_class=CursorPagination,
+                                    filter_backends=(JSONAPIFilterBackend,), **attributes)
+
+    def test_following_the_links(self):
+        first = self.list_orders('page_size=2')
+        second = self.list_orders('page_size=2&page[cursor]=' + get_cursor(first.data['links']['next']))
+        third = self.list_orders('page_size=2&page[cursor]=' + get_cursor(second.data['links']['next']))
+        back = self.list_orders('page_size=2&page[cursor]=' + get_cursor(third.data['links']['prev']))
+
+        self.assertEqual([titles(first), titles(second), titles(third)],
+                         [['Soup', 'Curry'], ['Salad', 'Pie'], ['Rice']])
+        self.assertEqual(titles(back), ['Salad', 'Pie'])
+        self.assertIsNone(first.data['links']['prev'])
+        self.assertIsNone(third.data['links']['next'])
+        self.assertEqual(first.data['links']['self'], 'http://testserver/orders/?page_size=2')
+        self.assertNotIn('meta', first.data)
+
+    def test_cursors_are_opaque(self):
+        response = self.list_orders('page_size=2&filter[id__in]=')
+        cursor = get_cursor(response.data['links']['next'])
+
+        position = str(Order.objects.get(title='Curry').pk)
+
+        self.assertEqual(urlparse.parse_qs(b64decode(cursor).decode('ascii')), {'p': [position]})
+        # Blank parameters are kept in the links
+        self.assertIn('filter%5Bid__in%5D=&', response.data['links']['next'])
+
+    def test_cursor_ordering(self):
+        first = self.list_orders('page_size=3', cursor_ordering='title')
+        second = self.list_orders('page_size=3&page[cursor]=' + get_cursor(first.data['links']['next']),
+                                  cursor_ordering='title')
+
+        self.assertEqual(titles(first) + titles(second), ['Curry', 'Pie', 'Rice', 'Salad', 'Soup'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.list_orders('page_size=2&page[cursor]=not-a-cursor').status_code, 404)
+
+    def paginate_rows(self, rows, view):
+        paginator = CursorPagination()
+        request = Request(APIRequestFactory().get('/orders/?page_size=2'))
+        return paginator, paginator.paginate_queryset(rows, request, view)
+
+    def test_positions_of_tuple_rows(self):
+        view = viewsets.OrderViewSet(cursor_ordering='-id')
+        paginator, page = self.paginate_rows(Order.objects.values_list('pk', 'title'), view)
+
+        # The position of the row following the page
+        self.assertEqual([title for pk, title in page], ['Rice', 'Pie'])
+        self.assertEqual(paginator.next_position, str(Order.objects.get(title='Salad').pk))
+
+        view = viewsets.OrderViewSet(cursor_ordering='title')
+        paginator, page = self.paginate_rows(Order.objects.values_list('pk', 'title'), view)
+
+        self.assertEqual([title for pk, title in page], ['Curry', 'Pie'])
+        self.assertEqual(paginator.next_position, 'Rice')
+
+    def test_tuple_rows_without_the_ordering_column(self):
+        view = viewsets.OrderViewSet(cursor_ordering='title')
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.paginate_rows(Order.objects.values_list('pk', 'is_paid'), view)
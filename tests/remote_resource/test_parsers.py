@@ -0,0 +1,128 @@
+from io import BytesIO
+
+import mock
+import ujson
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from zc_common.remote_resource import parsers
+from zc_common.remote_resource.parsers import JSONParser, LimitedReader, RequestEntityTooLarge
+
+
+class VendorView(object):
+    resource_name = 'Vendor'
+    bulk_max_items = None
+
+
+def parse(document, view=None):
+    body = document if isinstance(document, bytes) else ujson.dumps(document).encode('utf-8')
+    django_request = APIRequestFactory().post('/vendors/', body, content_type='application/vnd.api+json')
+    request = Request(django_request, parsers=[JSONParser()], parser_context={'view': view or VendorView()})
+    return request.data
+
+
+class TestJSONParser(SimpleTestCase):
+    """
+    Loads bodies whole; `TestJSONParserIncremental` runs the same tests reading them with ijson.
+    """
+
+    def test_resource_object(self):
+        data = parse({'data': {'type': 'Vendor', 'id': '1', 'attributes': {'name': 'Sally'}}})
+
+        self.assertEqual(data, {'id': '1', 'name': 'Sally'})
+
+    def test_array_data(self):
+        data = parse({'data': [
+            {'type': 'Vendor', 'attributes': {'name': 'Sally'}},
+            {'type': 'Vendor', 'attributes': {'name': 'Kim'},
+             'relationships': {'company': {'data': {'type': 'Company', 'id': '3'}}}},
+        ]})
+
+        self.assertEqual(data, [
+            {'id': None, 'name': 'Sally'},
+            {'id': None, 'name': 'Kim', 'company': {'type': 'Company', 'id': '3'}},
+        ])
+
+    def test_meta_after_data(self):
+        body = b'{"data": [{"type": "Vendor", "id": "1"}, {"type": "Vendor", "id": "2"}], "meta": {"dryRun": true}}'
+
+        self.assertEqual(parse(body), [
+            {'id': '1', '_meta': {'dryRun': True}},
+            {'id': '2', '_meta': {'dryRun': True}},
+        ])
+
+    def test_too_many_items(self):
+        view = VendorView()
+        view.bulk_max_items = 2
+        document = {'data': [{'type': 'Vendor', 'id': str(pk)} for pk in range(3)]}
+
+        with self.assertRaises(ParseError):
+            parse(document, view)
+        self.assertEqual(len(parse({'data': document['data'][:2]}, view)), 2)
+
+    @override_settings(JSON_API_MAX_DATA_ITEMS=1)
+    def test_too_many_items_setting(self):
+        with self.assertRaises(ParseError):
+            parse({'data': [{'type': 'Vendor', 'id': '1'}, {'type': 'Vendor', 'id': '2'}]})
+
+    @override_settings(JSON_API_MAX_BODY_SIZE=50)
+    def test_body_over_size_limit(self):
+        with self.assertRaises(RequestEntityTooLarge) as context:
+            parse({'data': {'type': 'Vendor', 'attributes': {'name': 'x' * 50}}})
+
+        self.assertEqual(context.exception.status_code, 413)
+
+    def test_wrong_type(self):
+        with self.assertRaises(Exception) as context:
+            parse({'data': {'type': 'Company', 'id': '1'}})
+
+        self.assertEqual(context.exception.status_code, 409)
+
+    def test_missing_data(self):
+        with self.assertRaises(ParseError):
+            parse({'meta': {}})
+
+
+@override_settings(JSON_API_INCREMENTAL_PARSING=True)
+class TestJSONParserIncremental(TestJSONParser):
+    pass
+
+
+@override_settings(JSON_API_INCREMENTAL_PARSING=True)
+@mock.patch.object(parsers, 'ijson', None)
+class TestJSONParserWithoutIjson(TestJSONParser):
+    pass
+
+
+class TestIncrementalParsing(SimpleTestCase):
+
+    @override_settings(JSON_API_INCREMENTAL_PARSING=True)
+    def test_bodies_are_read_incrementally(self):
+        with mock.patch.object(JSONParser, 'parse_document', autospec=True,
+                               side_effect=JSONParser.parse_document) as parse_document:
+            parse({'data': [{'type': 'Vendor', 'id': '1'}]})
+
+        parse_document.assert_not_called()
+
+    def test_bodies_are_loaded_whole_by_default(self):
+        with mock.patch.object(JSONParser, 'parse_incrementally') as parse_incrementally:
+            parse({'data': [{'type': 'Vendor', 'id': '1'}]})
+
+        parse_incrementally.assert_not_called()
+
+
+class TestLimitedReader(SimpleTestCase):
+
+    def test_reads_within_limit(self):
+        reader = LimitedReader(BytesIO(b'0123456789'), 10)
+
+        self.assertEqual(reader.read(4) + reader.read(), b'0123456789')
+
+    def test_raises_past_limit(self):
+        reader = LimitedReader(BytesIO(b'0123456789'), 6)
+        reader.read(4)
+
+        with self.assertRaises(RequestEntityTooLarge):
+            reader.read(4)
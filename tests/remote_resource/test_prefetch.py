@@ -0,0 +1,181 @@
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_json_api.relations import ResourceRelatedField
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource.viewsets import get_list_view, list_orders
+from tests.serializers import OrderSerializer, RestaurantSerializer, TagSerializer
+from zc_common.remote_resource.include_tree import IncludeTree
+from zc_common.remote_resource.pagination import PageNumberPagination
+from zc_common.remote_resource.prefetch import estimate_include_cost, plan_prefetch, prefetch_included_resources
+
+
+class RestaurantOrdersSerializer(RestaurantSerializer):
+    orders = ResourceRelatedField(many=True, read_only=True)
+    included_serializers = {'orders': OrderSerializer}
+
+    class Meta(RestaurantSerializer.Meta):
+        fields = ('id', 'name', 'orders')
+
+
+class TagOrdersSerializer(TagSerializer):
+    # The relation has no `related_name`: its field is `order` and its accessor `order_set`
+    orders = ResourceRelatedField(source='order_set', many=True, read_only=True)
+    included_serializers = {'orders': OrderSerializer}
+
+    class Meta(TagSerializer.Meta):
+        fields = ('id', 'label', 'orders')
+
+
+class OrderRelationsSerializer(OrderSerializer):
+    included_serializers = {'restaurant': RestaurantOrdersSerializer, 'tags': TagOrdersSerializer}
+
+
+def describe(lookups):
+    """
+    Returns the lookups of a plan as strings, with each `Prefetch` followed by the lookups of its queryset.
+    """
+    described = list()
+    for lookup in lookups:
+        if isinstance(lookup, Prefetch):
+            query = lookup.queryset.query
+            described.append((lookup.prefetch_to, lookup.queryset.model.__name__, sorted(query.select_related or []),
+                              describe(lookup.queryset._prefetch_related_lookups)))
+        else:
+            described.append(lookup)
+    return described
+
+
+class TestPlanPrefetch(TestCase):
+
+    def plan(self, *paths):
+        select_related, prefetch_related = plan_prefetch(
+            Order, OrderRelationsSerializer, IncludeTree.parse(list(paths)))
+        return select_related, describe(prefetch_related)
+
+    def test_foreign_keys_are_selected(self):
+        self.assertEqual(self.plan('restaurant'), (['restaurant'], []))
+
+    def test_many_to_many_fields_are_prefetched(self):
+        self.assertEqual(self.plan('tags'), ([], [('tags', 'Tag', [], [])]))
+
+    def test_reverse_relations_through_a_selected_foreign_key(self):
+        self.assertEqual(self.plan('restaurant.orders.restaurant'),
+                         (['restaurant'], [('restaurant__orders', 'Order', ['restaurant'], [])]))
+
+    def test_reverse_relations_named_by_their_accessor(self):
+        self.assertEqual(self.plan('tags.orders'), ([], [('tags', 'Tag', [], [('order_set', 'Order', [], [])])]))
+        self.assertEqual(
+            self.plan('tags.orders.restaurant', 'restaurant'),
+            (['restaurant'], [('tags', 'Tag', [], [('order_set', 'Order', ['restaurant'], [])])]))
+
+    def test_unknown_fields_are_skipped(self):
+        self.assertEqual(self.plan('colour', 'tags.colour'), ([], [('tags', 'Tag', [], [])]))
+        self.assertEqual(plan_prefetch(Order, None, IncludeTree.parse(['tags'])), ([], []))
+
+
+class TestPrefetchIncludedResources(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        for title in ('Soup', 'Salad', 'Curry'):
+            Order.objects.create(title=title, restaurant=restaurant).tags.set(tags)
+
+    def test_nested_includes_cost_a_query_per_step(self):
+        queryset = prefetch_included_resources(
+            Order.objects.order_by('id'), OrderRelationsSerializer, ['tags.orders.restaurant', 'restaurant.orders'])
+
+        with self.assertNumQueries(4):
+            orders = list(queryset)
+            titles = [[order.title for order in tag.order_set.all()] for tag in orders[0].tags.all()]
+            restaurants = set(order.restaurant.name for tag in orders[1].tags.all() for order in tag.order_set.all())
+            self.assertEqual(len(orders[2].restaurant.orders.all()), 3)
+
+        self.assertEqual(titles, [['Soup', 'Salad', 'Curry']] * 2)
+        self.assertEqual(restaurants, {'Cafe'})
+
+    def test_existing_lookups_are_kept(self):
+        queryset = Order.objects.prefetch_related('tags')
+
+        queryset = prefetch_included_resources(queryset, OrderRelationsSerializer, ['tags.orders'])
+
+        self.assertEqual(queryset._prefetch_related_lookups, ('tags',))
+        self.assertEqual(len(list(queryset)), 3)
+
+    def test_nothing_to_include(self):
+        queryset = Order.objects.all()
+
+        self.assertIs(prefetch_included_resources(queryset, OrderRelationsSerializer, []), queryset)
+
+
+class TestEstimateIncludeCost(TestCase):
+
+    def estimate(self, *paths, **kwargs):
+        cost = estimate_include_cost(Order, OrderSerializer, IncludeTree.parse(list(paths)), kwargs.get('rows', 20))
+        return dict(cost)
+
+    def test_foreign_keys_are_selected_with_the_rows(self):
+        self.assertEqual(self.estimate('restaurant'), {'objects': 20, 'queries': 0, 'remote_calls': 0})
+
+    def test_to_many_relations_cost_a_query(self):
+        self.assertEqual(self.estimate('tags'), {'objects': 200, 'queries': 1, 'remote_calls': 0})
+        self.assertEqual(self.estimate('restaurant', 'tags'), {'objects': 220, 'queries': 1, 'remote_calls': 0})
+
+    def test_reverse_relations(self):
+        cost = estimate_include_cost(Order, OrderRelationsSerializer, IncludeTree.parse(['tags.orders']), 20)
+
+        self.assertEqual(dict(cost), {'objects': 2200, 'queries': 2, 'remote_calls': 0})
+
+    @override_settings(INCLUDE_TO_MANY_CARDINALITY=3)
+    def test_cardinality_setting(self):
+        self.assertEqual(self.estimate('tags', rows=5)['objects'], 15)
+
+    def test_nothing_to_include(self):
+        self.assertEqual(self.estimate(), {'objects': 0, 'queries': 0, 'remote_calls': 0})
+        self.assertEqual(self.estimate('tags', rows=0)['objects'], 0)
+
+
+class TestCheckIncludeCost(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        tag = Tag.objects.create(label='Vegan')
+        for index in range(3):
+            Order.objects.create(title='Order {}'.format(index), restaurant=restaurant).tags.set([tag])
+
+    @override_settings(INCLUDE_MAX_DEPTH=1)
+    def test_max_depth(self):
+        self.assertEqual(list_orders('include=restaurant').status_code, 200)
+        self.assertEqual(list_orders('include=tags.order').status_code, 400)
+
+    @override_settings(INCLUDE_COST_BUDGET=150, INCLUDE_QUERY_COST=10)
+    def test_budget(self):
+        # 10 rows of tags: 100 objects and a query
+        response = list_orders('include=tags&page_size=10', pagination_class=PageNumberPagination)
+        self.assertEqual(response.status_code, 200)
+        # 20 rows of tags: 200 objects and a query
+        response = list_orders('include=tags&page_size=20', pagination_class=PageNumberPagination)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('over the budget of 150', str(response.data['detail']))
+
+    @override_settings(INCLUDE_COST_BUDGET=1)
+    def test_unpaginated_lists_are_not_counted(self):
+        with CaptureQueriesContext(connection) as context:
+            response = list_orders('include=tags')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+
+    @override_settings(DEBUG=True)
+    def test_estimate_is_kept_with_debug_on(self):
+        view = get_list_view('page_size=5', pagination_class=PageNumberPagination)
+
+        view.check_include_cost(Order.objects.all(), OrderSerializer, ['restaurant'])
+
+        self.assertEqual(view.include_cost['rows'], 5)
+        self.assertEqual(view.include_cost['objects'], 5)
@@ -0,0 +1,269 @@
+import time
+from unittest import TestCase, skipIf
+
+import mock
+import ujson
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from tests.remote_resource.test_hedging import FakeEventClient
+
+try:
+    from zc_common.remote_resource.remote_includes import RemoteIncludeBatch, RemoteResourceIncludeTimeoutError
+except ImportError:  # zc_events isn't installed
+    RemoteIncludeBatch = None
+
+
+class RemoteEventClient(FakeEventClient):
+    """
+    Answers requests for remote resources with one object per primary key and, when something is included, an
+    `Address` for each of them. `remote_page_size` makes it page its responses like our services do, with `next`
+    links made from `next_link`. `most_running` is the largest number of requests it has answered at once.
+    """
+
+    def __init__(self, *latencies, **kwargs):
+        super(RemoteEventClient, self).__init__(*(latencies or [0] * 100))
+        self.remote_page_size = kwargs.get('remote_page_size')
+        self.next_link = kwargs.get('next_link', 'http://remote/companies/?page={}')
+        self.requests = list()
+        self.running = 0
+        self.most_running = 0
+
+    def get_remote_resource_data(self, resource_type, pk, user_id, include, page_size, query_params, roles):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            super(RemoteEventClient, self).get_remote_resource_data()
+        finally:
+            with self.lock:
+                self.running -= 1
+        page = (query_params or {}).get('page', 1)
+        self.requests.append(
+            {'type': resource_type, 'pk': list(pk), 'include': include, 'page': page, 'page_size': page_size})
+
+        pks = list(pk)
+        body = {'links': {}}
+        if self.remote_page_size:
+            start = (page - 1) * self.remote_page_size
+            if start + self.remote_page_size < len(pks):
+                body['links']['next'] = self.next_link.format(page + 1)
+            pks = pks[start:start + self.remote_page_size]
+
+        body['data'] = [{'type': 'Company', 'id': str(pk)} for pk in pks]
+        if include:
+            for resource in body['data']:
+                resource['relationships'] = {'address': {'data': {'type': 'Address', 'id': resource['id']}}}
+            body['included'] = [{'type': 'Address', 'id': str(pk)} for pk in pks]
+
+        return {'status': 200, 'body': ujson.dumps(body)}
+
+
+def make_request():
+    request = Request(APIRequestFactory().get('/orders/'))
+    request.user = mock.Mock(id=1, roles=['user'])
+    return request
+
+
+@skipIf(RemoteIncludeBatch is None, 'zc_events is not installed')
+class TestRemoteIncludeBatching(TestCase):
+
+    def test_one_request_per_field_and_include(self):
+        event_client = RemoteEventClient()
+        batch = RemoteIncludeBatch(event_client, make_request())
+        for field_name, pk, include in (('company', '1', ''), ('company', '2', ''), ('company', '1', ''),
+                                        ('company', '3', 'address'), ('owner', '1', ''), ('company', '4', '')):
+            batch.add(field_name, {'type': 'Company', 'id': pk}, include=include)
+
+        resources = batch.fetch()
+
+        # The requests run concurrently, so they reach the event client in any order
+        self.assertEqual(
+            sorted((request['type'], request['pk'], request['include']) for request in event_client.requests),
+            [('company', ['1', '2', '4'], ''), ('company', ['3'], 'address'), ('owner', ['1'], '')])
+        self.assertEqual(batch.remote_calls, 3)
+        self.assertEqual([(obj['type'], obj['id']) for obj in resources],
+                         [('Company', '1'), ('Company', '2'), ('Company', '4'), ('Company', '3'), ('Address', '3'),
+                          ('Company', '1')])
+        self.assertEqual(batch.fetch(), [])
+
+    @override_settings(REMOTE_INCLUDE_PAGE_SIZE=2)
+    def test_requests_are_split_at_the_page_size(self):
+        event_client = RemoteEventClient()
+        batch = RemoteIncludeBatch(event_client, make_request())
+        for pk in range(1, 6):
+            batch.add('company', {'type': 'Company', 'id': str(pk)})
+
+        resources = batch.fetch()
+
+        self.assertEqual(sorted(request['pk'] for request in event_client.requests), [['1', '2'], ['3', '4'], ['5']])
+        self.assertEqual([request['page_size'] for request in event_client.requests], [2, 2, 2])
+        self.assertEqual([obj['id'] for obj in resources], ['1', '2', '3', '4', '5'])
+
+    def test_resources_without_an_id_are_skipped(self):
+        event_client = RemoteEventClient()
+        batch = RemoteIncludeBatch(event_client, make_request())
+        batch.add('company', None)
+        batch.add('company', {'type': 'Company', 'id': None})
+
+        self.assertEqual(batch.fetch(), [])
+        self.assertEqual(event_client.calls, 0)
+
+
+@skipIf(RemoteIncludeBatch is None, 'zc_events is not installed')
+class TestRemoteIncludeConcurrency(TestCase):
+
+    def add_fields(self, batch, count):
+        # Requests left running by other tests would be shared with ones for the same primary key
+        for index in range(count):
+            batch.add('company{}'.format(index), {'type': 'Company', 'id': self.id()})
+
+    def test_requests_run_concurrently(self):
+        event_client = RemoteEventClient(0.1, 0.1, 0.1, 0.1)
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_fields(batch, 4)
+
+        started = time.time()
+        self.assertEqual(len(batch.fetch()), 4)
+
+        self.assertLess(time.time() - started, 0.3)
+        self.assertEqual(event_client.most_running, 4)
+
+    @override_settings(REMOTE_INCLUDE_MAX_WORKERS=2)
+    def test_concurrency_is_limited_by_the_workers(self):
+        event_client = RemoteEventClient(0.05, 0.05, 0.05, 0.05, 0.05)
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_fields(batch, 5)
+
+        self.assertEqual(len(batch.fetch()), 5)
+        self.assertEqual(event_client.most_running, 2)
+
+    @override_settings(REMOTE_INCLUDE_TIMEOUT=0.1, REMOTE_INCLUDE_MAX_WORKERS=2)
+    def test_one_timeout_error_at_the_deadline(self):
+        event_client = RemoteEventClient(0.5, 0.5, 0, 0, 0)
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_fields(batch, 5)
+
+        started = time.time()
+        with self.assertRaises(RemoteResourceIncludeTimeoutError) as context:
+            batch.fetch()
+
+        self.assertLess(time.time() - started, 0.3)
+        self.assertEqual(context.exception.field, 'company0')
+        self.assertEqual(context.exception.data[0]['status'], '503')
+        # Requests that hadn't started by the deadline are never made
+        time.sleep(0.5)
+        self.assertEqual(event_client.calls, 2)
+
+    @override_settings(REMOTE_INCLUDE_TIMEOUT=0.1)
+    def test_deadline_is_counted_from_the_start_of_the_render(self):
+        event_client = RemoteEventClient(0.05)
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_fields(batch, 1)
+        time.sleep(0.1)
+
+        with self.assertRaises(RemoteResourceIncludeTimeoutError):
+            batch.fetch()
+
+
+@skipIf(RemoteIncludeBatch is None, 'zc_events is not installed')
+class TestRemoteIncludeLimits(TestCase):
+
+    def test_zero_limit_requests_nothing(self):
+        event_client = RemoteEventClient()
+        batch = RemoteIncludeBatch(event_client, make_request())
+        batch.add('company', {'type': 'Company', 'id': '1'}, limit=0)
+        batch.add('company', {'type': 'Company', 'id': '2'}, include='address', limit=0)
+
+        self.assertEqual(batch.fetch(), [])
+        self.assertEqual(event_client.calls, 0)
+        self.assertEqual(batch.truncated, {'company'})
+
+    @override_settings(REMOTE_INCLUDE_MAX_RESOURCES=0)
+    def test_zero_default_limit_requests_nothing(self):
+        event_client = RemoteEventClient()
+        batch = RemoteIncludeBatch(event_client, make_request())
+        batch.add('company', {'type': 'Company', 'id': '1'})
+
+        self.assertEqual(batch.fetch(), [])
+        self.assertEqual(event_client.calls, 0)
+        self.assertEqual(batch.truncated, {'company'})
+
+    def test_resources_are_kept_with_their_includes(self):
+        batch = RemoteIncludeBatch(RemoteEventClient(), make_request())
+        batch.add('company', {'type': 'Company', 'id': '1'}, include='address', limit=3)
+        batch.add('company', {'type': 'Company', 'id': '2'}, include='address', limit=3)
+
+        self.assertEqual([(obj['type'], obj['id']) for obj in batch.fetch()], [('Company', '1'), ('Address', '1')])
+        self.assertEqual(batch.truncated, {'company'})
+
+    def test_limit_counts_every_include_path(self):
+        event_client = RemoteEventClient()
+        batch = RemoteIncludeBatch(event_client, make_request())
+        batch.add('company', {'type': 'Company', 'id': '1'}, limit=2)
+        batch.add('company', {'type': 'Company', 'id': '1'}, include='address', limit=2)
+        batch.add('company', {'type': 'Company', 'id': '2'}, include='address', limit=2)
+        batch.add('company', {'type': 'Company', 'id': '3'}, include='address', limit=2)
+
+        resources = batch.fetch()
+
+        self.assertEqual(sorted(request['pk'] for request in event_client.requests), [['1'], ['1', '2']])
+        self.assertEqual([(obj['type'], obj['id']) for obj in resources], [('Company', '1'), ('Address', '1')])
+        self.assertEqual(batch.truncated, {'company'})
+
+    def test_lowest_limit_of_a_field_applies(self):
+        for limits in ((None, 2, 5), (5, None, 2), (5, 2, None)):
+            batch = RemoteIncludeBatch(RemoteEventClient(), make_request())
+            for pk, limit in enumerate(limits):
+                batch.add('company', {'type': 'Company', 'id': str(pk)}, include='address', limit=limit)
+
+            self.assertEqual(batch.limits, {'company': 2}, limits)
+            self.assertEqual([(obj['type'], obj['id']) for obj in batch.fetch()],
+                             [('Company', '0'), ('Address', '0')], limits)
+            self.assertEqual(batch.truncated, {'company'})
+
+    def test_fields_within_their_limit_are_complete(self):
+        batch = RemoteIncludeBatch(RemoteEventClient(), make_request())
+        batch.add('company', {'type': 'Company', 'id': '1'}, include='address', limit=4)
+        batch.add('company', {'type': 'Company', 'id': '2'}, include='address', limit=4)
+
+        self.assertEqual(len(batch.fetch()), 4)
+        self.assertEqual(batch.truncated, set())
+
+
+@skipIf(RemoteIncludeBatch is None, 'zc_events is not installed')
+class TestRemotePagination(TestCase):
+
+    def add_companies(self, batch, count, **kwargs):
+        for pk in range(1, count + 1):
+            batch.add('company', {'type': 'Company', 'id': str(pk)}, **kwargs)
+
+    def test_next_pages_are_followed(self):
+        event_client = RemoteEventClient(remote_page_size=2)
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_companies(batch, 5)
+
+        self.assertEqual([obj['id'] for obj in batch.fetch()], ['1', '2', '3', '4', '5'])
+        self.assertEqual([request['page'] for request in event_client.requests], [1, 2, 3])
+        self.assertEqual(batch.truncated, set())
+
+    def test_pages_stop_at_the_limit(self):
+        event_client = RemoteEventClient(remote_page_size=2)
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_companies(batch, 3, include='address', limit=3)
+
+        resources = batch.fetch()
+
+        self.assertEqual([request['page'] for request in event_client.requests], [1])
+        self.assertEqual([(obj['type'], obj['id']) for obj in resources], [('Company', '1'), ('Address', '1')])
+        self.assertEqual(batch.truncated, {'company'})
+
+    def test_next_links_without_a_page_number_truncate(self):
+        event_client = RemoteEventClient(remote_page_size=2, next_link='http://remote/companies/?page[cursor]=abc')
+        batch = RemoteIncludeBatch(event_client, make_request())
+        self.add_companies(batch, 5)
+
+        self.assertEqual([obj['id'] for obj in batch.fetch()], ['1', '2'])
+        self.assertEqual(len(event_client.requests), 1)
+        self.assertEqual(batch.truncated, {'company'})
@@ -0,0 +1,256 @@
+from unittest import skipIf
+
+import mock
+import ujson
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework_json_api import utils
+from rest_framework_json_api.relations import ResourceRelatedField
+from rest_framework_json_api.renderers import JSONRenderer as BaseJSONRenderer
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource.viewsets import list_orders
+from tests.serializers import OrderSerializer, RestaurantSerializer, TagSerializer
+from zc_common.remote_resource import utils as zc_common_utils
+from zc_common.remote_resource.fieldsets import restrict_to_sparse_fieldset
+
+try:
+    from zc_common.remote_resource import renderers
+except ImportError:  # zc_events isn't installed
+    renderers = None
+
+
+class TagOrdersSerializer(TagSerializer):
+    orders = ResourceRelatedField(source='order_set', many=True, read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = ('id', 'label', 'orders')
+
+
+class OrderTagOrdersSerializer(OrderSerializer):
+    included_serializers = {'restaurant': OrderSerializer.included_serializers['restaurant'],
+                            'tags': TagOrdersSerializer}
+
+
+class CachedOrderSerializer(OrderSerializer):
+    class JSONAPIMeta:
+        fragment_cache_version_field = 'modified'
+
+
+class CachedRestaurantSerializer(RestaurantSerializer):
+    orders = ResourceRelatedField(many=True, read_only=True)
+
+    class Meta(RestaurantSerializer.Meta):
+        fields = ('id', 'name', 'orders')
+
+    class JSONAPIMeta:
+        # Nothing on the row changes with its orders, only invalidation keeps the linkage fresh
+        fragment_cache_version_field = 'id'
+
+
+class CachedTagOrdersSerializer(TagOrdersSerializer):
+    class JSONAPIMeta:
+        fragment_cache_version_field = 'id'
+
+
+class CachedRelationsSerializer(CachedOrderSerializer):
+    included_serializers = {'restaurant': CachedRestaurantSerializer, 'tags': CachedTagOrdersSerializer}
+
+
+def render(query_string, **attributes):
+    response = list_orders(query_string, renderer_classes=(renderers.JSONRenderer,), **attributes)
+    return ujson.loads(response.render().content)
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestSharedIncludes(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy', 'Sweet')]
+        for index in range(36):
+            Order.objects.create(title='Order {}'.format(index), restaurant=restaurant).tags.set(tags)
+
+    def test_shared_to_many_includes_are_serialized_once(self):
+        represent = mock.Mock(wraps=TagOrdersSerializer.to_representation)
+
+        with mock.patch.object(TagOrdersSerializer, 'to_representation', autospec=True, side_effect=represent), \
+                self.assertNumQueries(5):
+            # The orders, their tags, then the orders of each tag
+            document = render('include=tags', serializer_class=OrderTagOrdersSerializer)
+
+        self.assertEqual(represent.call_count, 3)
+        self.assertEqual(len(document['data']), 36)
+        self.assertEqual(sorted(obj['attributes']['label'] for obj in document['included']),
+                         ['Spicy', 'Sweet', 'Vegan'])
+        self.assertEqual([len(obj['relationships']['orders']['data']) for obj in document['included']], [36] * 3)
+
+
+def get_linkage(resource_object, field_name):
+    return sorted(int(identifier['id']) for identifier in resource_object['relationships'][field_name]['data'])
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+@override_settings(RESOURCE_FRAGMENT_CACHE_TIMEOUT=60)
+class TestFragmentCacheInvalidation(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.restaurant = Restaurant.objects.create(name='Cafe')
+        self.tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        self.order = Order.objects.create(title='Soup', restaurant=self.restaurant)
+        self.order.tags.set(self.tags[:1])
+
+    def render(self, query_string=''):
+        document = render(query_string, serializer_class=CachedRelationsSerializer)
+        included = dict((obj['type'], obj) for obj in document.get('included', []))
+        return document['data'][0], included
+
+    def test_rows_are_read_from_the_cache(self):
+        self.render('include=restaurant,tags')
+
+        with mock.patch.object(CachedRelationsSerializer, 'to_representation') as represent, \
+                mock.patch.object(CachedRestaurantSerializer, 'to_representation') as represent_included:
+            order, included = self.render('include=restaurant')
+
+        self.assertEqual((represent.call_count, represent_included.call_count), (0, 0))
+        self.assertEqual(get_linkage(order, 'tags'), [self.tags[0].pk])
+        self.assertEqual(get_linkage(included['Restaurant'], 'orders'), [self.order.pk])
+
+    def test_many_to_many_changes(self):
+        self.render('include=tags')
+
+        self.order.tags.set(self.tags[1:])
+        order, included = self.render('include=tags')
+
+        self.assertEqual(get_linkage(order, 'tags'), [self.tags[1].pk])
+        self.assertEqual(included['Tag']['attributes']['label'], 'Spicy')
+        self.assertEqual(get_linkage(included['Tag'], 'orders'), [self.order.pk])
+
+    def test_many_to_many_changes_from_the_other_side(self):
+        self.render('include=tags')
+
+        self.tags[0].order_set.clear()
+        self.assertEqual(get_linkage(self.render()[0], 'tags'), [])
+
+        self.tags[0].order_set.add(self.order)
+        order, included = self.render('include=tags')
+        self.assertEqual(get_linkage(order, 'tags'), [self.tags[0].pk])
+        self.assertEqual(get_linkage(included['Tag'], 'orders'), [self.order.pk])
+
+    def test_children_saved_or_deleted(self):
+        self.render('include=restaurant')
+
+        other = Order.objects.create(title='Salad', restaurant=self.restaurant)
+        self.assertEqual(get_linkage(self.render('include=restaurant')[1]['Restaurant'], 'orders'),
+                         [self.order.pk, other.pk])
+
+        other.delete()
+        self.assertEqual(get_linkage(self.render('include=restaurant')[1]['Restaurant'], 'orders'), [self.order.pk])
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestFieldPlan(TestCase):
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Cafe')
+        tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        for index, title in enumerate(('Soup', 'Salad', 'Curry')):
+            Order.objects.create(title=title, is_paid=index == 1, restaurant=restaurant).tags.set(tags[:index])
+
+    def get_fields(self, serializer):
+        return utils.get_serializer_fields(serializer)
+
+    def test_plans_are_kept_per_serializer_class_and_fields(self):
+        plan = renderers.JSONRenderer.get_field_plan(self.get_fields(OrderSerializer()))
+
+        self.assertEqual(plan, renderers.FieldPlan(
+            (('title', False), ('is_paid', False), ('modified', True)), ('restaurant', 'tags'), frozenset()))
+        self.assertIs(renderers.JSONRenderer.get_field_plan(self.get_fields(OrderSerializer(many=True))), plan)
+        self.assertIsNot(renderers.JSONRenderer.get_field_plan(self.get_fields(OrderTagOrdersSerializer())), plan)
+
+    def test_sparse_fieldsets_get_plans_of_their_own(self):
+        plan = renderers.JSONRenderer.get_field_plan(self.get_fields(OrderSerializer()))
+        serializer = restrict_to_sparse_fieldset(OrderSerializer(), None, fieldsets={'Order': frozenset(['title'])})
+
+        sparse_plan = renderers.JSONRenderer.get_field_plan(self.get_fields(serializer))
+
+        self.assertIsNot(sparse_plan, plan)
+        self.assertEqual(sparse_plan.attributes, (('title', False),))
+        self.assertEqual(renderers.JSONRenderer.get_field_plan(self.get_fields(OrderSerializer())), plan)
+
+    def test_resource_objects_are_unchanged(self):
+        instances = list(Order.objects.order_by('id'))
+        serializer = OrderSerializer(instances, many=True)
+        fields = self.get_fields(serializer.child)
+
+        for resource, instance in zip(serializer.data, instances):
+            self.assertEqual(renderers.JSONRenderer.build_json_resource_obj(fields, resource, instance, 'Order'),
+                             BaseJSONRenderer.build_json_resource_obj(fields, resource, instance, 'Order'))
+
+    def test_sparse_attributes_are_unchanged(self):
+        instances = list(Order.objects.order_by('id'))
+        serializer = OrderSerializer(instances, many=True)
+        restrict_to_sparse_fieldset(serializer, None, fieldsets={'Order': frozenset(['title', 'modified'])})
+        fields = self.get_fields(serializer.child)
+
+        for resource in serializer.data:
+            self.assertEqual(renderers.JSONRenderer.extract_attributes(fields, resource),
+                             BaseJSONRenderer.extract_attributes(fields, resource))
+            self.assertEqual(list(renderers.JSONRenderer.extract_attributes(fields, resource)), ['title', 'modified'])
+
+
+def make_included(resource_type, pk):
+    return {
+        'type': resource_type,
+        'id': str(pk),
+        'attributes': {'first_name': 'Sally', 'isPaid': True, 'contact-info': [{'phone_number': '555-5555'}]},
+        'relationships': {'home_restaurant': {'data': {'type': 'Restaurant', 'id': '1'}}},
+    }
+
+
+def format_unmemoized(obj, format_type):
+    if isinstance(obj, dict):
+        return dict((utils.format_value(key, format_type), format_unmemoized(value, format_type))
+                    for key, value in obj.items())
+    if isinstance(obj, list):
+        return [format_unmemoized(item, format_type) for item in obj]
+    return obj
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestBuildIncluded(TestCase):
+
+    def setUp(self):
+        self.included = [make_included('Vendor', pk) for pk in (2, 1)] + [
+            make_included('Customer', 1), make_included('Vendor', 2)]
+
+    def test_included_objects_are_unique_and_sorted(self):
+        included = renderers.JSONRenderer.build_included(self.included)
+
+        self.assertEqual([(obj['type'], obj['id']) for obj in included],
+                         [('Customer', '1'), ('Vendor', '1'), ('Vendor', '2')])
+
+    def test_formatting_matches_unmemoized_formatting(self):
+        expected = [self.included[2], self.included[1], self.included[0]]
+
+        for format_type in ('dasherize', 'camelize', 'underscore'):
+            with override_settings(JSON_API_FORMAT_FIELD_NAMES=format_type):
+                included = renderers.JSONRenderer.build_included(self.included)
+
+            self.assertEqual(included, format_unmemoized(expected, format_type), format_type)
+
+    @override_settings(JSON_API_FORMAT_FIELD_NAMES='camelize')
+    def test_keys_are_formatted_once(self):
+        zc_common_utils.formatted_keys['camelize'].clear()
+        self.addCleanup(zc_common_utils.formatted_keys['camelize'].clear)
+        camelize = mock.Mock(wraps=zc_common_utils.KEY_FORMATS['camelize'])
+
+        with mock.patch.dict(zc_common_utils.KEY_FORMATS, {'camelize': camelize}):
+            renderers.JSONRenderer.build_included(self.included)
+            renderers.JSONRenderer.build_included(self.included)
+
+        # type, id, attributes, relationships, data and the five field names, whatever the number of objects
+        keys = [call[0][0] for call in camelize.call_args_list]
+        self.assertEqual(len(keys), 10)
+        self.assertEqual(len(set(keys)), 10)
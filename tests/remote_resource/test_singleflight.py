@@ -0,0 +1,62 @@
+import threading
+import time
+from unittest import TestCase
+
+import mock
+
+from zc_common.remote_resource import singleflight
+from zc_common.remote_resource.singleflight import SingleFlight
+
+
+@mock.patch.object(singleflight, 'statsd')
+class TestSingleFlight(TestCase):
+
+    def run_concurrently(self, flights, key, func, count=5):
+        results = list()
+
+        def call():
+            try:
+                results.append(flights.do(key, func))
+            except ValueError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_result(self, statsd):
+        calls = list()
+
+        def func():
+            calls.append(None)
+            time.sleep(0.1)
+            return {'data': []}
+
+        results = self.run_concurrently(SingleFlight('flights'), 'company', func)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(statsd.incr.call_count, 4)
+
+    def test_concurrent_calls_share_the_error(self, statsd):
+        error = ValueError()
+
+        def func():
+            time.sleep(0.1)
+            raise error
+
+        results = self.run_concurrently(SingleFlight('flights'), 'company', func)
+
+        self.assertEqual(results, [error] * 5)
+
+    def test_later_calls_are_made_again(self, statsd):
+        flights = SingleFlight('flights')
+        func = mock.Mock(side_effect=[1, 2])
+
+        self.assertEqual(flights.do('company', func), 1)
+        self.assertEqual(flights.do('company', func), 2)
+        self.assertEqual(flights.flights, {})
@@ -0,0 +1,120 @@
+from unittest import skipIf
+
+import mock
+import ujson
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+
+from tests.models import Order, Restaurant, Tag
+from tests.remote_resource import viewsets
+from zc_common.remote_resource.pagination import CursorPagination, PageNumberPagination
+
+try:
+    from zc_common.remote_resource import renderers
+    from zc_common.remote_resource.remote_includes import RemoteResourceIncludeError
+except ImportError:  # zc_events isn't installed
+    renderers = None
+
+
+def list_orders(query_string, streamed=True, **attributes):
+    return viewsets.list_orders(query_string, renderer_classes=(renderers.JSONRenderer,),
+                                stream_list_responses=streamed, stream_chunk_size=2, **attributes)
+
+
+def get_document(response):
+    if isinstance(response, StreamingHttpResponse):
+        return ujson.loads(b''.join(response.streaming_content))
+    return ujson.loads(response.render().content)
+
+
+def strip_modified(document):
+    for resource in document['data']:
+        resource['attributes'].pop('modified', None)
+    return document
+
+
+@skipIf(renderers is None, 'zc_events is not installed')
+class TestStreamList(TestCase):
+
+    def setUp(self):
+        restaurants = [Restaurant.objects.create(name=name) for name in ('Cafe', 'Diner')]
+        tags = [Tag.objects.create(label=label) for label in ('Vegan', 'Spicy')]
+        for index, title in enumerate(('Soup', 'Salad', 'Curry', 'Pie', 'Rice')):
+            Order.objects.create(title=title, restaurant=restaurants[index % 2]).tags.set(tags[:index % 3])
+
+    def assertSameDocument(self, query_string, **attributes):
+        streamed = list_orders(query_string, **attributes)
+        rendered = list_orders(query_string, streamed=False, **attributes)
+
+        self.assertIsInstance(streamed, StreamingHttpResponse)
+        self.assertNotIsInstance(rendered, StreamingHttpResponse)
+        self.assertEqual(streamed['Content-Type'], 'application/vnd.api+json')
+        document = get_document(streamed)
+        self.assertEqual(document, get_document(rendered))
+        return document
+
+    def test_rows_are_streamed_like_a_rendered_response(self):
+        document = self.assertSameDocument('')
+
+        self.assertEqual([resource['attributes']['title'] for resource in document['data']],
+                         ['Soup', 'Salad', 'Curry', 'Pie', 'Rice'])
+        self.assertNotIn('included', document)
+
+    def test_included_objects_follow_every_chunk(self):
+        document = self.assertSameDocument('include=restaurant,tags')
+
+        self.assertEqual(list(document), ['data', 'included'])
+        self.assertEqual(sorted((obj['type'], obj['attributes'].get('name', obj['attributes'].get('label')))
+                                for obj in document['included']),
+                         [('Restaurant', 'Cafe'), ('Restaurant', 'Diner'), ('Tag', 'Spicy'), ('Tag', 'Vegan')])
+
+    def test_pages(self):
+        document = self.assertSameDocument('page_size=2&page=2', pagination_class=PageNumberPagination)
+
+        self.assertEqual(list(document), ['links', 'data', 'meta'])
+        self.assertEqual([resource['attributes']['title'] for resource in document['data']], ['Curry', 'Pie'])
+        self.assertEqual(document['meta']['pagination']['count'], 5)
+        self.assertTrue(document['links']['next'].endswith('page=3&page_size=2'))
+
+    def test_compiled_serializers(self):
+        document = strip_modified(self.assertSameDocument('', compile_serializers=True))
+
+        self.assertEqual(document['data'][0], strip_modified(get_document(list_orders('')))['data'][0])
+
+    def test_rows_are_written_as_they_are_built(self):
+        with mock.patch.object(renderers.JSONRenderer, 'build_json_resource_obj',
+                               wraps=renderers.JSONRenderer.build_json_resource_obj) as build:
+            chunks = iter(list_orders('').streaming_content)
+            self.assertEqual(build.call_count, 0)
+
+            while not next(chunks).startswith(b'{"type"'):
+                pass
+            self.assertEqual(build.call_count, 1)
+
+            list(chunks)
+            self.assertEqual(build.call_count, 5)
+
+    def test_includes_are_prefetched_for_each_chunk(self):
+        response = list_orders('include=restaurant,tags')
+
+        # The rows, then the tags of each chunk of two rows
+        with self.assertNumQueries(4):
+            document = get_document(response)
+
+        self.assertEqual(len(document['data']), 5)
+
+    def test_include_errors_go_to_meta(self):
+        error = RemoteResourceIncludeError('company', {'status': '502', 'detail': 'Bad gateway'})
+
+        with mock.patch.object(renderers.RemoteIncludeBatch, 'fetch', side_effect=error):
+            document = get_document(list_orders('include=tags'))
+
+        self.assertEqual(len(document['data']), 5)
+        self.assertEqual(document['meta']['include_errors'],
+                         [{'status': '502', 'detail': 'Bad gateway', 'meta': {'include_field': 'company'}}])
+
+    def test_paginators_without_a_page_queryset_are_not_streamed(self):
+        response = list_orders('page_size=2', pagination_class=CursorPagination)
+
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(len(get_document(response)['data']), 2)
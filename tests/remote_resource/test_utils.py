@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from django.test import override_settings
+from mock import patch
+
+from zc_common.remote_resource import utils
+
+
+class TestFormatKeys(TestCase):
+
+    def setUp(self):
+        self.data = {
+            'first_name': 'John',
+            'contact_info': [{'phone_number': '555-5555', 'is_primary': True}],
+            'tags': ('a_b',),
+        }
+
+    def test_camelize(self):
+        self.assertEqual(utils.format_keys(self.data, 'camelize'), {
+            'firstName': 'John',
+            'contactInfo': [{'phoneNumber': '555-5555', 'isPrimary': True}],
+            'tags': ('a_b',),
+        })
+
+    def test_dasherize_camel_case_keys(self):
+        self.assertEqual(utils.format_keys({'firstName': 1}, 'dasherize'), {'first-name': 1})
+
+    def test_capitalize(self):
+        self.assertEqual(utils.format_keys({'first_name': 1}, 'capitalize'), {'FirstName': 1})
+
+    def test_underscore(self):
+        self.assertEqual(utils.format_keys({'firstName': {'is-primary': 1}}, 'underscore'),
+                         {'first_name': {'is_primary': 1}})
+
+    def test_unknown_format_type_returns_object_unchanged(self):
+        self.assertIs(utils.format_keys(self.data, 'bogus'), self.data)
+
+    @override_settings(JSON_API_FORMAT_FIELD_NAMES='camelize')
+    def test_format_type_defaults_to_setting(self):
+        self.assertEqual(utils.format_keys({'first_name': 1}), {'firstName': 1})
+
+    def test_formatting_copies_the_tree(self):
+        formatted = utils.format_keys(self.data, 'underscore')
+
+        self.assertEqual(formatted, self.data)
+        self.assertIsNot(formatted, self.data)
+        self.assertIsNot(formatted['contact_info'][0], self.data['contact_info'][0])
+
+    def test_memo_table_is_bounded(self):
+        utils.formatted_keys['camelize'].clear()
+        self.addCleanup(utils.formatted_keys['camelize'].clear)
+
+        with patch.object(utils, 'MAX_FORMATTED_KEYS', 2):
+            formatted = utils.format_keys({'a_b': 1, 'c_d': 2, 'e_f': 3}, 'camelize')
+
+        self.assertEqual(formatted, {'aB': 1, 'cD': 2, 'eF': 3})
+        self.assertEqual(len(utils.formatted_keys['camelize']), 2)
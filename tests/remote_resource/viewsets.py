@@ -0,0 +1,50 @@
+"""
+The viewset that view-level tests send their requests to. Tests needing other options pass them as attributes,
+which are set on a subclass made for the request.
+"""
+import ujson
+from rest_framework.test import APIRequestFactory
+
+from tests.models import Order
+from tests.serializers import OrderSerializer
+from zc_common.remote_resource.views import ModelViewSet
+
+
+class OrderViewSet(ModelViewSet):
+    queryset = Order.objects.order_by('id')
+    serializer_class = OrderSerializer
+    resource_name = 'Order'
+
+
+def get_view_class(view_class=OrderViewSet, **attributes):
+    if not attributes:
+        return view_class
+    return type(view_class.__name__, (view_class,), attributes)
+
+
+def list_orders(query_string='', view_class=OrderViewSet, **attributes):
+    """
+    Returns the response, not yet rendered, of the list action for `/orders/?<query_string>`.
+    """
+    view = get_view_class(view_class, **attributes).as_view({'get': 'list'})
+    return view(APIRequestFactory().get('/orders/?' + query_string))
+
+
+def send(method, data, view_class=OrderViewSet, **attributes):
+    """
+    Returns the response of a write to the collection with `data` as the document's primary data.
+    """
+    view = get_view_class(view_class, **attributes).as_view(
+        {'post': 'create', 'patch': 'bulk_update', 'delete': 'bulk_destroy'})
+    body = ujson.dumps({'data': data})
+    request = getattr(APIRequestFactory(), method)('/orders/', body, content_type='application/vnd.api+json')
+    return view(request)
+
+
+def get_list_view(query_string='', view_class=OrderViewSet, **attributes):
+    """
+    Returns the list view as it is set up for a request for `/orders/?<query_string>`, for calling its methods.
+    """
+    view = get_view_class(view_class, **attributes)(action_map={'get': 'list'}, kwargs={}, format_kwarg=None)
+    view.request = view.initialize_request(APIRequestFactory().get('/orders/?' + query_string))
+    return view
@@ -0,0 +1,26 @@
+from rest_framework_json_api import serializers
+from rest_framework_json_api.relations import ResourceRelatedField
+
+from tests.models import Order, Restaurant, Tag
+
+
+class TagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ('id', 'label')
+
+
+class RestaurantSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Restaurant
+        fields = ('id', 'name')
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    restaurant = ResourceRelatedField(queryset=Restaurant.objects.all())
+    tags = ResourceRelatedField(queryset=Tag.objects.all(), many=True, required=False)
+    included_serializers = {'restaurant': RestaurantSerializer, 'tags': TagSerializer}
+
+    class Meta:
+        model = Order
+        fields = ('id', 'title', 'is_paid', 'restaurant', 'tags', 'modified')
@@ -0,0 +1,153 @@
+"""
+Bulk writes
+
+Services syncing hundreds of records would otherwise make hundreds of requests, each decoding a token, checking
+permissions and running its own transaction and INSERT. `ModelViewSet`s with `bulk_writes = True` accept documents
+whose `data` is an array of resource objects instead:
+
+    POST /vendors     {"data": [{"type": "Vendor", "attributes": {...}}, ...]}          creates every object
+    PATCH /vendors    {"data": [{"type": "Vendor", "id": "1", "attributes": {...}}, ...]}  updates every object
+    DELETE /vendors   {"data": [{"type": "Vendor", "id": "1"}, ...]}                    deletes every object
+
+Every object is validated before anything is written, and the errors of all of them are reported together, with
+pointers such as `/data/3/attributes/name`. The rows are then written in one transaction with `bulk_create()` and
+`bulk_update()`, which don't call `save()` or send `pre_save`/`post_save` signals.
+"""
+from django.conf import settings
+from django.db import connections, router
+import six
+from rest_framework.serializers import ModelSerializer, raise_errors_on_nested_writes
+from rest_framework.settings import api_settings
+from rest_framework.utils import model_meta
+
+from zc_common.remote_resource.fragment_cache import invalidate_resource_fragments
+from zc_common.remote_resource.utils import KEY_FORMATS, format_key
+
+
+def get_error_objects(errors, status_code=400):
+    """
+    Turns the errors of a bulk request, a list holding the serializer errors of each resource object (empty for
+    valid ones), into JSON API error objects pointing at the object and field they are about.
+    """
+    format_type = getattr(settings, 'JSON_API_FORMAT_FIELD_NAMES', False)
+
+    error_objects = list()
+    for index, item_errors in enumerate(errors):
+        for field_name, messages in (item_errors or {}).items():
+            if field_name == api_settings.NON_FIELD_ERRORS_KEY:
+                pointer = '/data/{}'.format(index)
+            elif field_name == 'id':
+                pointer = '/data/{}/id'.format(index)
+            else:
+                if format_type in KEY_FORMATS:
+                    field_name = format_key(field_name, format_type)
+                pointer = '/data/{}/attributes/{}'.format(index, field_name)
+
+            if not isinstance(messages, list):
+                messages = [messages]
+            for message in messages:
+                error_object = {'detail': message, 'status': str(status_code), 'source': {'pointer': pointer}}
+                code = getattr(message, 'code', None)
+                if code is not None:
+                    error_object['code'] = code
+                error_objects.append(error_object)
+
+    return error_objects
+
+
+def can_return_pks(model):
+    """
+    Whether `bulk_create()` sets the primary keys of the rows it inserts for `model` (PostgreSQL does).
+    """
+    features = connections[router.db_for_write(model)].features
+    return getattr(features, 'can_return_rows_from_bulk_insert',
+                   getattr(features, 'can_return_ids_from_bulk_insert', False))
+
+
+def overrides(serializer, method_name):
+    method = getattr(type(serializer), method_name)
+    return six.get_unbound_function(method) is not six.get_unbound_function(getattr(ModelSerializer, method_name))
+
+
+def pop_many_to_many(model, validated_data):
+    """
+    Removes the values of to-many relations from `validated_data`, as `ModelSerializer` does before saving, and
+    returns them.
+    """
+    many_to_many = dict()
+    for field_name, relation_info in model_meta.get_field_info(model).relations.items():
+        if relation_info.to_many and field_name in validated_data:
+            many_to_many[field_name] = validated_data.pop(field_name)
+    return many_to_many
+
+
+def create_rows(serializer, batch_size=None):
+    """
+    Creates the rows validated by `serializer`, a `many=True` `ModelSerializer`, with `bulk_create()`, and returns
+    them. Serializers with their own `create()`, and databases that don't return the primary keys of the rows
+    (SQLite, MySQL), get one INSERT per row instead.
+    """
+    child = serializer.child
+    model = child.Meta.model
+    if overrides(child, 'create') or not can_return_pks(model):
+        return serializer.save()
+
+    instances = list()
+    many_to_many = list()
+    for validated_data in serializer.validated_data:
+        validated_data = dict(validated_data)
+        raise_errors_on_nested_writes('create', child, validated_data)
+        many_to_many.append(pop_many_to_many(model, validated_data))
+        instances.append(model(**validated_data))
+
+    instances = model._default_manager.bulk_create(instances, batch_size=batch_size)
+    for instance, relations in zip(instances, many_to_many):
+        for field_name, value in relations.items():
+            getattr(instance, field_name).set(value)
+
+    serializer.instance = instances
+    return instances
+
+
+def update_rows(serializers, batch_size=None):
+    """
+    Applies the changes validated by `serializers`, one `ModelSerializer` per row holding its instance, and saves
+    them with one `bulk_update()`. `auto_now` fields are brought up to date, as `save()` would, and the rows' fragment
+    cache entries are invalidated. Serializers with their own `update()`, or writing to something other than model
+    columns and to-many relations, save each row instead.
+    """
+    if not serializers:
+        return []
+
+    model = serializers[0].Meta.model
+    column_names = set(field.name for field in model._meta.concrete_fields)
+    auto_now_fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+
+    changes = list()
+    for serializer in serializers:
+        validated_data = dict(serializer.validated_data)
+        raise_errors_on_nested_writes('update', serializer, validated_data)
+        changes.append((validated_data, pop_many_to_many(model, validated_data)))
+
+    if overrides(serializers[0], 'update') or any(set(values) - column_names for values, _ in changes):
+        return [serializer.save() for serializer in serializers]
+
+    instances = list()
+    update_fields = set(field.name for field in auto_now_fields)
+    for serializer, (values, _) in zip(serializers, changes):
+        instance = serializer.instance
+        for attr, value in values.items():
+            setattr(instance, attr, value)
+        for field in auto_now_fields:
+            field.pre_save(instance, False)
+        update_fields.update(values)
+        instances.append(instance)
+
+    if update_fields:
+        model._default_manager.bulk_update(instances, sorted(update_fields), batch_size=batch_size)
+    for instance, (_, relations) in zip(instances, changes):
+        for field_name, value in relations.items():
+            getattr(instance, field_name).set(value)
+        invalidate_resource_fragments(model, instance.pk)
+
+    return instances
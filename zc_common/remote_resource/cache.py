@@ -0,0 +1,171 @@
+"""
+Cross-request cache for remote includes
+
+Caches the JSON API objects other services return for remote includes, so that the same company or menu isn't
+requested again on every response that includes it. Entries are stored in a Django cache and are keyed by the
+remote resource type, primary key, nested include path, sparse fieldsets and the roles of the requesting user.
+
+The cache is off unless a timeout is configured:
+
+    REMOTE_INCLUDE_CACHE_TIMEOUT = 300  # seconds an entry may be served for
+    REMOTE_INCLUDE_CACHE_ALIAS = 'remote_includes'  # entry in CACHES to use, 'default' if not set
+    REMOTE_INCLUDE_CACHE_CLASS = 'zc_common.remote_resource.cache.RemoteIncludeCache'
+
+Services that learn about remote changes through events should call `invalidate_remote_resource()` from their
+event handlers. Invalidation only reaches the processes that share the cache, so the alias must then be a shared
+backend (memcached, redis): with a `LocMemCache` the handler's worker drops its own copies and the web workers keep
+serving theirs until they expire. `LocMemCache` is only suitable for tests and single-process setups.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from zc_common.monitoring import statsd
+
+
+def get_versions(cache, keys):
+    """
+    Returns a dict mapping each of the version token `keys` to its token in `cache`, creating the tokens that don't
+    exist yet. Concurrent callers agree on the new tokens, as only the first `add()` of each is kept.
+    """
+    versions = cache.get_many(keys)
+
+    missing = dict((key, uuid.uuid4().hex) for key in keys if key not in versions)
+    if missing:
+        # Versions are only replaced on invalidation, they don't expire with the entries they guard
+        for key, version in missing.items():
+            cache.add(key, version, timeout=None)
+        versions.update(cache.get_many(list(missing)))
+
+    return versions
+
+
+class RemoteIncludeCache(object):
+    """
+    Stores, for each remote primary resource, the resource object together with the included objects reachable
+    from it through its relationships.
+
+    Every key embeds a version token for the resource type and one for the individual resource. Invalidating
+    replaces the token, which orphans every entry built with the old one regardless of the include path or roles it
+    was stored under; orphaned entries expire or get evicted like any other.
+    """
+    key_prefix = 'remote_include'
+
+    def __init__(self, alias=None, timeout=None):
+        self.cache = caches[alias or getattr(settings, 'REMOTE_INCLUDE_CACHE_ALIAS', 'default')]
+        self.timeout = timeout if timeout is not None else getattr(settings, 'REMOTE_INCLUDE_CACHE_TIMEOUT', 0)
+
+    def version_key(self, resource_type, pk=None):
+        if pk is None:
+            return '{}:version:{}'.format(self.key_prefix, resource_type)
+        return '{}:version:{}:{}'.format(self.key_prefix, resource_type, pk)
+
+    def make_keys(self, resource_type, pks, include, roles, query_params=None):
+        type_version_key = self.version_key(resource_type)
+        version_keys = dict((pk, self.version_key(resource_type, pk)) for pk in pks)
+        versions = get_versions(self.cache, [type_version_key] + list(version_keys.values()))
+
+        roles = ','.join(sorted(roles or []))
+        query_params = '&'.join('{}={}'.format(key, value) for key, value in sorted((query_params or {}).items()))
+        keys = dict()
+        for pk in pks:
+            digest = hashlib.md5('|'.join([
+                resource_type, pk, include or '', roles, query_params,
+                versions.get(type_version_key, ''), versions.get(version_keys[pk], ''),
+            ]).encode('utf-8')).hexdigest()
+            keys[pk] = '{}:{}'.format(self.key_prefix, digest)
+
+        return keys
+
+    def get_many(self, resource_type, pks, include, roles, query_params=None):
+        """
+        Returns a dict mapping the cached primary keys to their list of JSON API objects.
+        """
+        if not pks:
+            return dict()
+
+        keys = self.make_keys(resource_type, pks, include, roles, query_params)
+        values = self.cache.get_many(list(keys.values()))
+        cached = dict((pk, values[key]) for pk, key in keys.items() if key in values)
+
+        if cached:
+            statsd.incr('remote_include_cache.hit', len(cached))
+        if len(cached) < len(pks):
+            statsd.incr('remote_include_cache.miss', len(pks) - len(cached))
+
+        return cached
+
+    def set_many(self, resource_type, resources, include, roles, query_params=None):
+        """
+        Stores `resources`, a dict mapping primary keys to their list of JSON API objects.
+        """
+        if not resources:
+            return
+
+        keys = self.make_keys(resource_type, list(resources), include, roles, query_params)
+        self.cache.set_many(dict((keys[pk], value) for pk, value in resources.items()), timeout=self.timeout)
+
+    def invalidate(self, resource_type, pk=None):
+        """
+        Drops the cached copies of one remote resource, or of every resource of `resource_type` if no `pk` is given.
+        """
+        self.cache.set(self.version_key(resource_type, None if pk is None else str(pk)), uuid.uuid4().hex,
+                       timeout=None)
+        statsd.incr('remote_include_cache.invalidate')
+
+
+def get_remote_include_cache():
+    """
+    Returns an instance of the configured cache class, or None if remote include caching is disabled.
+    """
+    if not getattr(settings, 'REMOTE_INCLUDE_CACHE_TIMEOUT', 0):
+        return None
+
+    cache_class = getattr(settings, 'REMOTE_INCLUDE_CACHE_CLASS', 'zc_common.remote_resource.cache.RemoteIncludeCache')
+    return import_string(cache_class)()
+
+
+def invalidate_remote_resource(resource_type, pk=None):
+    """
+    Meant to be called from event handlers when a remote resource changes, e.g.
+
+        invalidate_remote_resource('Company', event.data['id'])
+
+    `resource_type` is the type named in the `RemoteForeignKey`, as it appears in relationship linkage.
+    """
+    remote_include_cache = get_remote_include_cache()
+    if remote_include_cache is not None:
+        remote_include_cache.invalidate(resource_type, pk)
+
+
+def group_by_primary_resource(data, included):
+    """
+    Splits a remote response into a dict mapping each primary resource's id to a list holding the resource followed
+    by the included objects reachable from it.
+    """
+    included_by_identifier = dict(((obj['type'], obj['id']), obj) for obj in included)
+
+    grouped = dict()
+    for resource in data:
+        related = list()
+        seen = set()
+        stack = [resource]
+        while stack:
+            obj = stack.pop()
+            for relationship in (obj.get('relationships') or {}).values():
+                linkage = relationship.get('data') if isinstance(relationship, dict) else None
+                if isinstance(linkage, dict):
+                    linkage = [linkage]
+                for identifier in linkage or []:
+                    identifier = (identifier.get('type'), identifier.get('id'))
+                    if identifier in included_by_identifier and identifier not in seen:
+                        seen.add(identifier)
+                        related.append(included_by_identifier[identifier])
+                        stack.append(included_by_identifier[identifier])
+
+        grouped[str(resource['id'])] = [resource] + related
+
+    return grouped
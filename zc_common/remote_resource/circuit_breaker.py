@@ -0,0 +1,105 @@
+"""
+Circuit breakers for remote includes
+
+When another service is down, every response that includes its resources would otherwise wait for the event
+client's `RequestTimeout`, tying up our workers. Each remote resource type gets a breaker:
+
+ * closed: requests go through; consecutive failures (timeouts and 5xx responses) are counted
+ * open: after `REMOTE_INCLUDE_BREAKER_FAILURE_THRESHOLD` failures in a row, requests fail straight away with
+   `RemoteResourceUnavailableError` for `REMOTE_INCLUDE_BREAKER_RESET_TIMEOUT` seconds
+ * half-open: once that time has passed, a single trial request is let through; it closes the breaker if it
+   succeeds and opens it again if it fails
+
+    REMOTE_INCLUDE_BREAKER_FAILURE_THRESHOLD = 5  # 0 turns the breakers off
+    REMOTE_INCLUDE_BREAKER_RESET_TIMEOUT = 30
+
+Breakers live in the process, so each worker finds out about an unhealthy service on its own. State changes are
+counted in statsd as `remote_include_breaker.<resource type>.<state>`.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from zc_common.monitoring import statsd
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Returns whether a request may be made. In the half-open state only the trial request is allowed, or another
+        one if the trial has not reported back within the reset timeout.
+        """
+        if not self.failure_threshold:
+            return True
+
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+
+            if time.time() - self.opened_at < self.reset_timeout:
+                return False
+
+            # `opened_at` now tracks when the trial request started
+            self.opened_at = time.time()
+            self.set_state(HALF_OPEN)
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.set_state(CLOSED)
+
+    def record_failure(self):
+        if not self.failure_threshold:
+            return
+
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                self.set_state(OPEN)
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            statsd.incr('remote_include_breaker.{}.{}'.format(self.name, state))
+
+
+breakers = dict()
+breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(resource_type):
+    """
+    Returns the process-wide breaker for `resource_type`, creating it from the settings the first time.
+    """
+    try:
+        return breakers[resource_type]
+    except KeyError:
+        pass
+
+    with breakers_lock:
+        if resource_type not in breakers:
+            breakers[resource_type] = CircuitBreaker(
+                resource_type,
+                failure_threshold=getattr(settings, 'REMOTE_INCLUDE_BREAKER_FAILURE_THRESHOLD', 5),
+                reset_timeout=getattr(settings, 'REMOTE_INCLUDE_BREAKER_RESET_TIMEOUT', 30),
+            )
+        return breakers[resource_type]
@@ -0,0 +1,387 @@
+"""
+Compiled resource builders
+
+For simple read-only serializers, `serializer.data` followed by `build_json_resource_obj` costs far more than the
+data itself: every field of every row goes through `get_attribute`, `to_representation`, a `ReturnDict`, then the
+`extract_attributes`/`extract_relationships` loops and key formatting. `get_resource_builder()` inspects a
+`ModelSerializer` once and generates a function going straight from a model instance to its finished JSON API
+resource object, e.g. for `fields = ('id', 'title', 'user')`:
+
+    def build_resource(instance, request):
+        value = instance.title
+        attribute_0 = None if value is None else str(value)
+        value = instance.user_id
+        relationship_0 = {'data': None if value is None else OrderedDict((('type', 'users'), ('id', str(value))))}
+        return OrderedDict((
+            ('type', get_type(instance.__class__)),
+            ('id', str(instance.pk)),
+            ('attributes', OrderedDict((('title', attribute_0),))),
+            ('relationships', OrderedDict((('user', relationship_0),))),
+        ))
+
+Only fields whose output can be reproduced exactly are compiled: attributes read straight from concrete model
+fields by the plain DRF scalar fields, `ResourceRelatedField` relations without links and `RemoteResourceField`s
+on a `RemoteForeignKey`. A serializer with any other field, per-resource `meta_fields`, `get_root_meta()` or its own
+`to_representation()` gets no builder, and is rendered the generic way.
+
+Builders compiled with `values=True` read the rows of `queryset.values_list(*builder.values)` instead (`row[1]`
+for `instance.title`), so no model instances, and no `RemoteResource`s, are created at all. To-many relations need
+model instances, so serializers with any are only compiled for those.
+"""
+from collections import OrderedDict
+import copy
+import threading
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.serializers import ListSerializer, ModelSerializer, Serializer
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnList
+from rest_framework_json_api import serializers as json_api_serializers
+from rest_framework_json_api import utils
+from rest_framework_json_api.relations import ResourceRelatedField
+
+from zc_common.remote_resource.models import RemoteForeignKey
+from zc_common.remote_resource.relations import RemoteResourceField
+from zc_common.remote_resource.utils import KEY_FORMATS, format_key
+
+
+# Fields whose `to_representation()` only depends on the value; `CharField` and `IntegerField` are inlined
+SCALAR_FIELDS = frozenset([
+    drf_fields.CharField, drf_fields.EmailField, drf_fields.SlugField, drf_fields.URLField, drf_fields.UUIDField,
+    drf_fields.IntegerField, drf_fields.FloatField, drf_fields.DecimalField, drf_fields.BooleanField,
+    drf_fields.NullBooleanField, drf_fields.DateTimeField, drf_fields.DateField, drf_fields.TimeField,
+    drf_fields.ChoiceField,
+])
+INLINE_CONVERSIONS = {
+    drf_fields.CharField: 'str',
+    drf_fields.IntegerField: 'int',
+}
+
+# `to_representation()` implementations that render the fields in order and nothing else
+PLAIN_REPRESENTATIONS = frozenset([
+    Serializer.to_representation,
+    json_api_serializers.ModelSerializer.to_representation,
+])
+
+# Like `renderers.field_plans`, builders are kept per serializer class and field names, which sparse fieldsets make
+# vary, so the number kept is capped
+MAX_RESOURCE_BUILDERS = 1000
+
+resource_builders = dict()
+resource_builders_lock = threading.Lock()
+
+
+class UncompilableField(Exception):
+    pass
+
+
+def get_resource_builder(serializer, values=False):
+    """
+    Returns the compiled builder for the resource objects of `serializer` (or of its child, for `many=True`), or
+    None if the serializer can't be compiled. Builders are called with a model instance and the request; with
+    `values` they're called with a row of `queryset.values_list(*builder.values)` instead.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+
+    fields = serializer.fields
+    key = (
+        serializer.__class__,
+        tuple(fields),
+        getattr(serializer, 'sparse_fieldset', None),
+        getattr(settings, 'JSON_API_FORMAT_FIELD_NAMES', False),
+        values,
+    )
+    try:
+        return resource_builders[key]
+    except KeyError:
+        pass
+
+    try:
+        builder = ResourceBuilderCompiler(serializer, values).compile()
+    except UncompilableField:
+        builder = None
+
+    with resource_builders_lock:
+        if len(resource_builders) < MAX_RESOURCE_BUILDERS:
+            resource_builders[key] = builder
+    return builder
+
+
+class ResourceBuilderCompiler(object):
+    """
+    Generates the source of the builder for a serializer, reading either the attributes of a model instance or the
+    columns of a `values_list()` row. `compile()` raises `UncompilableField` if some part of the serializer can't be
+    compiled.
+    """
+
+    def __init__(self, serializer, values=False):
+        self.serializer = serializer
+        self.model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        self.values = ['pk'] if values else None
+        self.namespace = {
+            'OrderedDict': OrderedDict,
+            'get_type': get_resource_type_getter(),
+        }
+        self.lines = ['def build_resource({}, request):'.format(self.row_name)]
+
+    @property
+    def row_name(self):
+        return 'instance' if self.values is None else 'row'
+
+    def read(self, model_field, expression=None):
+        """
+        Returns the source reading the column of `model_field` from the row; `expression` selects it in values mode.
+        """
+        if self.values is None:
+            return 'instance.{}'.format(model_field.attname)
+
+        self.values.append(expression or model_field.attname)
+        return 'row[{}]'.format(len(self.values) - 1)
+
+    def compile(self):
+        serializer = self.serializer
+        if not isinstance(serializer, ModelSerializer):
+            raise UncompilableField('{} is not a ModelSerializer'.format(serializer.__class__.__name__))
+        if type(serializer).to_representation not in PLAIN_REPRESENTATIONS:
+            raise UncompilableField('{} has its own to_representation()'.format(serializer.__class__.__name__))
+        if getattr(serializer, 'get_root_meta', None) or getattr(serializer.Meta, 'meta_fields', None):
+            raise UncompilableField('{} adds meta'.format(serializer.__class__.__name__))
+
+        fieldset = getattr(serializer, 'sparse_fieldset', None)
+        format_type = getattr(settings, 'JSON_API_FORMAT_FIELD_NAMES', False)
+        attributes = list()
+        relationships = list()
+
+        for field_name, field in serializer.fields.items():
+            if field_name == api_settings.URL_FIELD_NAME:
+                raise UncompilableField('{} links to itself'.format(serializer.__class__.__name__))
+            if field.write_only:
+                continue
+
+            if isinstance(field, (relations.RelatedField, relations.ManyRelatedField)):
+                # Relations outside of the sparse fieldset are only kept to follow include paths
+                if fieldset is not None and field_name not in fieldset:
+                    continue
+                name = 'relationship_{}'.format(len(relationships))
+                self.compile_relationship(name, field)
+                relationships.append((utils.format_value(field_name, format_type), name))
+            elif field_name != 'id':
+                name = 'attribute_{}'.format(len(attributes))
+                self.compile_attribute(name, field)
+                if format_type in KEY_FORMATS:
+                    field_name = format_key(field_name, format_type)
+                attributes.append((field_name, name))
+
+        if self.values is None:
+            resource_type = 'get_type(instance.__class__)'
+            resource_id = 'str(instance.pk)'
+        else:
+            resource_type = repr(utils.get_resource_type_from_model(self.model))
+            resource_id = 'str(row[0])'
+
+        self.lines.extend([
+            '    return OrderedDict((',
+            "        ('type', {}),".format(resource_type),
+            "        ('id', {}),".format(resource_id),
+            "        ('attributes', {}),".format(ordered_dict_source(attributes)),
+        ])
+        if relationships:
+            self.lines.append("        ('relationships', {}),".format(ordered_dict_source(relationships)))
+        self.lines.append('    ))')
+
+        source = '\n'.join(self.lines)
+        filename = '<resource builder for {}>'.format(serializer.__class__.__name__)
+        exec(compile(source, filename, 'exec'), self.namespace)
+        builder = self.namespace['build_resource']
+        builder.source = source
+        builder.values = tuple(self.values) if self.values is not None else None
+        return builder
+
+    def compile_attribute(self, name, field):
+        field_class = type(field)
+        if field_class not in SCALAR_FIELDS:
+            raise UncompilableField('{} is a {}'.format(field.field_name, field_class.__name__))
+
+        model_field = get_model_field(self.model, field.source)
+        if model_field.is_relation or not model_field.concrete:
+            raise UncompilableField('{} does not read a column'.format(field.field_name))
+
+        conversion = INLINE_CONVERSIONS.get(field_class)
+        if conversion is None:
+            # An unbound copy, so that the builder doesn't keep the serializer (and its request) alive
+            conversion = '{}_field.to_representation'.format(name)
+            self.namespace['{}_field'.format(name)] = copy.deepcopy(field)
+
+        self.lines.extend([
+            '    value = {}'.format(self.read(model_field)),
+            '    {} = None if value is None else {}(value)'.format(name, conversion),
+        ])
+
+    def compile_relationship(self, name, field):
+        many = isinstance(field, relations.ManyRelatedField)
+        relation = field.child_relation if many else field
+        if isinstance(relation, RemoteResourceField) and not many:
+            return self.compile_remote_relationship(name, field)
+
+        if type(relation) is not ResourceRelatedField:
+            raise UncompilableField('{} is a {}'.format(field.field_name, type(relation).__name__))
+        if relation.self_link_view_name or relation.related_link_view_name:
+            raise UncompilableField('{} has links'.format(field.field_name))
+        if getattr(relation, 'pk_field', None) is not None:
+            raise UncompilableField('{} formats its ids'.format(field.field_name))
+
+        model_field = get_model_field(self.model, field.source)
+        related_model = model_field.related_model
+        resource_type = (relation.get_resource_type_from_included_serializer() or
+                         utils.get_resource_type_from_model(related_model))
+
+        if many:
+            if not (model_field.many_to_many or model_field.one_to_many) or get_accessor(model_field) != field.source:
+                raise UncompilableField('{} is not a to-many relation'.format(field.field_name))
+            if self.values is not None:
+                raise UncompilableField('{} needs model instances'.format(field.field_name))
+            self.lines.extend([
+                '    related = [{} for obj in instance.{}.all()]'.format(
+                    identifier_source(resource_type, 'str(obj.pk)'), field.source),
+                "    {} = {{'meta': {{'count': len(related)}}, 'data': related}}".format(name),
+            ])
+            return
+
+        if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+            raise UncompilableField('{} is not a foreign key'.format(field.field_name))
+        if model_field.target_field != related_model._meta.pk:
+            raise UncompilableField('{} does not refer to a primary key'.format(field.field_name))
+        self.lines.extend([
+            '    value = {}'.format(self.read(model_field)),
+            "    {} = {{'data': None if value is None else {}}}".format(
+                name, identifier_source(resource_type, 'str(value)')),
+        ])
+
+    def compile_remote_relationship(self, name, field):
+        """
+        Renders a `RemoteResourceField` the way its `to_representation()` and `get_links()` do, from the column of
+        its `RemoteForeignKey` rather than from a `RemoteResource`.
+        """
+        field_class = type(field)
+        if (field_class.to_representation is not RemoteResourceField.to_representation or
+                field_class.get_links is not RemoteResourceField.get_links):
+            raise UncompilableField('{} is a {}'.format(field.field_name, field_class.__name__))
+        if field.self_link_view_name:
+            raise UncompilableField('{} has a self link'.format(field.field_name))
+
+        model_field = get_model_field(self.model, field.source)
+        if not isinstance(model_field, RemoteForeignKey):
+            raise UncompilableField('{} is not a remote foreign key'.format(field.field_name))
+
+        if self.values is None:
+            self.lines.append('    value = instance.{}.id'.format(model_field.attname))
+        else:
+            # Selected through an expression of its own so that `from_db_value()` doesn't build a `RemoteResource`
+            expression = ExpressionWrapper(F(model_field.name), output_field=models.CharField())
+            self.lines.extend([
+                '    value = {}'.format(self.read(model_field, expression)),
+                '    value = str(value) if value else None',
+            ])
+
+        self.namespace['{}_path'.format(name)] = field.related_resource_path
+        self.lines.extend([
+            '    {} = dict()'.format(name),
+            '    if value:',
+            "        related_link = request.build_absolute_uri({}_path.format(pk=value))".format(name),
+            "        {}['links'] = OrderedDict((('related', related_link),))".format(name),
+            "    {}['data'] = {}".format(name, identifier_source(model_field.type, 'str(value)')),
+        ])
+
+
+def get_model_field(model, source):
+    if not source or '.' in source or source == '*':
+        raise UncompilableField('{} is not a model field'.format(source))
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        raise UncompilableField('{} is not a model field'.format(source))
+
+
+def get_accessor(model_field):
+    if model_field.auto_created and not model_field.concrete:
+        # The reverse side of a relation
+        return model_field.get_accessor_name()
+    return model_field.name
+
+
+def identifier_source(resource_type, resource_id):
+    return "OrderedDict((('type', {!r}), ('id', {})))".format(resource_type, resource_id)
+
+
+def ordered_dict_source(items):
+    if not items:
+        return 'OrderedDict()'
+    return 'OrderedDict(({},))'.format(', '.join('({!r}, {})'.format(key, name) for key, name in items))
+
+
+def get_resource_type_getter():
+    """
+    Returns a function giving the resource type of a model class, as `build_json_resource_obj` resolves it from
+    each instance, remembering it per class.
+    """
+    resource_types = dict()
+
+    def get_type(model):
+        try:
+            return resource_types[model]
+        except KeyError:
+            resource_type = resource_types[model] = utils.get_resource_type_from_model(model._meta.model)
+            return resource_type
+
+    return get_type
+
+
+class CompiledResourceList(ReturnList):
+    """
+    Stands in for `serializer.data` when the renderer builds the resource objects with a compiled builder, or reads
+    them from the fragment cache (`builder` is then None), so that the serializer doesn't serialize every row first.
+    Anything else that reads the list gets the regular data.
+    """
+
+    def __init__(self, serializer, builder, rows=None):
+        super(CompiledResourceList, self).__init__(serializer=serializer)
+        self.builder = builder
+        # What the builder is called with: the serializer's instances, or `values_list()` rows
+        self.rows = serializer.instance if rows is None else rows
+        self.materialized = False
+
+    def materialize(self):
+        if not self.materialized:
+            self.materialized = True
+            self.extend(self.serializer.data)
+        return self
+
+    def __len__(self):
+        return list.__len__(self.materialize())
+
+    def __iter__(self):
+        return list.__iter__(self.materialize())
+
+    def __getitem__(self, index):
+        return list.__getitem__(self.materialize(), index)
+
+    def __contains__(self, item):
+        return list.__contains__(self.materialize(), item)
+
+    def __eq__(self, other):
+        return list.__eq__(self.materialize(), other)
+
+    def __ne__(self, other):
+        return list.__ne__(self.materialize(), other)
+
+    def __repr__(self):
+        return list.__repr__(self.materialize())
+
+    def __reduce__(self):
+        return (list, (list(self.materialize()),))
@@ -0,0 +1,129 @@
+"""
+Sparse fieldsets
+
+Clients can ask for only some of the fields of a resource type with the JSON API `fields[TYPE]` query parameter,
+e.g. `/orders?fields[Order]=title,restaurant&fields[Restaurant]=name`. The requested fieldsets are applied at every
+layer a response goes through:
+
+ * serializers drop the fields that weren't asked for before anything is serialized, keeping the relations that
+   the `include` parameter still has to follow (those are left out of the rendered `relationships`)
+ * `ModelViewSet` loads only the columns its remaining fields read, with `queryset.only()`
+ * the `fields[...]` parameters are passed on to other services with the remote includes
+"""
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import HyperlinkedIdentityField
+from rest_framework.serializers import ListSerializer
+from rest_framework.settings import api_settings
+from rest_framework_json_api import utils
+
+from zc_common.remote_resource.models import RemoteForeignKey
+from zc_common.remote_resource.utils import format_key
+
+
+SPARSE_FIELDSET_PARAM = re.compile(r'^fields\[(.+)\]$')
+
+
+def get_sparse_fieldset_params(request):
+    """
+    Returns the `fields[TYPE]` query parameters of `request` as a dict, as they were sent.
+    """
+    query_params = getattr(request, 'query_params', None) or {}
+    return dict((key, query_params.get(key)) for key in query_params if SPARSE_FIELDSET_PARAM.match(key))
+
+
+def get_sparse_fieldsets(request):
+    """
+    Returns a dict mapping each resource type named in a `fields[TYPE]` query parameter to the set of its
+    requested field names, underscored.
+    """
+    fieldsets = dict()
+    for key, value in get_sparse_fieldset_params(request).items():
+        resource_type = SPARSE_FIELDSET_PARAM.match(key).group(1)
+        fieldsets[resource_type] = frozenset(
+            format_key(field_name.strip(), 'underscore') for field_name in value.split(',') if field_name.strip())
+    return fieldsets
+
+
+def restrict_to_sparse_fieldset(serializer, request, included_resources=None, fieldsets=None):
+    """
+    Removes the fields that the request's fieldset for the serializer's resource type leaves out. `id`, the URL
+    field and the relations that `included_resources` starts with are kept. The fieldset is recorded on the
+    serializer as `sparse_fieldset` so that the renderer can leave the relations kept for includes out of
+    `relationships`.
+
+    Callers restricting many serializers for the same request can pass the result of `get_sparse_fieldsets()` as
+    `fieldsets` rather than have the query parameters parsed each time.
+    """
+    if fieldsets is None:
+        fieldsets = get_sparse_fieldsets(request)
+    if not fieldsets:
+        return serializer
+
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+
+    try:
+        resource_type = utils.get_resource_type_from_serializer(serializer)
+    except AttributeError:
+        return serializer
+
+    fieldset = fieldsets.get(resource_type)
+    if fieldset is None:
+        return serializer
+
+    kept = set(fieldset)
+    kept.update(['id', api_settings.URL_FIELD_NAME])
+    kept.update(format_key(path, 'underscore').split('.')[0] for path in included_resources or [])
+
+    # `fields` is a BindingDict, pop from a copy of the names since it changes during the loop
+    for field_name in list(serializer.fields.fields):
+        if field_name not in kept:
+            serializer.fields.pop(field_name)
+
+    serializer.sparse_fieldset = fieldset
+    return serializer
+
+
+def get_only_fields(model, serializer):
+    """
+    Returns the names of the model fields that `serializer` reads, for `queryset.only()`, or None if some serializer
+    field reads something that can't be traced back to a model field (a method, a property, the whole object).
+
+    Remote foreign keys are always loaded, since they can't be deferred, and so is the version field of a serializer
+    using the fragment cache, which every row is looked up by.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+
+    opts = model._meta
+    only_fields = set([opts.pk.name])
+    only_fields.update(field.name for field in opts.concrete_fields if isinstance(field, RemoteForeignKey))
+
+    version_field = getattr(getattr(serializer, 'JSONAPIMeta', None), 'fragment_cache_version_field', None)
+    if version_field is not None:
+        only_fields.add(version_field)
+
+    for field_name, field in serializer.fields.items():
+        if field.write_only or isinstance(field, HyperlinkedIdentityField):
+            continue
+
+        source = field.source or field_name
+        if source == '*':
+            return None
+        source = source.split('.')[0]
+
+        try:
+            model_field = opts.get_field(source)
+        except FieldDoesNotExist:
+            return None
+
+        # Django counts many-to-many fields as concrete, though their rows are in another table
+        if model_field.concrete and not model_field.many_to_many:
+            only_fields.add(model_field.name)
+        elif not (model_field.auto_created or model_field.many_to_many):
+            # Generic foreign keys and the like read columns of their own
+            return None
+
+    return sorted(only_fields)
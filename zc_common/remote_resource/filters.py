@@ -1,10 +1,10 @@
 import re
+import threading
 from distutils.util import strtobool
 
 from django.contrib.postgres.forms import SimpleArrayField
 from django.contrib.postgres.fields import ArrayField
 from django.db.models import BooleanField, ForeignKey
-from django.core.exceptions import FieldDoesNotExist
 from django.db.models.fields.related import ManyToManyField
 from django import forms
 import six
@@ -71,9 +71,99 @@ class JSONAPIFilterSet(filterset.FilterSet):
         }
 
 
+# Schemas are kept per filter backend, view class and model, so the number kept is capped like the compiler's builders
+MAX_FILTER_SCHEMAS = 1000
+
+FILTER_PARAMETER = re.compile(r'^filter\[(\w+)\]$')
+
+filter_schemas = dict()
+filter_schemas_lock = threading.Lock()
+
+
+def split_values(value):
+    return value.split(',')
+
+
+def parse_boolean(value):
+    # Allow 'true' or 'false' as values for boolean fields
+    return bool(strtobool(value))
+
+
+class FilterSchema(object):
+    """
+    What `filter[]` parameters can do on the rows of a view: the `FilterSet` class, the fields that may be filtered
+    on and their lookups, and how the values of filters on many-to-many, array and boolean fields are parsed. The
+    model's fields and the filters are walked once, when the schema is built.
+    """
+
+    def __init__(self, model, filter_class, filterset_fields):
+        self.model = model
+        self.filter_class = filter_class
+        if isinstance(filterset_fields, dict):
+            self.fields = dict(filterset_fields)
+        else:
+            self.fields = dict((name, ['exact']) for name in filterset_fields or [])
+
+        # Filters on to-many relations are matched on the whole filter string, e.g. ?filter[tags]=1,2
+        self.many_to_many_fields = set()
+        for field in model._meta.get_fields():
+            if field.is_relation and field.auto_created and not field.concrete:
+                name = field.get_accessor_name()
+            else:
+                name = field.name
+            if name and isinstance(getattr(getattr(model, name, None), 'field', None), ManyToManyField):
+                self.many_to_many_fields.add(name)
+
+        self.coercers = dict()
+        for name, field_filter in six.iteritems(getattr(filter_class, 'base_filters', {})):
+            if isinstance(field_filter, ArrayFilter):
+                self.coercers[name] = split_values
+        for field in model._meta.concrete_fields:
+            if isinstance(field, BooleanField):
+                self.coercers[field.name] = parse_boolean
+
+    def parse(self, filter_string, filter_value):
+        """
+        Returns the name of the field that `filter_string` filters on, and `filter_value` parsed for it.
+        """
+        field_name = filter_string.rsplit('__', 1)[0]
+
+        # Translates the 'id' in ?filter[id]= into the primary key identifier, e.g. 'pk'
+        if field_name == 'id':
+            field_name = self.model._meta.pk.name
+
+        if filter_string in self.many_to_many_fields:
+            filter_value = split_values(filter_value)
+
+        coercer = self.coercers.get(field_name)
+        if coercer is not None:
+            filter_value = coercer(filter_value)
+
+        return field_name, filter_value
+
+
 class JSONAPIFilterBackend(DjangoFilterBackend):
     filterset_base = JSONAPIFilterSet
 
+    def get_filter_schema(self, view, queryset):
+        """
+        Returns the `FilterSchema` for `view` and the model of `queryset`, built on first use. The view's
+        `filterset_fields` and `filterset_class` are only read then, so they shouldn't vary from request to request.
+        """
+        key = (self.__class__, view.__class__, queryset.model)
+        try:
+            return filter_schemas[key]
+        except KeyError:
+            pass
+
+        filter_class = self.get_filterset_class(view, queryset)
+        schema = FilterSchema(queryset.model, filter_class, getattr(view, 'filterset_fields', None))
+
+        with filter_schemas_lock:
+            if len(filter_schemas) < MAX_FILTER_SCHEMAS:
+                filter_schemas[key] = schema
+        return schema
+
     # This method takes the filter query string (looks something like ?filter[xxx]=yyy) and parses into parameters
     # that django_filters can interface with.
     #
@@ -85,65 +175,21 @@ class JSONAPIFilterBackend(DjangoFilterBackend):
     #   ?filter[relatedobject__relatedobject__in]=1,2,3
     #   ?filter[delivery_days__contains]=true  # filtering on ArrayField
     #   ?filter[active]=1  # filtering on Boolean values of 1, 0, true or false
-    def _parse_filter_string(self, queryset, filter_class, filter_string, filter_value):
-        filter_string_parts = filter_string.split('__')
-        if len(filter_string_parts) > 1:
-            field_name = '__'.join(filter_string_parts[:-1])
-        else:
-            field_name = filter_string_parts[0]
-
-        # Translates the 'id' in ?filter[id]= into the primary key identifier, e.g. 'pk'
-        if field_name == 'id':
-            primary_key = queryset.model._meta.pk.name
-            field_name = primary_key
-
-        try:
-            is_many_to_many_field = isinstance(getattr(queryset.model, filter_string).field, ManyToManyField)
-            if is_many_to_many_field:
-                filter_value = filter_value.split(',')
-        except AttributeError:
-            pass
-
-        try:
-            field_filter = filter_class.get_filters().get(field_name, None)
-            is_array_filter = isinstance(field_filter, ArrayFilter)
-            if is_array_filter:
-                filter_value = filter_value.split(',')
-        except AttributeError:
-            pass
-
-        # Allow 'true' or 'false' as values for boolean fields
-        try:
-            if isinstance(queryset.model._meta.get_field(field_name), BooleanField):
-                filter_value = bool(strtobool(filter_value))
-        except FieldDoesNotExist:
-            pass
-
-        filterset_data = {
-            'field_name': field_name,
-            'field_name_with_lookup': filter_string,
-            'filter_value': filter_value
-        }
-
-        return filterset_data
-
     def filter_queryset(self, request, queryset, view):
-        filter_class = self.get_filterset_class(view, queryset)
+        schema = self.get_filter_schema(view, queryset)
 
-        filters = []
+        filterset_data = {}
         for param, value in six.iteritems(request.query_params):
-            match = re.search(r'^filter\[(\w+)\]$', param)
+            match = FILTER_PARAMETER.match(param)
             if match:
                 filter_string = match.group(1)
-                parsed_filter_string = self._parse_filter_string(queryset, filter_class, filter_string, value)
-                filters.append(parsed_filter_string)
-
-                for filter_ in filters:
-                    if filter_['field_name'] not in view.filterset_fields.keys():
-                        return queryset.none()
-
-        filterset_data = {filter_['field_name_with_lookup']: filter_['filter_value'] for filter_ in filters}
-        if filter_class:
-            return filter_class(filterset_data, queryset=queryset).qs
+                field_name, filter_value = schema.parse(filter_string, value)
+                # Requests to filter on fields that can't be filtered on get no rows
+                if field_name not in schema.fields:
+                    return queryset.none()
+                filterset_data[filter_string] = filter_value
+
+        if schema.filter_class:
+            return schema.filter_class(filterset_data, queryset=queryset).qs
 
         return queryset
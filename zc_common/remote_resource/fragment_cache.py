@@ -0,0 +1,188 @@
+"""
+Fragment cache for rendered resource objects
+
+Resources that rarely change (menus, vendors) are otherwise serialized and turned into JSON API resource objects
+again on every response that lists or includes them. Serializers opt in by naming the model field that changes
+whenever the row does:
+
+    class VendorSerializer(serializers.ModelSerializer):
+        class JSONAPIMeta:
+            fragment_cache_version_field = 'modified'
+
+and the finished resource objects are then kept in a Django cache, keyed by resource type, primary key, the value of
+the version field, the serializer class and its fields (sparse fieldsets give other fields), the key format and the
+host the request was made to (links are absolute). The cache is off unless a timeout is configured:
+
+    RESOURCE_FRAGMENT_CACHE_TIMEOUT = 300  # seconds an entry may be served for
+    RESOURCE_FRAGMENT_CACHE_ALIAS = 'resource_fragments'  # entry in CACHES to use, 'default' if not set
+
+Saving or deleting a row through the ORM invalidates its cached objects, along with those of the rows it has a
+foreign key to, whose to-many linkage lists it (see `invalidate_saved_resource`). Adding or removing many-to-many
+links invalidates the rows on both sides (see `invalidate_related_resources`). This covers version fields that don't
+change on every save, and linkage that changes without the row itself being saved; a row moved to another parent
+leaves the old parent's entries to its version field. `queryset.update()` and `bulk_update()` send no signals, so
+only the version field keeps entries from those fresh. Only opt in serializers whose output depends on the rows
+alone, and not on the requesting user.
+
+Invalidation happens in whichever process saves the row, so with more than one process the alias must be a shared
+backend (memcached, redis); a `LocMemCache` only suits tests and single-process setups.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from zc_common.monitoring import statsd
+from zc_common.remote_resource.cache import get_versions
+
+
+class ResourceFragmentCache(object):
+    """
+    Stores the resource objects that one serializer, with one set of fields, builds for the rows of a model.
+
+    Like `RemoteIncludeCache`, every key embeds a version token for the model and one for the row, and invalidating
+    replaces the token, orphaning every entry built with the old one whatever serializer built it.
+    """
+    key_prefix = 'resource_fragment'
+
+    def __init__(self, serializer, request, version_field, alias=None, timeout=None):
+        self.cache = caches[alias or getattr(settings, 'RESOURCE_FRAGMENT_CACHE_ALIAS', 'default')]
+        self.timeout = timeout if timeout is not None else getattr(settings, 'RESOURCE_FRAGMENT_CACHE_TIMEOUT', 0)
+        self.version_field = version_field
+
+        fieldset = getattr(serializer, 'sparse_fieldset', None)
+        self.serializer_key = '|'.join([
+            '{}.{}'.format(serializer.__class__.__module__, serializer.__class__.__name__),
+            ','.join(serializer.fields),
+            ','.join(sorted(fieldset)) if fieldset is not None else '',
+            str(getattr(settings, 'JSON_API_FORMAT_FIELD_NAMES', False)),
+            request.build_absolute_uri('/') if request is not None else '',
+        ])
+
+    @classmethod
+    def version_key(cls, label, pk=None):
+        if pk is None:
+            return '{}:version:{}'.format(cls.key_prefix, label)
+        return '{}:version:{}:{}'.format(cls.key_prefix, label, pk)
+
+    def make_keys(self, instances, part='data'):
+        """
+        Returns the cache keys of `instances`, in the same order, for the objects built for `part` of the document
+        (`data` or `included`).
+        """
+        if not instances:
+            return []
+
+        labels = dict((instance.__class__, instance._meta.concrete_model._meta.label) for instance in instances)
+        type_version_keys = dict((label, self.version_key(label)) for label in set(labels.values()))
+        version_keys = [self.version_key(labels[instance.__class__], instance.pk) for instance in instances]
+        versions = get_versions(self.cache, list(type_version_keys.values()) + version_keys)
+
+        keys = list()
+        for instance, version_key in zip(instances, version_keys):
+            label = labels[instance.__class__]
+            digest = hashlib.md5('|'.join([
+                part, label, str(instance.pk), str(getattr(instance, self.version_field)), self.serializer_key,
+                versions.get(type_version_keys[label], ''), versions.get(version_key, ''),
+            ]).encode('utf-8')).hexdigest()
+            keys.append('{}:{}'.format(self.key_prefix, digest))
+
+        return keys
+
+    def get_many(self, keys):
+        """
+        Returns a dict mapping the cached keys among `keys` to their resource objects.
+        """
+        if not keys:
+            return dict()
+
+        cached = self.cache.get_many(keys)
+        if cached:
+            statsd.incr('resource_fragment_cache.hit', len(cached))
+        if len(cached) < len(keys):
+            statsd.incr('resource_fragment_cache.miss', len(keys) - len(cached))
+
+        return cached
+
+    def set_many(self, resource_objects):
+        """
+        Stores `resource_objects`, a dict mapping keys from `make_keys()` to resource objects.
+        """
+        if resource_objects:
+            self.cache.set_many(resource_objects, timeout=self.timeout)
+
+
+def get_fragment_cache(serializer, request):
+    """
+    Returns the fragment cache for the resource objects of `serializer` (or of its child, for `many=True`), or None
+    if fragment caching is disabled or the serializer doesn't opt in.
+    """
+    if not getattr(settings, 'RESOURCE_FRAGMENT_CACHE_TIMEOUT', 0):
+        return None
+
+    serializer = getattr(serializer, 'child', serializer)
+    version_field = getattr(getattr(serializer, 'JSONAPIMeta', None), 'fragment_cache_version_field', None)
+    if version_field is None:
+        return None
+
+    return ResourceFragmentCache(serializer, request, version_field)
+
+
+def invalidate_resource_fragments(model, pk=None):
+    """
+    Drops the cached resource objects of one row of `model`, or of every row if no `pk` is given.
+    """
+    invalidate_rows([(model, pk)])
+
+
+def invalidate_rows(rows):
+    """
+    Drops the cached resource objects of `rows`, a list of `(model, pk)` pairs, where a `pk` of None stands for every
+    row of the model.
+    """
+    if not getattr(settings, 'RESOURCE_FRAGMENT_CACHE_TIMEOUT', 0) or not rows:
+        return
+
+    versions = dict((ResourceFragmentCache.version_key(model._meta.concrete_model._meta.label, pk), uuid.uuid4().hex)
+                    for model, pk in rows)
+    cache = caches[getattr(settings, 'RESOURCE_FRAGMENT_CACHE_ALIAS', 'default')]
+    cache.set_many(versions, timeout=None)
+    statsd.incr('resource_fragment_cache.invalidate', len(versions))
+
+
+def invalidate_saved_resource(sender, instance, **kwargs):
+    """
+    `post_save`/`post_delete` receiver, connected for every model by `zc_common.remote_resource.models`. The rows
+    the instance has a foreign key to are dropped too, as their to-many linkage lists it.
+    """
+    if not getattr(settings, 'RESOURCE_FRAGMENT_CACHE_TIMEOUT', 0):
+        return
+
+    rows = [(sender, instance.pk)]
+    for field in instance._meta.concrete_fields:
+        if field.many_to_one or field.one_to_one:
+            # `RemoteForeignKey` points to another service and has no model
+            related_pk = getattr(instance, field.attname) if field.related_model is not None else None
+            if related_pk is not None:
+                rows.append((field.related_model, related_pk))
+
+    invalidate_rows(rows)
+
+
+def invalidate_related_resources(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    `m2m_changed` receiver, connected by `zc_common.remote_resource.models`: adding or removing related objects
+    changes the linkage on both sides. `clear()` doesn't tell which rows it unlinked, so it drops every row of the
+    other model.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    rows = [(instance.__class__, instance.pk)]
+    if action == 'post_clear':
+        rows.append((model, None))
+    else:
+        rows.extend((model, pk) for pk in pk_set or ())
+
+    invalidate_rows(rows)
@@ -0,0 +1,159 @@
+"""
+Hedged remote include requests
+
+A few remote include requests end up in the long tail of the other service's latency and hold up the whole response.
+With hedging on, the latency of recent requests is tracked for each remote resource type, and a request that is
+still outstanding after the observed percentile gets a second, identical request; whichever answers first is used.
+
+    REMOTE_INCLUDE_HEDGING = True  # off by default
+    REMOTE_INCLUDE_HEDGE_PERCENTILE = 95  # latency percentile after which a request is hedged
+    REMOTE_INCLUDE_HEDGE_MAX_RATE = 0.05  # share of requests that may be hedged
+    REMOTE_INCLUDE_HEDGE_MAX_WORKERS = 32  # threads shared by the hedged requests of the process
+
+Nothing is hedged until a type has seen enough requests for the percentile to mean something, and hedges are paid
+for out of a budget that only grows with the number of requests made, so a slow service can't get twice the load.
+Hedges are counted in statsd as `remote_include_hedge.<resource type>`. Hedged requests run in one thread pool shared
+by the whole process rather than in threads of their own, so a slow service can't make a render start threads
+without bound either.
+"""
+from collections import deque
+from concurrent import futures
+import math
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+
+from zc_common.monitoring import statsd
+
+
+class LatencyTracker(object):
+    """
+    Keeps the latencies of the last `window` requests to a remote resource type and the hedging budget for it.
+    """
+
+    def __init__(self, name, window=200, min_samples=20, hedge_rate=0.05, max_hedges=10):
+        self.name = name
+        self.min_samples = min_samples
+        self.hedge_rate = hedge_rate
+        self.max_hedges = max_hedges
+
+        self.latencies = deque(maxlen=window)
+        self.hedges = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def percentile(self, percent):
+        """
+        Returns the latency below which `percent` of the recorded requests finished, or None if there aren't enough
+        samples yet.
+        """
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            latencies = sorted(self.latencies)
+
+        index = int(math.ceil(percent / 100.0 * len(latencies))) - 1
+        return latencies[min(max(index, 0), len(latencies) - 1)]
+
+    def request_started(self):
+        # Every request earns a fraction of a hedge, saved up to `max_hedges`
+        with self.lock:
+            self.hedges = min(self.hedges + self.hedge_rate, self.max_hedges)
+
+    def take_hedge(self):
+        with self.lock:
+            if self.hedges < 1:
+                return False
+            self.hedges -= 1
+            return True
+
+
+trackers = dict()
+trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(resource_type):
+    """
+    Returns the process-wide latency tracker for `resource_type`, creating it from the settings the first time.
+    """
+    try:
+        return trackers[resource_type]
+    except KeyError:
+        pass
+
+    with trackers_lock:
+        if resource_type not in trackers:
+            trackers[resource_type] = LatencyTracker(
+                resource_type, hedge_rate=getattr(settings, 'REMOTE_INCLUDE_HEDGE_MAX_RATE', 0.05))
+        return trackers[resource_type]
+
+
+hedge_executor = None
+hedge_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide thread pool hedged requests run in, creating it from the settings the first time.
+    """
+    global hedge_executor
+    if hedge_executor is not None:
+        return hedge_executor
+
+    with hedge_executor_lock:
+        if hedge_executor is None:
+            hedge_executor = futures.ThreadPoolExecutor(
+                max_workers=getattr(settings, 'REMOTE_INCLUDE_HEDGE_MAX_WORKERS', 32))
+        return hedge_executor
+
+
+def timed(tracker, request):
+    started = default_timer()
+    try:
+        return request()
+    finally:
+        tracker.record(default_timer() - started)
+
+
+def hedged_call(tracker, request, percentile=None):
+    """
+    Calls `request`, and calls it a second time if the first call is still running after the tracked percentile
+    latency and the budget allows for a hedge. Returns the result of whichever call succeeds first; if both fail,
+    the first error is raised.
+    """
+    if percentile is None:
+        percentile = getattr(settings, 'REMOTE_INCLUDE_HEDGE_PERCENTILE', 95)
+
+    tracker.request_started()
+    delay = tracker.percentile(percentile)
+    if delay is None:
+        return timed(tracker, request)
+
+    executor = get_executor()
+    pending = set([executor.submit(timed, tracker, request)])
+    try:
+        done, pending = futures.wait(pending, timeout=delay)
+
+        if not done and tracker.take_hedge():
+            statsd.incr('remote_include_hedge.{}'.format(tracker.name))
+            pending.add(executor.submit(timed, tracker, request))
+
+        errors = list()
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                errors.append(future.exception())
+
+            if not pending:
+                raise errors[0]
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+    finally:
+        # A request that hasn't started is dropped; the slower one can't be interrupted, it finishes in the
+        # background and still records its latency
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,72 @@
+"""
+Include trees
+
+The `include` query parameter is parsed once per request into an `IncludeTree`, which the renderer and the prefetch
+planner walk instead of rewriting the list of include paths for every row and field. Trees are immutable and
+hashable, so a subtree can stand for "these include paths, starting here" in the renderer's identity map.
+"""
+from collections import OrderedDict, namedtuple
+
+from zc_common.remote_resource.utils import format_key
+
+
+# name: the underscored field name
+# children: the `IncludeTree` of the paths continuing from this field
+# paths: those paths joined with commas, the way other services expect the `include` parameter
+IncludeNode = namedtuple('IncludeNode', ['name', 'children', 'paths'])
+
+
+class IncludeTree(tuple):
+    """
+    An ordered tuple of `IncludeNode`s, e.g. for `include=restaurant.company,tags`:
+
+        IncludeTree([
+            IncludeNode('restaurant', IncludeTree([IncludeNode('company', IncludeTree(), '')]), 'company'),
+            IncludeNode('tags', IncludeTree(), ''),
+        ])
+    """
+
+    def __new__(cls, nodes=()):
+        tree = super(IncludeTree, cls).__new__(cls, nodes)
+        tree.nodes = dict((node.name, node) for node in tree)
+        tree.names = tuple(node.name for node in tree)
+        return tree
+
+    @classmethod
+    def parse(cls, included_resources):
+        """
+        Builds the tree for a list of include paths, as returned by `utils.get_included_resources()`. A tree is
+        returned unchanged.
+        """
+        if isinstance(included_resources, IncludeTree):
+            return included_resources
+
+        branches = OrderedDict()
+        for path in included_resources or []:
+            branch = branches
+            for name in format_key(path, 'underscore').split('.'):
+                if name:
+                    branch = branch.setdefault(name, OrderedDict())
+        return cls.freeze(branches)
+
+    @classmethod
+    def freeze(cls, branches):
+        return cls(IncludeNode(name, cls.freeze(children), ','.join(cls.leaf_paths(children)))
+                   for name, children in branches.items())
+
+    @classmethod
+    def leaf_paths(cls, branches):
+        paths = list()
+        for name, children in branches.items():
+            if children:
+                paths.extend('{}.{}'.format(name, path) for path in cls.leaf_paths(children))
+            else:
+                paths.append(name)
+        return paths
+
+    def get(self, name):
+        return self.nodes.get(name)
+
+    @property
+    def depth(self):
+        return max([1 + node.children.depth for node in self] or [0])
@@ -0,0 +1,107 @@
+"""
+Render metrics
+
+Times the phases of a JSON API render and sends them to statsd through `zc_common.monitoring`, one stat per phase
+and resource name:
+
+    jsonapi.render.<resource name>.resources  # building the primary resource objects (attributes, relationships)
+    jsonapi.render.<resource name>.included  # building the included resource objects of this service
+    jsonapi.render.<resource name>.remote_includes  # fetching included resources from other services
+    jsonapi.render.<resource name>.format  # deduplicating, sorting and formatting the keys of `included` and `meta`
+    jsonapi.render.<resource name>.encode  # encoding the document
+    jsonapi.render.<resource name>.db  # time spent in database queries, during any of the above
+    jsonapi.render.<resource name>.total
+
+along with the counters `rows`, `included`, `remote_calls` and `queries`. Nothing is measured unless
+`STATSD_ENABLED` is on.
+"""
+from collections import OrderedDict
+from timeit import default_timer
+
+from django.conf import settings
+from django.db import connection
+
+from zc_common.monitoring import statsd
+
+
+class PhaseTimer(object):
+    """
+    Adds the time spent in each `with` block to `elapsed`, so a phase can be timed in pieces, e.g. once per row.
+    """
+    __slots__ = ('elapsed', 'started')
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.started = None
+
+    def __enter__(self):
+        self.started = default_timer()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed += default_timer() - self.started
+
+
+class NoopTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NOOP_TIMER = NoopTimer()
+
+
+class RenderMetrics(object):
+    prefix = 'jsonapi.render'
+
+    def __init__(self, resource_name):
+        self.enabled = getattr(settings, 'STATSD_ENABLED', False)
+        self.resource_name = resource_name
+        self.timers = OrderedDict()
+        self.counts = OrderedDict()
+        self.started = default_timer() if self.enabled else None
+
+    def phase(self, name):
+        """
+        Returns the context manager timing phase `name`; a shared one that does nothing when metrics are off.
+        """
+        if not self.enabled:
+            return NOOP_TIMER
+
+        try:
+            return self.timers[name]
+        except KeyError:
+            timer = self.timers[name] = PhaseTimer()
+            return timer
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def track_queries(self):
+        """
+        Returns a context manager that times the database queries run inside it as the `db` phase.
+        """
+        if not self.enabled:
+            return NOOP_TIMER
+        return connection.execute_wrapper(self.time_query)
+
+    def time_query(self, execute, sql, params, many, context):
+        self.count('queries', 1)
+        with self.phase('db'):
+            return execute(sql, params, many, context)
+
+    def send(self):
+        if not self.enabled:
+            return
+
+        stat_prefix = '{}.{}'.format(self.prefix, self.resource_name)
+        for name, timer in self.timers.items():
+            statsd.timing('{}.{}'.format(stat_prefix, name), timer.elapsed * 1000)
+        statsd.timing('{}.total'.format(stat_prefix), (default_timer() - self.started) * 1000)
+
+        for name, value in self.counts.items():
+            statsd.incr('{}.{}'.format(stat_prefix, name), value)
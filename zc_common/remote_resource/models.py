@@ -3,6 +3,8 @@ from __future__ import unicode_literals
 from django.db import models
 from django.db.models import signals
 
+from zc_common.remote_resource.fragment_cache import invalidate_related_resources, invalidate_saved_resource
+
 
 class RemoteResource(object):
 
@@ -68,3 +70,8 @@ class RemoteForeignKey(models.CharField):
         cls._meta.add_field(self)
 
         setattr(cls, name, self)
+
+
+signals.post_save.connect(invalidate_saved_resource, dispatch_uid='resource_fragment_cache.post_save')
+signals.post_delete.connect(invalidate_saved_resource, dispatch_uid='resource_fragment_cache.post_delete')
+signals.m2m_changed.connect(invalidate_related_resources, dispatch_uid='resource_fragment_cache.m2m_changed')
@@ -7,9 +7,21 @@ Had to create this custom pagination to include self link
 see:
 https://github.com/django-json-api/django-rest-framework-json-api/blob/develop/rest_framework_json_api/pagination.py
 """
+from base64 import b64encode
 from collections import OrderedDict
+import hashlib
+import json
 
+import six
 from six.moves.urllib import parse as urlparse
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.core.paginator import InvalidPage, Page
+from django.db import connections
+from django.db.models.query import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination as OldCursorPagination
 from rest_framework.pagination import PageNumberPagination as OldPagination
 from rest_framework.views import Response
 
@@ -48,13 +60,122 @@ def replace_query_param(url, key, val):
     return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
 
 
+# How `PageNumberPagination` finds the number of rows:
+#   exact: a COUNT(*) on every request
+#   cached: a COUNT(*) kept for `PAGINATION_COUNT_CACHE_TIMEOUT` seconds per query
+#   estimate: the PostgreSQL planner's estimate once it's over `PAGINATION_COUNT_ESTIMATE_THRESHOLD`, exact below
+#   has_more: no count, only whether a row follows the page
+COUNT_STRATEGIES = ('exact', 'cached', 'estimate', 'has_more')
+
+
+def get_count_query(queryset):
+    """
+    Returns the SQL and parameters of the rows `queryset` counts, without its ordering and selected columns so that
+    querysets filtering the same way give the same query, or None if it can't match any row.
+    """
+    try:
+        return queryset.order_by().values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+
+def get_cached_count(queryset):
+    query = get_count_query(queryset)
+    if query is None:
+        return 0
+
+    key = 'pagination_count:{}'.format(
+        hashlib.md5('{}|{}|{}'.format(queryset.db, *query).encode('utf-8')).hexdigest())
+    cache = caches[getattr(settings, 'PAGINATION_COUNT_CACHE_ALIAS', 'default')]
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 60))
+    return count
+
+
+def estimate_count(queryset):
+    """
+    Returns the number of rows PostgreSQL's planner expects `queryset` to have, or None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    query = get_count_query(queryset)
+    if query is None:
+        return 0
+
+    sql, params = query
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, six.string_types):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
 class PageNumberPagination(OldPagination):
     """
     A json-api compatible pagination format
+
+    The number of rows is counted the way `count_strategy` says (see `COUNT_STRATEGIES`): the view's
+    `pagination_count_strategy`, else the class's, else the `PAGINATION_COUNT_STRATEGY` setting, `exact` by default.
+    The strategy that was used is reported as `meta.pagination.count_strategy`.
     """
 
     page_size_query_param = 'page_size'
     max_page_size = 1000
+    count_strategy = None
+
+    def get_count_strategy(self, view):
+        strategy = (getattr(view, 'pagination_count_strategy', None) or self.count_strategy or
+                    getattr(settings, 'PAGINATION_COUNT_STRATEGY', 'exact'))
+        if strategy not in COUNT_STRATEGIES:
+            raise ImproperlyConfigured('Unknown pagination count strategy {}, expected one of {}'.format(
+                strategy, ', '.join(COUNT_STRATEGIES)))
+        return strategy
+
+    def count_rows(self, queryset, strategy):
+        """
+        Returns the number of rows of `queryset`, or None if it's left for the paginator to count or not counted at
+        all, and the strategy that was used.
+        """
+        if strategy == 'exact' or not isinstance(queryset, QuerySet):
+            return None, 'exact'
+        if strategy == 'cached':
+            return get_cached_count(queryset), strategy
+        if strategy == 'estimate':
+            count = estimate_count(queryset)
+            if count is None or count < getattr(settings, 'PAGINATION_COUNT_ESTIMATE_THRESHOLD', 10000):
+                return None, 'exact'
+            return count, strategy
+        return None, strategy
+
+    def get_uncounted_page(self, paginator, page_number):
+        """
+        Returns the page without cutting it short at the number of rows, which is estimated, cached or unknown.
+        """
+        if page_number in self.last_page_strings and self.used_count_strategy != 'has_more':
+            page_number = paginator.num_pages
+
+        try:
+            number = int(page_number)
+        except (TypeError, ValueError):
+            number = 0
+        if number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='That page number is not a positive integer'))
+        if self.used_count_strategy == 'cached' and number > max(paginator.num_pages, 1):
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='That page contains no results'))
+
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if self.used_count_strategy == 'has_more':
+            self.has_more = paginator.object_list.values_list('pk', flat=True)[top:top + 1].exists()
+        return Page(paginator.object_list[bottom:top], number, paginator)
 
     def build_link(self, index):
         if not index:
@@ -62,31 +183,165 @@ class PageNumberPagination(OldPagination):
         url = self.request and self.request.build_absolute_uri() or ''
         return replace_query_param(url, 'page', index)
 
-    def get_paginated_response(self, data):
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return list(page_queryset)
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Does what `paginate_queryset()` does, but returns the rows of the page as an unevaluated queryset so that
+        streaming responses can iterate over them.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        strategy = self.get_count_strategy(view)
+        count, self.used_count_strategy = self.count_rows(queryset, strategy)
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        if count is not None:
+            paginator.count = count
+        page_number = request.query_params.get(self.page_query_param, 1)
+
+        if self.used_count_strategy != 'exact':
+            self.page = self.get_uncounted_page(paginator, page_number)
+            self.request = request
+            return self.page.object_list
+
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=six.text_type(exc)
+            )
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            # The browsable API should display pagination controls.
+            self.display_page_controls = True
+
+        self.request = request
+        return self.page.object_list
+
+    def has_next(self):
+        if self.used_count_strategy == 'has_more':
+            return self.has_more
+        return self.page.has_next()
+
+    def get_pagination_meta(self):
+        pagination = OrderedDict([('page', self.page.number)])
+        if self.used_count_strategy == 'has_more':
+            pagination['has_more'] = self.has_more
+        else:
+            pagination['pages'] = self.page.paginator.num_pages
+            pagination['count'] = self.page.paginator.count
+        pagination['count_strategy'] = self.used_count_strategy
+
+        return {'pagination': pagination}
+
+    def get_pagination_links(self):
         next_page = None
         previous_page = None
+        last_page = None
 
-        if self.page.has_next():
-            next_page = self.page.next_page_number()
+        if self.has_next():
+            next_page = self.page.number + 1
         if self.page.has_previous():
-            previous_page = self.page.previous_page_number()
+            previous_page = self.page.number - 1
+        if self.used_count_strategy != 'has_more':
+            last_page = self.page.paginator.num_pages
 
         # hamedahmadi 05/02/2016 -- Adding this to include self link
         self_url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return OrderedDict([
+            ('self', self_url),
+            ('first', self.build_link(1)),
+            ('last', self.build_link(last_page)),
+            ('next', self.build_link(next_page)),
+            ('prev', self.build_link(previous_page))
+        ])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'results': data,
+            'meta': self.get_pagination_meta(),
+            'links': self.get_pagination_links(),
+        })
+
+
+class CursorPagination(OldCursorPagination):
+    """
+    A json-api compatible keyset pagination: each page is fetched with `WHERE <ordering column> > <position>` from
+    the opaque `page[cursor]` token of the `next`/`prev` links, instead of with OFFSET, and nothing is counted, so a
+    page costs the same however deep it is. The ordering column should be indexed, and unique or nearly so; it is
+    the primary key unless the view sets `cursor_ordering` (e.g. `'-created'`) or uses an ordering filter.
+    """
+
+    cursor_query_param = 'page[cursor]'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'pk'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Rows from `values_list()` (see `ModelViewSet.render_from_values`) are tuples, whose position is looked up
+        # by column name
+        self.row_fields = getattr(queryset, '_fields', None)
+        self.pk_name = queryset.model._meta.pk.name
+        return super(CursorPagination, self).paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering is None:
+            return super(CursorPagination, self).get_ordering(request, queryset, view)
+        if isinstance(ordering, six.string_types):
+            return (ordering,)
+        return tuple(ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        if not isinstance(instance, tuple):
+            return super(CursorPagination, self)._get_position_from_instance(instance, ordering)
+
+        field_name = ordering[0].lstrip('-')
+        if field_name == self.pk_name:
+            field_name = 'pk'
+        try:
+            return str(instance[list(self.row_fields).index(field_name)])
+        except ValueError:
+            raise ImproperlyConfigured(
+                'Rows are ordered by {}, which the serializer does not render'.format(field_name))
+
+    def encode_cursor(self, cursor):
+        """
+        Builds the link to `cursor`, keeping blank query parameters like `PageNumberPagination` does.
+        """
+        tokens = {}
+        if cursor.offset != 0:
+            tokens['o'] = str(cursor.offset)
+        if cursor.reverse:
+            tokens['r'] = '1'
+        if cursor.position is not None:
+            tokens['p'] = cursor.position
+
+        querystring = urlparse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_pagination_links(self):
+        self_url = remove_query_param(self.base_url, self.cursor_query_param)
+        return OrderedDict([
+            ('self', self_url),
+            ('next', self.get_next_link()),
+            ('prev', self.get_previous_link())
+        ])
+
+    def get_paginated_response(self, data):
         return Response({
             'results': data,
-            'meta': {
-                'pagination': OrderedDict([
-                    ('page', self.page.number),
-                    ('pages', self.page.paginator.num_pages),
-                    ('count', self.page.paginator.count),
-                ])
-            },
-            'links': OrderedDict([
-                ('self', self_url),
-                ('first', self.build_link(1)),
-                ('last', self.build_link(self.page.paginator.num_pages)),
-                ('next', self.build_link(next_page)),
-                ('prev', self.build_link(previous_page))
-            ])
+            'links': self.get_pagination_links(),
         })
@@ -3,12 +3,20 @@ Parsers
 """
 import ujson
 
-from rest_framework import parsers
-from rest_framework.exceptions import ParseError
+from django.conf import settings
+from rest_framework import parsers, status
+from rest_framework.exceptions import APIException, ParseError
 from rest_framework_json_api import utils, renderers, exceptions
 
 from zc_common.remote_resource import utils as zc_common_utils
 
+# ijson is optional, without it request bodies are read whole
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
 
 # `format_keys()` was replaced with `format_field_names()` from rest_framework_json_api in 3.0.0
 def key_formatter():
@@ -18,6 +26,53 @@ def key_formatter():
         return utils.format_keys
 
 
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body is too large.'
+    default_code = 'request_entity_too_large'
+
+
+def get_max_body_size():
+    return getattr(settings, 'JSON_API_MAX_BODY_SIZE', settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+
+
+class LimitedReader(object):
+    """
+    Reads from a request stream, raising `RequestEntityTooLarge` as soon as more than `max_size` bytes were read.
+    """
+
+    def __init__(self, stream, max_size):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge('Request body is larger than {} bytes.'.format(self.max_size))
+        return chunk
+
+
+def build_value(event, value, events):
+    """
+    Builds the JSON value starting with the ijson `event`, reading the rest of its events from `events`.
+    """
+    builder = ObjectBuilder()
+    builder.event(event, value)
+
+    depth = 1 if event in ('start_map', 'start_array') else 0
+    while depth:
+        _, event, value = next(events)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        builder.event(event, value)
+
+    return builder.value
+
+
 class JSONParser(parsers.JSONParser):
     """
     A JSON API client will send a payload that looks like this:
@@ -33,7 +88,14 @@ class JSONParser(parsers.JSONParser):
             }
         }
 
-    We extract the attributes so that DRF serializers can work as normal.
+    We extract the attributes so that DRF serializers can work as normal. When `data` is an array of resource objects
+    (see `zc_common.remote_resource.bulk`), a list holding each of them parsed that way is returned.
+
+    Bodies larger than `JSON_API_MAX_BODY_SIZE` bytes (Django's `DATA_UPLOAD_MAX_MEMORY_SIZE` by default) are turned
+    down with a 413, and arrays with more than the view's `bulk_max_items` (or `JSON_API_MAX_DATA_ITEMS`) objects with
+    a 400. Bodies are loaded whole with ujson. With ijson installed, `JSON_API_INCREMENTAL_PARSING = True` reads them
+    incrementally instead: the resource objects of an array are parsed one at a time as they are read, and the limits
+    are enforced as soon as they are crossed. That holds less in memory at once, but parses several times slower.
     """
     media_type = 'application/vnd.api+json'
     renderer_class = renderers.JSONRenderer
@@ -65,13 +127,114 @@ class JSONParser(parsers.JSONParser):
         else:
             return {}
 
+    def parse_resource_object(self, data, result, parser_context):
+        request = parser_context.get('request')
+
+        # Check for inconsistencies
+        resource_name = utils.get_resource_name(parser_context)
+        if data.get('type') != resource_name and request.method in ('PUT', 'POST', 'PATCH'):
+            raise exceptions.Conflict(
+                "The resource object's type ({data_type}) is not the type "
+                "that constitute the collection represented by the endpoint ({resource_type}).".format(
+                    data_type=data.get('type'),
+                    resource_type=resource_name
+                )
+            )
+
+        # Construct the return data
+        parsed_data = {'id': data.get('id')}
+        parsed_data.update(self.parse_attributes(data))
+        parsed_data.update(self.parse_relationships(data))
+        parsed_data.update(self.parse_metadata(result))
+        return parsed_data
+
+    @staticmethod
+    def get_max_items(parser_context):
+        max_items = getattr(parser_context.get('view'), 'bulk_max_items', None)
+        return max_items if max_items is not None else getattr(settings, 'JSON_API_MAX_DATA_ITEMS', None)
+
+    def check_items(self, count, parser_context):
+        max_items = self.get_max_items(parser_context)
+        if max_items is not None and count > max_items:
+            raise ParseError('At most {} resource objects can be sent at a time'.format(max_items))
+
+    @staticmethod
+    def check_body_size(parser_context):
+        max_size = get_max_body_size()
+        try:
+            content_length = int(parser_context['request'].META.get('CONTENT_LENGTH') or 0)
+        except (TypeError, ValueError):
+            content_length = 0
+        if max_size is not None and content_length > max_size:
+            raise RequestEntityTooLarge('Request body is larger than {} bytes.'.format(max_size))
+
+    def read_document(self, stream, parser_context, parse_item=None):
+        """
+        Reads the members of the JSON object in `stream` with ijson. If `data` is an array and `parse_item` is given,
+        its items are passed to `parse_item` as they are read instead of being kept, and `data` is left out.
+        """
+        self.check_body_size(parser_context)
+        events = ijson.parse(LimitedReader(stream, get_max_body_size()), use_float=True)
+
+        result = dict()
+        try:
+            _, event, _ = next(events)
+            if event != 'start_map':
+                raise ParseError('Received document is not a JSON object')
+
+            for _, event, key in events:
+                if event != 'map_key':
+                    break
+
+                _, event, value = next(events)
+                if key != 'data' or event != 'start_array' or parse_item is None:
+                    result[key] = build_value(event, value, events)
+                    continue
+
+                count = 0
+                for _, event, value in events:
+                    if event == 'end_array':
+                        break
+                    count += 1
+                    self.check_items(count, parser_context)
+                    parse_item(build_value(event, value, events))
+        except (ijson.JSONError, StopIteration) as e:
+            raise ParseError('JSON parse error - {}'.format(e))
+
+        return result
+
+    def parse_incrementally(self, stream, parser_context):
+        from rest_framework_json_api.views import RelationshipView
+        if isinstance(parser_context['view'], RelationshipView):
+            return self.parse_document(self.read_document(stream, parser_context), parser_context)
+
+        # The document's meta may come after `data`, so it's added once every resource object is parsed
+        parsed_items = list()
+
+        def parse_item(data):
+            if not isinstance(data, dict):
+                raise ParseError('Received data contains one or more malformed JSONAPI Resource Object(s)')
+            parsed_items.append(self.parse_resource_object(data, {}, parser_context))
+
+        result = self.read_document(stream, parser_context, parse_item)
+        if not parsed_items:
+            return self.parse_document(result, parser_context)
+
+        metadata = self.parse_metadata(result)
+        for parsed_data in parsed_items:
+            parsed_data.update(metadata)
+        return parsed_items
+
     def parse(self, stream, media_type=None, parser_context=None):
         """
         Parses the incoming bytestream as JSON and returns the resulting data
         """
         if hasattr(stream, 'raw_body'):
             result = stream.raw_body
+        elif ijson is not None and getattr(settings, 'JSON_API_INCREMENTAL_PARSING', False):
+            return self.parse_incrementally(stream, parser_context)
         else:
+            self.check_body_size(parser_context)
             # Handles requests created by Django's test client, which is missing the raw_body attribute set in
             # the Django request-like object initialized by our zc_event event client
             try:
@@ -79,6 +242,9 @@ class JSONParser(parsers.JSONParser):
             except ValueError:
                 result = {}
 
+        return self.parse_document(result, parser_context)
+
+    def parse_document(self, result, parser_context):
         data = result.get('data')
 
         if data:
@@ -96,26 +262,14 @@ class JSONParser(parsers.JSONParser):
 
                 return data
 
-            request = parser_context.get('request')
-
-            # Check for inconsistencies
-            resource_name = utils.get_resource_name(parser_context)
-            view = parser_context.get('view')
-            if data.get('type') != resource_name and request.method in ('PUT', 'POST', 'PATCH'):
-                raise exceptions.Conflict(
-                    "The resource object's type ({data_type}) is not the type "
-                    "that constitute the collection represented by the endpoint ({resource_type}).".format(
-                        data_type=data.get('type'),
-                        resource_type=resource_name
-                    )
-                )
+            if isinstance(data, list):
+                self.check_items(len(data), parser_context)
+                if not all(isinstance(resource_object, dict) for resource_object in data):
+                    raise ParseError('Received data contains one or more malformed JSONAPI Resource Object(s)')
+                return [self.parse_resource_object(resource_object, result, parser_context)
+                        for resource_object in data]
 
-            # Construct the return data
-            parsed_data = {'id': data.get('id')}
-            parsed_data.update(self.parse_attributes(data))
-            parsed_data.update(self.parse_relationships(data))
-            parsed_data.update(self.parse_metadata(result))
-            return parsed_data
+            return self.parse_resource_object(data, result, parser_context)
 
         else:
             raise ParseError('Received document does not contain primary data')
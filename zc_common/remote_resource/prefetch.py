@@ -0,0 +1,202 @@
+"""
+Prefetch planning
+
+Works out the `select_related()` and `prefetch_related()` calls a queryset needs so that rendering the resources
+named in the `include` query parameter doesn't run queries per row. The include paths are followed through each
+serializer's `included_serializers`, and every step is matched to the model field behind the serializer field:
+
+ * forward foreign keys and one-to-one fields are joined with `select_related()`
+ * reverse foreign keys and many-to-many fields get a `Prefetch` whose queryset carries the plan for the rest of
+   the path, so that nested includes cost one query per to-many step however large the page is
+
+Remote relations live in other services and are left alone.
+
+The same walk estimates what an `include` parameter will cost to render (see `estimate_include_cost`), so that
+views can turn down requests that would tie up a worker. To-many relations are assumed to hold
+`INCLUDE_TO_MANY_CARDINALITY` objects per row unless the serializer says otherwise:
+
+    class OrderSerializer(ModelSerializer):
+        class JSONAPIMeta:
+            include_cardinalities = {'tags': 3, 'line_items': 40}
+"""
+from collections import OrderedDict
+import math
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from rest_framework.relations import ManyRelatedField
+from rest_framework_json_api import utils
+
+from zc_common.remote_resource.include_tree import IncludeTree
+from zc_common.remote_resource.relations import RemoteResourceField
+
+
+def get_related_serializer_class(field, included_serializers, field_name):
+    if isinstance(field, ListSerializer):
+        return field.child.__class__
+    if isinstance(field, BaseSerializer):
+        return field.__class__
+    return included_serializers.get(field_name)
+
+
+def get_model_field(model, source):
+    """
+    Returns the field of `model` that a serializer field with `source` reads, or None. Reverse relations are
+    also found by their accessor, e.g. `order_set` for a relation without a `related_name`, whose field is `order`.
+    """
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        pass
+
+    for related_object in model._meta.related_objects:
+        if related_object.get_accessor_name() == source:
+            return related_object
+    return None
+
+
+def plan_prefetch(model, serializer_class, include_tree, prefix='', context=None):
+    """
+    Returns a `(select_related, prefetch_related)` pair of lookup lists for rendering `include_tree`, an
+    `IncludeTree`, on instances of `model` serialized by `serializer_class`.
+    """
+    select_related = list()
+    prefetch_related = list()
+    if not include_tree or serializer_class is None:
+        return select_related, prefetch_related
+
+    fields = serializer_class(context=context or {}).fields
+    included_serializers = utils.get_included_serializers(serializer_class)
+
+    for field_name, children, _ in include_tree:
+        field = fields.get(field_name)
+        if field is None:
+            continue
+
+        relation = field.child_relation if isinstance(field, ManyRelatedField) else field
+        if isinstance(relation, RemoteResourceField):
+            continue
+
+        source = field.source or field_name
+        if source == '*' or '.' in source:
+            continue
+
+        model_field = get_model_field(model, source)
+        if model_field is None or not model_field.is_relation or model_field.related_model is None:
+            continue
+
+        related_model = model_field.related_model
+        related_serializer_class = get_related_serializer_class(field, included_serializers, field_name)
+        # Reverse relations are prefetched through their accessor, which isn't always the name of their field
+        if isinstance(model_field, ForeignObjectRel):
+            lookup = prefix + model_field.get_accessor_name()
+        else:
+            lookup = prefix + source
+
+        if (model_field.many_to_one or model_field.one_to_one) and model_field.concrete:
+            select_related.append(lookup)
+            nested_select_related, nested_prefetch_related = plan_prefetch(
+                related_model, related_serializer_class, children, lookup + '__', context)
+            select_related.extend(nested_select_related)
+            prefetch_related.extend(nested_prefetch_related)
+        else:
+            nested_select_related, nested_prefetch_related = plan_prefetch(
+                related_model, related_serializer_class, children, '', context)
+
+            queryset = related_model._default_manager.all()
+            if nested_select_related:
+                queryset = queryset.select_related(*nested_select_related)
+            if nested_prefetch_related:
+                queryset = queryset.prefetch_related(*nested_prefetch_related)
+            prefetch_related.append(Prefetch(lookup, queryset=queryset))
+
+    return select_related, prefetch_related
+
+
+def prefetch_included_resources(queryset, serializer_class, included_resources, context=None):
+    """
+    Applies the plan for `included_resources`, a list of include paths or an `IncludeTree`, to `queryset`.
+    Lookups that the queryset already prefetches are left as they are, since Django refuses the same lookup with
+    two different querysets.
+    """
+    include_tree = IncludeTree.parse(included_resources)
+    if not include_tree:
+        return queryset
+
+    select_related, prefetch_related = plan_prefetch(queryset.model, serializer_class, include_tree, '', context)
+
+    existing_lookups = set(
+        lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+        for lookup in queryset._prefetch_related_lookups
+    )
+    prefetch_related = [lookup for lookup in prefetch_related if lookup.prefetch_to not in existing_lookups]
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+def get_cardinality(serializer_class, field_name):
+    json_api_meta = getattr(serializer_class, 'JSONAPIMeta', None)
+    cardinalities = getattr(json_api_meta, 'include_cardinalities', None) or {}
+    try:
+        return cardinalities[field_name]
+    except KeyError:
+        return getattr(settings, 'INCLUDE_TO_MANY_CARDINALITY', 10)
+
+
+def estimate_include_cost(model, serializer_class, include_tree, rows, context=None, cost=None):
+    """
+    Estimates what rendering `include_tree` for `rows` instances of `model` takes, assuming the queryset was
+    prepared by `prefetch_included_resources()`. Returns a dict counting the included `objects` to build, the
+    `queries` to run and the `remote_calls` to make.
+    """
+    if cost is None:
+        cost = OrderedDict([('objects', 0), ('queries', 0), ('remote_calls', 0)])
+    if not include_tree or serializer_class is None or not rows:
+        return cost
+
+    fields = serializer_class(context=context or {}).fields
+    included_serializers = utils.get_included_serializers(serializer_class)
+    remote_page_size = getattr(settings, 'REMOTE_INCLUDE_PAGE_SIZE', 1000)
+
+    for field_name, children, _ in include_tree:
+        field = fields.get(field_name)
+        if field is None:
+            continue
+
+        many = isinstance(field, (ManyRelatedField, ListSerializer))
+        count = rows * get_cardinality(serializer_class, field_name) if many else rows
+        cost['objects'] += count
+
+        relation = field.child_relation if isinstance(field, ManyRelatedField) else field
+        if isinstance(relation, RemoteResourceField):
+            # The other service's relations are unknown, every nested level is taken to be to-many
+            cost['remote_calls'] += int(math.ceil(float(count) / remote_page_size))
+            nested_count = count
+            for _ in range(children.depth):
+                nested_count *= getattr(settings, 'INCLUDE_TO_MANY_CARDINALITY', 10)
+                cost['objects'] += nested_count
+            continue
+
+        model_field = get_model_field(model, field.source or field_name)
+        if model_field is None or not model_field.is_relation or model_field.related_model is None:
+            # Nothing to prefetch, the related objects are looked up row by row
+            cost['queries'] += rows
+            related_model = getattr(model_field, 'related_model', None)
+        else:
+            if not ((model_field.many_to_one or model_field.one_to_one) and model_field.concrete):
+                cost['queries'] += 1
+            related_model = model_field.related_model
+
+        if related_model is not None:
+            estimate_include_cost(
+                related_model, get_related_serializer_class(field, included_serializers, field_name), children,
+                count, context, cost)
+
+    return cost
@@ -9,8 +9,12 @@ from zc_common.remote_resource.models import RemoteResource
 
 
 class RemoteResourceField(ResourceRelatedField):
+    """
+    `max_included` caps the number of remote objects (the related resources and whatever they include in turn) that
+    including this field adds to a response; `REMOTE_INCLUDE_MAX_RESOURCES` is used if it's not given.
+    """
 
-    def __init__(self, related_resource_path=None, **kwargs):
+    def __init__(self, related_resource_path=None, max_included=None, **kwargs):
         if 'model' not in kwargs:
             kwargs['model'] = RemoteResource
         if not kwargs.get('read_only', None):
@@ -22,6 +26,7 @@ class RemoteResourceField(ResourceRelatedField):
             raise NameError('related_resource_path parameter must be provided')
 
         self.related_resource_path = related_resource_path
+        self.max_included = max_included
 
         super(RemoteResourceField, self).__init__(**kwargs)
 
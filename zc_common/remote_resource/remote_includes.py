@@ -0,0 +1,332 @@
+"""
+Remote includes
+
+Resources referenced through a `RemoteResourceField` live in other services. Rather than requesting them one row
+at a time while the renderer walks a response, the renderer records every remote primary key it comes across in a
+`RemoteIncludeBatch` and resolves them all at the end of the render with a single `filter[id__in]` request per
+remote type.
+
+Those requests run concurrently on a small thread pool, bounded by a wall-clock budget for the whole render:
+
+    REMOTE_INCLUDE_MAX_WORKERS = 8  # threads used to fetch remote includes for one response
+    REMOTE_INCLUDE_TIMEOUT = 30  # seconds, counted from the start of the render
+
+Each remote resource type has a circuit breaker (see `zc_common.remote_resource.circuit_breaker`), so that a service
+that keeps failing is given a rest instead of holding up every response that includes its resources.
+
+Requests stuck in the other service's latency tail can be hedged with a second request, see
+`zc_common.remote_resource.hedging`.
+
+Identical requests made by several threads at the same time are coalesced into one.
+
+Resources found in the cross-request cache (see `zc_common.remote_resource.cache`) aren't requested at all. The
+request's sparse fieldsets are passed on, so that other services only return the fields the client asked for.
+"""
+from collections import OrderedDict
+from concurrent import futures
+import time
+
+import ujson
+from django.conf import settings
+from six.moves.urllib import parse as urlparse
+
+from zc_common.remote_resource.cache import get_remote_include_cache, group_by_primary_resource
+from zc_common.remote_resource.circuit_breaker import get_circuit_breaker
+from zc_common.remote_resource.fieldsets import get_sparse_fieldset_params
+from zc_common.remote_resource.hedging import get_latency_tracker, hedged_call
+from zc_common.remote_resource.singleflight import SingleFlight
+from zc_events.exceptions import RequestTimeout
+
+
+# The largest page our services will return, see `PageNumberPagination.max_page_size`
+REMOTE_INCLUDE_PAGE_SIZE = 1000
+
+remote_flights = SingleFlight('remote_include_singleflight')
+
+
+def get_next_page(body):
+    """
+    Returns the page number the `next` link of a remote response points to, or None if there is no next page or it
+    isn't addressed by page number.
+    """
+    next_link = (body.get('links') or {}).get('next')
+    if not next_link:
+        return None
+
+    page = urlparse.parse_qs(urlparse.urlparse(next_link).query).get('page')
+    try:
+        return int(page[0]) if page else None
+    except ValueError:
+        return None
+
+
+class RemoteResourceIncludeError(Exception):
+
+    def __init__(self, field, data=None):
+        self.field = field
+        self.message = "There was an error including the field {}".format(field)
+
+        data['meta'] = {'include_field': field}
+        self.data = [data]
+
+    def __str__(self):
+        return self.message
+
+
+class RemoteResourceIncludeTimeoutError(RemoteResourceIncludeError):
+
+    def __init__(self, field):
+        self.field = field
+        self.message = "Timeout error requesting remote resource {}".format(field)
+
+        self.data = [{
+            "status": "503",
+            "source": {
+                "pointer": "/data"
+            },
+            "meta": {
+                "include_field": field,
+            },
+            "detail": self.message
+        }]
+
+
+class RemoteResourceUnavailableError(RemoteResourceIncludeTimeoutError):
+    """
+    Raised without making a request while the circuit breaker for the remote resource type is open.
+    """
+
+    def __init__(self, field):
+        super(RemoteResourceUnavailableError, self).__init__(field)
+        self.message = "Remote resource {} is unavailable".format(field)
+        self.data[0]['detail'] = self.message
+
+
+class RemoteIncludeBatch(object):
+    """
+    Collects the remote resources that have to be included in a response.
+
+    Primary keys are grouped by the name of the `RemoteResourceField` (which is what the event client routes on)
+    and by the nested include path requested for it, so that `fetch()` makes one request per group no matter how
+    many rows reference it.
+
+    Each field can be given a limit on the number of remote objects (its resources and whatever they include) it
+    adds to the response, counted across every include path it's requested under; if it's added with different
+    limits, the lowest applies. Resources are kept or dropped
+    together with the objects they include. Fields that hit their limit, or whose remote response had pages that
+    couldn't be followed, end up in `truncated`.
+    """
+
+    def __init__(self, event_client, request):
+        self.event_client = event_client
+        self.request = request
+        self.pending = OrderedDict()
+        self.cache = get_remote_include_cache()
+        self.query_params = get_sparse_fieldset_params(request)
+        self.remote_calls = 0
+        self.hedging = getattr(settings, 'REMOTE_INCLUDE_HEDGING', False)
+        self.page_size = getattr(settings, 'REMOTE_INCLUDE_PAGE_SIZE', REMOTE_INCLUDE_PAGE_SIZE)
+        self.default_limit = getattr(settings, 'REMOTE_INCLUDE_MAX_RESOURCES', None)
+        self.limits = dict()
+        self.field_pks = dict()
+        self.truncated = set()
+
+        self.max_workers = getattr(settings, 'REMOTE_INCLUDE_MAX_WORKERS', 8)
+        self.deadline = time.time() + getattr(settings, 'REMOTE_INCLUDE_TIMEOUT', 30)
+
+    def add(self, field_name, resource_identifier, include='', limit=None):
+        pk = resource_identifier.get('id') if resource_identifier else None
+        if pk is None:
+            return
+
+        # A field of the same name may be reached through serializers capping it differently; the lowest cap wins
+        if limit is None:
+            limit = self.default_limit
+        current_limit = self.limits.get(field_name, limit)
+        if limit is None or (current_limit is not None and current_limit < limit):
+            limit = current_limit
+        self.limits[field_name] = limit
+
+        # Every resource adds at least one object, so no more than `limit` of them are requested for a field
+        field_pks = self.field_pks.setdefault(field_name, set())
+        if limit is not None and pk not in field_pks and len(field_pks) >= limit:
+            self.truncated.add(field_name)
+            return
+        field_pks.add(pk)
+
+        # An OrderedDict keeps the primary keys unique while preserving the order they were found in; the values
+        # hold the resource type from the relationship linkage, which is what cache entries are keyed on
+        self.pending.setdefault((field_name, include), OrderedDict())[pk] = resource_identifier.get('type')
+
+    def apply_limits(self, included_data):
+        """
+        Flattens `included_data`, a dict mapping field names to lists of object groups (a remote resource followed
+        by the objects it includes). Fields with a limit keep whole groups, in order, for as long as their objects
+        fit within it; objects included by several resources are only counted, and returned, once.
+        """
+        resources = list()
+        for field_name, groups in included_data.items():
+            limit = self.limits.get(field_name)
+            if limit is None:
+                for group in groups:
+                    resources.extend(group)
+                continue
+
+            seen = set()
+            for group in groups:
+                objects = [obj for obj in group if (obj.get('type'), obj.get('id')) not in seen]
+                if len(seen) + len(objects) > limit:
+                    self.truncated.add(field_name)
+                    break
+                seen.update((obj.get('type'), obj.get('id')) for obj in objects)
+                resources.extend(objects)
+        return resources
+
+    def fetch(self):
+        """
+        Requests every collected resource and returns the remote `data` and `included` objects as one list.
+
+        Raises `RemoteResourceIncludeTimeoutError` once, cancelling whatever has not started yet, if the requests
+        are still outstanding when the render's deadline passes.
+        """
+        if not self.pending:
+            return list()
+
+        user_id = getattr(self.request.user, 'id', None)
+        roles = self.request.user.roles
+
+        included_data = OrderedDict()
+        requests = list()
+        for (field_name, include), pks in self.pending.items():
+            type_name = next(iter(pks.values())) or field_name
+            pks = list(pks)
+            field_data = included_data.setdefault(field_name, list())
+
+            if self.cache is not None:
+                cached = self.cache.get_many(type_name, pks, include, roles, self.query_params)
+                field_data.extend(cached[pk] for pk in pks if pk in cached)
+                pks = [pk for pk in pks if pk not in cached]
+
+            for start in range(0, len(pks), self.page_size):
+                requests.append((field_name, type_name, pks[start:start + self.page_size], include))
+
+        self.pending.clear()
+        if not requests:
+            return self.apply_limits(included_data)
+
+        self.remote_calls += len(requests)
+        executor = futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(requests)))
+        pending = OrderedDict()
+        try:
+            for field_name, type_name, pks, include in requests:
+                future = executor.submit(
+                    self.fetch_resources, field_name, pks, include, user_id, roles, self.limits.get(field_name))
+                pending[future] = (field_name, type_name, include)
+
+            done, not_done = futures.wait(
+                pending, timeout=max(self.deadline - time.time(), 0), return_when=futures.FIRST_EXCEPTION)
+
+            for future in pending:
+                if future in done and future.exception() is not None:
+                    raise future.exception()
+
+            if not_done:
+                raise RemoteResourceIncludeTimeoutError(
+                    next(pending[future][0] for future in pending if future in not_done))
+
+            for future, (field_name, type_name, include) in pending.items():
+                data, included, complete = future.result()
+                if not complete:
+                    self.truncated.add(field_name)
+
+                cacheable = complete and self.cache is not None
+                limited = self.limits.get(field_name) is not None
+                grouped = group_by_primary_resource(data, included) if cacheable or limited else None
+                if cacheable:
+                    self.cache.set_many(type_name, grouped, include, roles, self.query_params)
+
+                if limited:
+                    included_data[field_name].extend(grouped[str(resource['id'])] for resource in data)
+                else:
+                    included_data[field_name].append(data + included)
+            return self.apply_limits(included_data)
+        finally:
+            # Requests that are already running can't be interrupted, but nothing waits on them any longer
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def fetch_resources(self, field_name, pks, include, user_id, roles, limit=None):
+        """
+        Returns the `data` and `included` objects of a remote response as two lists, and whether they are complete.
+
+        If the other service pages its response, the following pages are requested too, until `limit` objects have
+        been received.
+        """
+        breaker = get_circuit_breaker(field_name)
+        if not breaker.allow_request():
+            raise RemoteResourceUnavailableError(field_name)
+
+        data = list()
+        included = list()
+        page = None
+        while True:
+            status, body = self.fetch_page(breaker, field_name, pks, include, user_id, roles, page)
+
+            if 400 <= status < 600:
+                raise RemoteResourceIncludeError(field_name, body["errors"][0])
+
+            page_data = body['data']
+            if not isinstance(page_data, list):
+                page_data = [page_data]
+            data.extend(page_data)
+            included.extend(body.get('included') or list())
+
+            if not (body.get('links') or {}).get('next'):
+                return data, included, True
+
+            next_page = get_next_page(body)
+            if next_page is None or next_page <= (page or 1) or (
+                    limit is not None and len(data) + len(included) >= limit):
+                return data, included, False
+            page = next_page
+
+    def fetch_page(self, breaker, field_name, pks, include, user_id, roles, page=None):
+        """
+        Returns the status and parsed body of one remote response.
+        """
+        query_params = dict(self.query_params)
+        if page is not None:
+            query_params['page'] = page
+
+        def request():
+            return self.event_client.get_remote_resource_data(
+                field_name, pk=pks, user_id=user_id,
+                include=include, page_size=self.page_size, query_params=query_params or None,
+                roles=roles)
+
+        def load():
+            try:
+                if self.hedging:
+                    remote_resource = hedged_call(get_latency_tracker(field_name), request)
+                else:
+                    remote_resource = request()
+            except RequestTimeout:
+                breaker.record_failure()
+                raise
+
+            # Errors caused by the request itself say nothing about the health of the other service
+            if remote_resource['status'] >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            return remote_resource['status'], ujson.loads(remote_resource['body'])
+
+        # Identical requests made by other threads at the same time share a single round trip and parsed body
+        key = (field_name, frozenset(pks), include, tuple(sorted(roles or [])), self.page_size,
+               tuple(sorted(query_params.items())))
+        try:
+            return remote_flights.do(key, load)
+        except RequestTimeout:
+            raise RemoteResourceIncludeTimeoutError(field_name)
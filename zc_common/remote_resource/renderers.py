@@ -1,13 +1,13 @@
 """
 Renderers
 """
-import copy
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+import itertools
 import os
-import ujson
 
-import inflection
-from django.db.models import Manager
+from django.conf import settings
+from django.db.models import Manager, prefetch_related_objects
+from django.utils import encoding
 import six
 from rest_framework import relations
 from rest_framework.serializers import BaseSerializer, Serializer, ListSerializer
@@ -16,9 +16,13 @@ from rest_framework.settings import api_settings
 from rest_framework_json_api import utils
 from rest_framework_json_api import renderers
 
+from zc_common.remote_resource.fieldsets import get_sparse_fieldsets, restrict_to_sparse_fieldset
+from zc_common.remote_resource.fragment_cache import get_fragment_cache
+from zc_common.remote_resource.include_tree import IncludeTree
+from zc_common.remote_resource.metrics import RenderMetrics
 from zc_common.remote_resource.relations import RemoteResourceField
+from zc_common.remote_resource.remote_includes import RemoteIncludeBatch, RemoteResourceIncludeError
 from zc_common.remote_resource import utils as zc_common_utils
-from zc_events.exceptions import RequestTimeout
 
 
 core_module_name = os.environ.get('DJANGO_SETTINGS_MODULE').split('.')[0]
@@ -34,35 +38,18 @@ def key_formatter():
         return utils.format_keys
 
 
-class RemoteResourceIncludeError(Exception):
+# How `extract_attributes` and `extract_included` treat the fields of a serializer, worked out once per serializer
+# class and set of field names rather than for every field of every resource:
+#   attributes: (field name, read only) pairs rendered under `attributes`
+#   relations: names of the relation fields that can be included, remote ones among them
+#   remote_relations: names of the `RemoteResourceField`s
+FieldPlan = namedtuple('FieldPlan', ['attributes', 'relations', 'remote_relations'])
 
-    def __init__(self, field, data=None):
-        self.field = field
-        self.message = "There was an error including the field {}".format(field)
+# Sparse fieldsets make the field names of a serializer class vary from request to request, so the number of plans
+# kept is capped
+MAX_FIELD_PLANS = 1000
 
-        data['meta'] = {'include_field': field}
-        self.data = [data]
-
-    def __str__(self):
-        return self.message
-
-
-class RemoteResourceIncludeTimeoutError(RemoteResourceIncludeError):
-
-    def __init__(self, field):
-        self.field = field
-        self.message = "Timeout error requesting remote resource {}".format(field)
-
-        self.data = [{
-            "status": "503",
-            "source": {
-                "pointer": "/data"
-            },
-            "meta": {
-                "include_field": field,
-            },
-            "detail": self.message
-        }]
+field_plans = dict()
 
 
 class JSONRenderer(renderers.JSONRenderer):
@@ -70,6 +57,37 @@ class JSONRenderer(renderers.JSONRenderer):
     This is s modification of renderers in (v 2.2)
     https://github.com/django-json-api/django-rest-framework-json-api
     """
+    @staticmethod
+    def get_field_plan(fields):
+        """
+        Returns the `FieldPlan` for a serializer's fields, compiling it the first time the serializer class is seen
+        with these field names.
+        """
+        key = (fields.serializer.__class__, tuple(fields))
+        try:
+            return field_plans[key]
+        except KeyError:
+            pass
+
+        attribute_fields = list()
+        relation_fields = list()
+        remote_fields = set()
+        for field_name, field in six.iteritems(fields):
+            if isinstance(field, (relations.RelatedField, relations.ManyRelatedField, BaseSerializer)):
+                # Skip URL field
+                if field_name != api_settings.URL_FIELD_NAME:
+                    relation_fields.append(field_name)
+                if isinstance(field, RemoteResourceField):
+                    remote_fields.add(field_name)
+            # ID is always provided in the root of JSON API, and write only fields have nothing to output
+            elif field_name != 'id' and not field.write_only:
+                attribute_fields.append((field_name, field.read_only))
+
+        field_plan = FieldPlan(tuple(attribute_fields), tuple(relation_fields), frozenset(remote_fields))
+        if len(field_plans) < MAX_FIELD_PLANS:
+            field_plans[key] = field_plan
+        return field_plan
+
     @classmethod
     def extract_attributes(cls, fields, resource):
         """
@@ -78,63 +96,86 @@ class JSONRenderer(renderers.JSONRenderer):
         old (pre-v3.0) function.
         """
         data = OrderedDict()
-        for field_name, field in iter(fields.items()):
-            # ID is always provided in the root of JSON API so remove it from attributes
-            if field_name == 'id':
-                continue
-            # don't output a key for write only fields
-            if fields[field_name].write_only:
-                continue
-            # Skip fields with relations
-            if isinstance(
-                    field, (relations.RelatedField, relations.ManyRelatedField, BaseSerializer)
-            ):
-                continue
-
+        for field_name, read_only in cls.get_field_plan(fields).attributes:
             # Skip read_only attribute fields when `resource` is an empty
             # serializer. Prevents the "Raw Data" form of the browsable API
             # from rendering `"foo": null` for read only fields
-            try:
-                resource[field_name]
-            except KeyError:
-                if fields[field_name].read_only:
-                    continue
+            if read_only and field_name not in resource:
+                continue
 
-            data.update({
-                field_name: resource.get(field_name)
-            })
+            data[field_name] = resource.get(field_name)
 
         return key_formatter()(data)
 
     @classmethod
-    def extract_included(cls, request, fields, resource, resource_instance, included_resources):
+    def build_json_resource_obj(cls, fields, resource, resource_instance, resource_name,
+                                force_type_resolution=False):
+        resource_obj = super(JSONRenderer, cls).build_json_resource_obj(
+            fields, resource, resource_instance, resource_name, force_type_resolution)
+
+        # Relations outside of the sparse fieldset were only kept on the serializer to follow the include paths
+        fieldset = getattr(getattr(fields, 'serializer', None), 'sparse_fieldset', None)
+        if fieldset is not None and 'relationships' in resource_obj:
+            relationships = OrderedDict(
+                (name, relationship) for name, relationship in resource_obj['relationships'].items()
+                if zc_common_utils.format_key(name, 'underscore') in fieldset
+            )
+            if relationships:
+                resource_obj['relationships'] = relationships
+            else:
+                del resource_obj['relationships']
+
+        return resource_obj
+
+    @staticmethod
+    def get_included_key(resource_instance, include_tree=None):
+        """
+        Identifies a related object in the per-render identity map of `extract_included`. With `include_tree` the
+        key stands for having followed those include paths from the object, rather than for the object itself.
+        """
+        key = (utils.get_resource_type_from_instance(resource_instance), encoding.force_text(resource_instance.pk))
+        if include_tree is None:
+            return key
+        return key + (include_tree,)
+
+    @classmethod
+    def extract_included(cls, request, fields, resource, resource_instance, included_resources,
+                         remote_includes=None, included_keys=None, fieldsets=None):
         # this function may be called with an empty record (example: Browsable Interface)
         if not resource_instance:
             return
 
+        # Remote resources are only collected here, and keys are left unformatted, so that both can be done once by
+        # whoever started the walk: the caller that passed `remote_includes`, or this call if none was passed
+        top_level = remote_includes is None
+        if top_level:
+            remote_includes = RemoteIncludeBatch(event_client, request)
+
+        # Related objects that were already built (and recursed into) for an earlier row are skipped
+        if included_keys is None:
+            included_keys = set()
+
+        # The sparse fieldsets are parsed once per render rather than for every related serializer
+        if fieldsets is None:
+            fieldsets = get_sparse_fieldsets(request)
+
+        # The include paths are parsed once, nested calls get the subtree of the field they follow
+        include_tree = IncludeTree.parse(included_resources)
+
         included_data = list()
         current_serializer = fields.serializer
         context = current_serializer.context
         included_serializers = getattr(current_serializer, "included_serializers", [])
-        included_resources = copy.copy(included_resources)
-        included_resources = [inflection.underscore(value) for value in included_resources]
-
-        for field_name, field in six.iteritems(fields):
-            # Skip URL field
-            if field_name == api_settings.URL_FIELD_NAME:
-                continue
+        field_plan = cls.get_field_plan(fields)
 
-            # Skip fields without relations or serialized data
-            if not isinstance(field, (relations.RelatedField, relations.ManyRelatedField, BaseSerializer)):
+        # Only fields with relations or serialized data can be included
+        for field_name in field_plan.relations:
+            # Skip fields not in requested included resources
+            include_node = include_tree.get(field_name)
+            if include_node is None:
                 continue
 
-            try:
-                included_resources.remove(field_name)
-            except ValueError:
-                # Skip fields not in requested included resources
-                # If no child field, directly continue with the next field
-                if field_name not in [node.split('.')[0] for node in included_resources]:
-                    continue
+            field = fields[field_name]
 
             try:
                 relation_instance = getattr(resource_instance, field_name)
@@ -151,41 +192,29 @@ class JSONRenderer(renderers.JSONRenderer):
             if isinstance(relation_instance, Manager):
                 relation_instance = relation_instance.all()
 
-            new_included_resources = [key.replace('%s.' % field_name, '', 1)
-                                      for key in included_resources
-                                      if field_name == key.split('.')[0]]
+            new_include_tree = include_node.children
             serializer_data = resource.get(field_name)
 
-            if isinstance(field, RemoteResourceField):
-                user_id = getattr(request.user, 'id', None)
-                roles = request.user.roles
-                pk = serializer_data.get('id')
-
-                include = ",".join(new_included_resources)
-                try:
-                    remote_resource = event_client.get_remote_resource_data(
-                        field_name, pk=pk, user_id=user_id,
-                        include=include, page_size=1000, roles=roles)
-
-                    body = ujson.loads(remote_resource['body'])
-
-                    if 400 <= remote_resource['status'] < 600:
-                        raise RemoteResourceIncludeError(field_name, body["errors"][0])
-                except RequestTimeout:
-                    raise RemoteResourceIncludeTimeoutError(field_name)
-
-                included_data.append(body['data'])
-
-                if body.get('included'):
-                    included_data.extend(body['included'])
+            if field_name in field_plan.remote_relations:
+                remote_includes.add(field_name, serializer_data, include_node.paths, field.max_included)
 
                 # We continue here since RemoteResourceField inherits
                 # form ResourceRelatedField which is a RelatedField
                 continue
 
             if isinstance(field, relations.ManyRelatedField):
+                if not new_include_tree:
+                    # Related objects already built for an earlier row aren't serialized again
+                    relation_instance = [instance for instance in relation_instance
+                                         if cls.get_included_key(instance) not in included_keys]
+                    if not relation_instance:
+                        continue
                 serializer_class = included_serializers[field_name]
                 field = serializer_class(relation_instance, many=True, context=context)
+                restrict_to_sparse_fieldset(field, request, new_include_tree.names, fieldsets)
+                if not new_include_tree and get_fragment_cache(field, request) is not None:
+                    included_data.extend(cls.build_cached_included(request, field, relation_instance, included_keys))
+                    continue
                 serializer_data = field.data
 
             if isinstance(field, relations.RelatedField):
@@ -193,8 +222,17 @@ class JSONRenderer(renderers.JSONRenderer):
                     continue
 
                 many = field._kwargs.get('child_relation', None) is not None
+                if not many and cls.get_included_key(relation_instance) in included_keys and (
+                        not new_include_tree or
+                        cls.get_included_key(relation_instance, new_include_tree) in included_keys):
+                    continue
+
                 serializer_class = included_serializers[field_name]
                 field = serializer_class(relation_instance, many=many, context=context)
+                restrict_to_sparse_fieldset(field, request, new_include_tree.names, fieldsets)
+                if not new_include_tree and get_fragment_cache(field, request) is not None:
+                    included_data.extend(cls.build_cached_included(request, field, relation_instance, included_keys))
+                    continue
                 serializer_data = field.data
 
             if isinstance(field, ListSerializer):
@@ -212,21 +250,28 @@ class JSONRenderer(renderers.JSONRenderer):
                             relation_type or
                             utils.get_resource_type_from_instance(nested_resource_instance)
                         )
-                        included_data.append(
-                            cls.build_json_resource_obj(
-                                serializer_fields,
-                                serializer_resource,
-                                nested_resource_instance,
-                                resource_type,
-                                serializer,
+                        included_key = cls.get_included_key(nested_resource_instance)
+                        if included_key not in included_keys:
+                            included_keys.add(included_key)
+                            included_data.append(
+                                cls.build_json_resource_obj(
+                                    serializer_fields,
+                                    serializer_resource,
+                                    nested_resource_instance,
+                                    resource_type,
+                                    serializer,
+                                )
                             )
-                        )
-                        included_data.extend(
-                            cls.extract_included(
-                                request, serializer_fields, serializer_resource,
-                                nested_resource_instance, new_included_resources
+
+                        included_key = cls.get_included_key(nested_resource_instance, new_include_tree)
+                        if new_include_tree and included_key not in included_keys:
+                            included_keys.add(included_key)
+                            included_data.extend(
+                                cls.extract_included(
+                                    request, serializer_fields, serializer_resource, nested_resource_instance,
+                                    new_include_tree, remote_includes, included_keys, fieldsets
+                                )
                             )
-                        )
 
             if isinstance(field, Serializer):
 
@@ -235,19 +280,128 @@ class JSONRenderer(renderers.JSONRenderer):
                 # Get the serializer fields
                 serializer_fields = utils.get_serializer_fields(field)
                 if serializer_data:
-                    included_data.append(
-                        cls.build_json_resource_obj(
-                            serializer_fields, serializer_data,
-                            relation_instance, relation_type, field)
-                    )
-                    included_data.extend(
-                        cls.extract_included(
-                            request, serializer_fields, serializer_data,
-                            relation_instance, new_included_resources
+                    included_key = cls.get_included_key(relation_instance)
+                    if included_key not in included_keys:
+                        included_keys.add(included_key)
+                        included_data.append(
+                            cls.build_json_resource_obj(
+                                serializer_fields, serializer_data,
+                                relation_instance, relation_type, field)
                         )
-                    )
 
-        return key_formatter()(included_data)
+                    included_key = cls.get_included_key(relation_instance, new_include_tree)
+                    if new_include_tree and included_key not in included_keys:
+                        included_keys.add(included_key)
+                        included_data.extend(
+                            cls.extract_included(
+                                request, serializer_fields, serializer_data, relation_instance,
+                                new_include_tree, remote_includes, included_keys, fieldsets
+                            )
+                        )
+
+        if top_level:
+            included_data.extend(remote_includes.fetch())
+            return key_formatter()(included_data)
+
+        return included_data
+
+    @classmethod
+    def build_cached_included(cls, request, serializer, relation_instance, included_keys):
+        """
+        Returns the resource objects that `extract_included` would build for the related objects of a leaf include
+        path, reading those it can from the fragment cache.
+        """
+        if isinstance(serializer, ListSerializer):
+            related_instances = list(relation_instance)
+        else:
+            related_instances = [relation_instance]
+
+        instances = list()
+        for instance in related_instances:
+            included_key = cls.get_included_key(instance)
+            if included_key not in included_keys:
+                included_keys.add(included_key)
+                instances.append(instance)
+
+        fields = utils.get_serializer_fields(serializer)
+        resource_name = utils.get_resource_type_from_serializer(getattr(serializer, 'child', serializer))
+        return cls.build_resource_objects(request, fields, serializer, None, instances, resource_name,
+                                          part='included')
+
+    @classmethod
+    def build_resource_objects(cls, request, fields, serializer, resources, instances, resource_name, part='data'):
+        """
+        Builds the resource objects of `instances` from their serialized `resources`, reading them from the fragment
+        cache if the serializer has one, and storing the ones that were missing. With `resources=None` only the
+        instances whose objects are missing are serialized. The objects built for `data` carry the resource meta,
+        those for `included` don't, so `part` keeps them apart in the cache.
+        """
+        child = getattr(serializer, 'child', serializer)
+
+        fragment_cache = get_fragment_cache(serializer, request) if None not in instances else None
+        if fragment_cache is not None:
+            keys = fragment_cache.make_keys(instances, part)
+            cached = fragment_cache.get_many(keys)
+        else:
+            keys = [None] * len(instances)
+            cached = dict()
+
+        resource_objects = list()
+        missing = dict()
+        for position, (instance, key) in enumerate(zip(instances, keys)):
+            resource_obj = cached.get(key)
+            if resource_obj is None:
+                resource = child.to_representation(instance) if resources is None else resources[position]
+                resource_obj = cls.build_json_resource_obj(fields, resource, instance, resource_name, serializer)
+                if part == 'data':
+                    meta = cls.extract_meta(serializer, resource)
+                    if meta:
+                        resource_obj.update({'meta': key_formatter()(meta)})
+                if key is not None:
+                    missing[key] = resource_obj
+            resource_objects.append(resource_obj)
+
+        if missing:
+            fragment_cache.set_many(missing)
+
+        return resource_objects
+
+    @classmethod
+    def includes_read_data(cls, fields, include_tree):
+        """
+        Whether `extract_included` reads the serialized data of the rows for `include_tree`, as it does for remote
+        resources and nested serializers. Local relations are serialized from the instances.
+        """
+        field_plan = cls.get_field_plan(fields)
+        return any(
+            name in field_plan.remote_relations or isinstance(fields[name], BaseSerializer)
+            for name in include_tree.names if name in field_plan.relations
+        )
+
+    @staticmethod
+    def build_included(json_api_included):
+        """
+        Returns the document's `included` list: unique by type and id, sorted, and with its keys formatted.
+        """
+        # Iterate through compound documents to remove duplicates
+        seen = set()
+        unique_compound_documents = list()
+        for included_dict in json_api_included:
+            type_tuple = tuple((included_dict['type'], included_dict['id']))
+            if type_tuple not in seen:
+                seen.add(type_tuple)
+                unique_compound_documents.append(included_dict)
+
+        # Sort the items by type then by id, formatting the keys of the whole included tree in one pass
+        return key_formatter()(sorted(unique_compound_documents, key=lambda item: (item['type'], item['id'])))
+
+    @staticmethod
+    def build_compiled_resources(builder, rows, request):
+        """
+        Builds the resource objects of `rows`, model instances or `values_list()` rows, with a builder from
+        `compiler.get_resource_builder()`.
+        """
+        return [builder(row, request) for row in rows]
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
 
@@ -280,19 +434,23 @@ class JSONRenderer(renderers.JSONRenderer):
                 data, accepted_media_type, renderer_context
             )
 
+        metrics = RenderMetrics(resource_name)
+
         json_api_data = data
         json_api_included = list()
         # initialize json_api_meta with pagination meta or an empty dict
         json_api_meta = data.get('meta', {}) if isinstance(data, dict) else {}
 
-        if data and 'results' in data:
+        # A list left unserialized by `ModelViewSet` would serialize every row if it was looked into
+        if not isinstance(data, list) and data and 'results' in data:
             serializer_data = data["results"]
         else:
             serializer_data = data
 
         serializer = getattr(serializer_data, 'serializer', None)
+        builder = getattr(serializer_data, 'builder', None)
 
-        included_resources = utils.get_included_resources(request, serializer)
+        include_tree = IncludeTree.parse(utils.get_included_resources(request, serializer))
 
         if serializer is not None:
 
@@ -302,40 +460,62 @@ class JSONRenderer(renderers.JSONRenderer):
             # Extract root meta for any type of serializer
             json_api_meta.update(self.extract_root_meta(serializer, serializer_data))
 
-            try:
-                if getattr(serializer, 'many', False):
-                    json_api_data = list()
+            # Remote resources referenced anywhere in the response are fetched together once every row is built
+            remote_includes = RemoteIncludeBatch(event_client, request)
+            included_keys = set()
+            fieldsets = get_sparse_fieldsets(request)
 
-                    for position in range(len(serializer_data)):
-                        resource = serializer_data[position]  # Get current resource
-                        resource_instance = serializer.instance[position]  # Get current instance
-
-                        json_resource_obj = self.build_json_resource_obj(
-                            fields, resource, resource_instance, resource_name, serializer,
-                        )
-                        meta = self.extract_meta(serializer, resource)
-                        if meta:
-                            json_resource_obj.update({'meta': key_formatter()(meta)})
-                        json_api_data.append(json_resource_obj)
-
-                        included = self.extract_included(request, fields, resource,
-                                                         resource_instance, included_resources)
+            try:
+                with metrics.track_queries():
+                    if builder is not None and not include_tree:
+                        with metrics.phase('resources'):
+                            json_api_data = self.build_compiled_resources(builder, serializer_data.rows, request)
+                        metrics.count('rows', len(json_api_data))
+                    elif getattr(serializer, 'many', False):
+                        resource_instances = list(serializer.instance)
+
+                        # Rows left unserialized by `ModelViewSet` are only serialized if their objects aren't in
+                        # the fragment cache, or if the includes need their data
+                        resources = serializer_data
+                        if not getattr(serializer_data, 'materialized', True) and (
+                                not self.includes_read_data(fields, include_tree)):
+                            resources = None
+
+                        with metrics.phase('resources'):
+                            json_api_data = self.build_resource_objects(
+                                request, fields, serializer, resources, resource_instances, resource_name,
+                            )
+                        metrics.count('rows', len(json_api_data))
+
+                        if include_tree:
+                            with metrics.phase('included'):
+                                for position, resource_instance in enumerate(resource_instances):
+                                    resource = resources[position] if resources is not None else dict()
+                                    included = self.extract_included(
+                                        request, fields, resource, resource_instance, include_tree, remote_includes,
+                                        included_keys, fieldsets)
+                                    if included:
+                                        json_api_included.extend(included)
+                    else:
+                        resource_instance = serializer.instance
+                        with metrics.phase('resources'):
+                            json_api_data = self.build_resource_objects(
+                                request, fields, serializer, [serializer_data], [resource_instance], resource_name,
+                            )[0]
+                        metrics.count('rows', 1)
+
+                        with metrics.phase('included'):
+                            included = self.extract_included(
+                                request, fields, serializer_data, resource_instance, include_tree, remote_includes,
+                                included_keys, fieldsets)
                         if included:
                             json_api_included.extend(included)
-                else:
-                    resource_instance = serializer.instance
-                    json_api_data = self.build_json_resource_obj(
-                        fields, serializer_data, resource_instance, resource_name, serializer,
-                    )
-
-                    meta = self.extract_meta(serializer, serializer_data)
-                    if meta:
-                        json_api_data.update({'meta': key_formatter()(meta)})
 
-                    included = self.extract_included(request, fields, serializer_data,
-                                                     resource_instance, included_resources)
-                    if included:
-                        json_api_included.extend(included)
+                    with metrics.phase('remote_includes'):
+                        json_api_included.extend(remote_includes.fetch())
+                    metrics.count('remote_calls', remote_includes.remote_calls)
+                    if remote_includes.truncated:
+                        json_api_meta['truncated_includes'] = sorted(remote_includes.truncated)
             except RemoteResourceIncludeError as e:
                 return self.render_errors(e.data, accepted_media_type)
 
@@ -352,22 +532,117 @@ class JSONRenderer(renderers.JSONRenderer):
         else:
             render_data['data'] = json_api_data
 
-        if len(json_api_included) > 0:
-            # Iterate through compound documents to remove duplicates
-            seen = set()
-            unique_compound_documents = list()
-            for included_dict in json_api_included:
-                type_tuple = tuple((included_dict['type'], included_dict['id']))
-                if type_tuple not in seen:
-                    seen.add(type_tuple)
-                    unique_compound_documents.append(included_dict)
+        if settings.DEBUG and getattr(view, 'include_cost', None):
+            json_api_meta['include_cost'] = view.include_cost
+
+        with metrics.phase('format'):
+            if len(json_api_included) > 0:
+                render_data['included'] = self.build_included(json_api_included)
+                metrics.count('included', len(render_data['included']))
+
+            if json_api_meta:
+                render_data['meta'] = key_formatter()(json_api_meta)
+
+        with metrics.phase('encode'):
+            content = super(renderers.JSONRenderer, self).render(
+                render_data, accepted_media_type, renderer_context
+            )
+
+        metrics.send()
+        return content
+
+    def render_stream(self, queryset, accepted_media_type=None, renderer_context=None, chunk_size=100,
+                      links=None, meta=None):
+        """
+        Yields the JSON API document for the rows of `queryset` in encoded chunks, for a `StreamingHttpResponse`.
+
+        Rows are read with `queryset.iterator()` and serialized `chunk_size` at a time, and each resource object is
+        yielded as soon as it is built, so memory use depends on the chunk size rather than on the number of rows.
+        The `included` objects, which can only be complete once every row has been seen, follow the data, then
+        `meta`. Since the response has already started by then, a failed remote include is reported under
+        `meta.include_errors` instead of replacing the document. Root meta from `get_root_meta()` isn't supported,
+        as it would need every row at once.
+
+        Rows are built with the compiled builder that the view's `get_resource_builder()` returns, if any.
+        """
+        view = renderer_context.get("view", None)
+        request = renderer_context.get("request", None)
+        resource_name = utils.get_resource_name(renderer_context)
+
+        def encode(obj):
+            return super(renderers.JSONRenderer, self).render(obj, accepted_media_type, renderer_context)
 
-            # Sort the items by type then by id
-            render_data['included'] = sorted(unique_compound_documents, key=lambda item: (item['type'], item['id']))
+        yield b'{'
+        if links:
+            yield b'"links":' + encode(links) + b','
+        yield b'"data":['
+
+        remote_includes = RemoteIncludeBatch(event_client, request)
+        included_keys = set()
+        fieldsets = get_sparse_fieldsets(request)
+        json_api_included = list()
+        json_api_meta = dict(meta or {})
+        include_tree = None
+
+        # Views that compile their serializer have the rows built without serializing them first
+        get_view_resource_builder = getattr(view, 'get_resource_builder', None)
+        builder = get_view_resource_builder(queryset) if get_view_resource_builder is not None else None
+        if builder is not None and builder.values is not None:
+            queryset = queryset.prefetch_related(None).values_list(*builder.values)
+
+        # `iterator()` ignores prefetch_related(), so the lookups are applied to each chunk instead
+        prefetch_lookups = queryset._prefetch_related_lookups
+        rows = queryset.iterator(chunk_size=chunk_size)
+        separator = b''
+        while True:
+            resource_instances = list(itertools.islice(rows, chunk_size))
+            if not resource_instances:
+                break
+            if prefetch_lookups:
+                prefetch_related_objects(resource_instances, *prefetch_lookups)
+
+            if builder is not None:
+                for json_resource_obj in self.build_compiled_resources(builder, resource_instances, request):
+                    yield separator + encode(json_resource_obj)
+                    separator = b','
+                continue
+
+            serializer = view.get_serializer(resource_instances, many=True)
+            if include_tree is None:
+                include_tree = IncludeTree.parse(utils.get_included_resources(request, serializer))
+
+            serializer_data = serializer.data
+            fields = utils.get_serializer_fields(serializer)
+            for resource, resource_instance in zip(serializer_data, resource_instances):
+                json_resource_obj = self.build_json_resource_obj(
+                    fields, resource, resource_instance, resource_name, serializer,
+                )
+                resource_meta = self.extract_meta(serializer, resource)
+                if resource_meta:
+                    json_resource_obj.update({'meta': key_formatter()(resource_meta)})
+
+                json_api_included.extend(self.extract_included(
+                    request, fields, resource, resource_instance, include_tree, remote_includes, included_keys,
+                    fieldsets))
+
+                yield separator + encode(json_resource_obj)
+                separator = b','
+
+        yield b']'
+
+        try:
+            json_api_included.extend(remote_includes.fetch())
+        except RemoteResourceIncludeError as e:
+            json_api_meta['include_errors'] = e.data
+        if remote_includes.truncated:
+            json_api_meta['truncated_includes'] = sorted(remote_includes.truncated)
+        if settings.DEBUG and getattr(view, 'include_cost', None):
+            json_api_meta['include_cost'] = view.include_cost
+
+        if json_api_included:
+            yield b',"included":' + encode(self.build_included(json_api_included))
 
         if json_api_meta:
-            render_data['meta'] = key_formatter()(json_api_meta)
+            yield b',"meta":' + encode(key_formatter()(json_api_meta))
 
-        return super(renderers.JSONRenderer, self).render(
-            render_data, accepted_media_type, renderer_context
-        )
+        yield b'}'
@@ -0,0 +1,18 @@
+"""
+Routers
+"""
+import copy
+
+from rest_framework import routers
+
+
+class BulkRouter(routers.DefaultRouter):
+    """
+    A `DefaultRouter` that also routes PATCH and DELETE requests to the collection, to the `bulk_update` and
+    `bulk_destroy` actions of `ModelViewSet` (see `zc_common.remote_resource.bulk`).
+    """
+    routes = copy.deepcopy(routers.DefaultRouter.routes)
+    routes[0].mapping.update({
+        'patch': 'bulk_update',
+        'delete': 'bulk_destroy',
+    })
@@ -0,0 +1,56 @@
+"""
+Singleflight
+
+Under load many threads of a worker ask other services for the same resources at the same moment, e.g. the company of
+the current user. `SingleFlight.do()` lets the first caller for a key make the call while the others wait for it
+and share its result (or its error) instead of making a round trip of their own.
+"""
+import threading
+
+from zc_common.monitoring import statsd
+
+
+class Flight(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.flights = dict()
+        self.lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Returns `func()`, calling it only if no call for `key` is already in flight.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        if not leader:
+            statsd.incr('{}.shared'.format(self.name))
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # Calls made from now on see fresh data rather than this result
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
@@ -5,32 +5,71 @@ import inflection
 from django.conf import settings
 
 
-def format_keys(obj, format_type=None):
-    if format_type is None:
-        format_type = getattr(settings, 'JSON_API_FORMAT_FIELD_NAMES', False)
+KEY_FORMATS = {
+    # inflection can't dasherize camelCase
+    'dasherize': lambda key: inflection.dasherize(inflection.underscore(key)),
+    'camelize': lambda key: inflection.camelize(key, False),
+    'capitalize': lambda key: inflection.camelize(key),
+    'underscore': lambda key: inflection.underscore(key),
+}
+
+# A service only uses a few hundred distinct key names, so their translations are memoized per format type. The
+# tables stop growing once full, which keeps keys coming from arbitrary client payloads from using up memory.
+MAX_FORMATTED_KEYS = 2000
+
+formatted_keys = dict((format_type, dict()) for format_type in KEY_FORMATS)
+
+key_formatters = dict()
+
+
+def format_key(key, format_type):
+    formatted = formatted_keys[format_type]
+    try:
+        return formatted[key]
+    except KeyError:
+        pass
+
+    formatted_key = KEY_FORMATS[format_type](key)
+    if len(formatted) < MAX_FORMATTED_KEYS:
+        formatted[key] = formatted_key
+    return formatted_key
+
 
-    if format_type in ('dasherize', 'camelize', 'underscore', 'capitalize'):
+def get_key_formatter(format_type):
+    """
+    Returns a function that copies a tree of dicts and lists in one pass, translating every dict key to
+    `format_type` through the memo table.
+    """
+    try:
+        return key_formatters[format_type]
+    except KeyError:
+        pass
+
+    formatted = formatted_keys[format_type]
+
+    def format_tree(obj):
         if isinstance(obj, dict):
-            formatted = OrderedDict()
+            formatted_obj = OrderedDict()
             for key, value in obj.items():
-                if format_type == 'dasherize':
-                    # inflection can't dasherize camelCase
-                    key = inflection.underscore(key)
-                    formatted[inflection.dasherize(key)] \
-                        = format_keys(value, format_type)
-                elif format_type == 'camelize':
-                    formatted[inflection.camelize(key, False)] \
-                        = format_keys(value, format_type)
-                elif format_type == 'capitalize':
-                    formatted[inflection.camelize(key)] \
-                        = format_keys(value, format_type)
-                elif format_type == 'underscore':
-                    formatted[inflection.underscore(key)] \
-                        = format_keys(value, format_type)
-            return formatted
+                try:
+                    formatted_key = formatted[key]
+                except KeyError:
+                    formatted_key = format_key(key, format_type)
+                formatted_obj[formatted_key] = format_tree(value)
+            return formatted_obj
         if isinstance(obj, list):
-            return [format_keys(item, format_type) for item in obj]
-        else:
-            return obj
+            return [format_tree(item) for item in obj]
+        return obj
+
+    key_formatters[format_type] = format_tree
+    return format_tree
+
+
+def format_keys(obj, format_type=None):
+    if format_type is None:
+        format_type = getattr(settings, 'JSON_API_FORMAT_FIELD_NAMES', False)
+
+    if format_type in KEY_FORMATS:
+        return get_key_formatter(format_type)(obj)
     else:
         return obj
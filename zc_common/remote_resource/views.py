@@ -1,15 +1,62 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import CharField, TextField
 from django.db.models import Model
 from django.db.models.manager import Manager
 from django.db.models.query import QuerySet
-from rest_framework import viewsets
-from rest_framework.exceptions import MethodNotAllowed
+from django.http import StreamingHttpResponse
+from rest_framework import status, viewsets
+from rest_framework.exceptions import MethodNotAllowed, ParseError
+from rest_framework.response import Response
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_json_api import utils
 from rest_framework_json_api.views import RelationshipView as OldRelView
 
+from zc_common.remote_resource.bulk import create_rows, get_error_objects, update_rows
+from zc_common.remote_resource.compiler import CompiledResourceList, get_resource_builder
+from zc_common.remote_resource.fieldsets import get_only_fields, restrict_to_sparse_fieldset
+from zc_common.remote_resource.fragment_cache import get_fragment_cache
 from zc_common.remote_resource.models import RemoteResource
+from zc_common.remote_resource.pagination import estimate_count
+from zc_common.remote_resource.include_tree import IncludeTree
+from zc_common.remote_resource.prefetch import estimate_include_cost, prefetch_included_resources
 from zc_common.remote_resource.serializers import ResourceIdentifierObjectSerializer
 
 
+# The filterable fields of each model, which `ModelViewSet.filterset_fields` would otherwise work out on every access
+model_filterset_fields = dict()
+
+
+def get_model_filterset_fields(model):
+    """
+    Returns the lookups that `filter[]` parameters can use on the fields of `model`, keyed by the field's attname
+    (`id` for the primary key).
+    """
+    return_fields = {}
+
+    fields = model._meta.get_fields()
+    for field in fields:
+        # For backwards compatibility GenericForeignKey should not be
+        # included in the results.
+        if field.is_relation and field.many_to_one and field.related_model is None:
+            continue
+        # Relations to child proxy models should not be included.
+        if (field.model != model._meta.model and
+                field.model._meta.concrete_model == model._meta.concrete_model):
+            continue
+
+        name = field.attname if hasattr(field, 'attname') else field.name
+        if hasattr(field, 'primary_key') and field.primary_key:
+            return_fields['id'] = ['in', 'exact']
+        elif CharField in field.__class__.__mro__ or TextField in field.__class__.__mro__:
+            return_fields[name] = ['icontains', 'exact']
+        else:
+            return_fields[name] = ['exact']
+
+    return return_fields
+
+
 class ModelViewSet(viewsets.ModelViewSet):
     """
     This class overwrites the ModelViewSet's list method, which handles
@@ -21,33 +68,341 @@ class ModelViewSet(viewsets.ModelViewSet):
     It's also possible to filter by a collection of primary keys, for example:
     /collection?filter[id__in]=1,2,3
     Requests to filter on keys that do not exist will return an empty set.
+
+    The filtered queryset also gets the `select_related`/`prefetch_related` calls needed to render the
+    resources named in the `include` query parameter; set `prefetch_includes = False` to opt out.
+
+    Requests whose `include` parameter goes deeper than `INCLUDE_MAX_DEPTH` relations, or is estimated to cost more
+    than `INCLUDE_COST_BUDGET` to render, are turned down with a 400 (see `check_include_cost`).
+
+    Reads honour sparse fieldsets (`fields[TYPE]=...`): the serializer drops the fields that weren't requested, and
+    the queryset only loads the columns the remaining ones need. Set `defer_unrequested_fields = False` to load
+    every column anyway.
+
+    Views serving large pages or exports can set `stream_list_responses = True` to have the list response
+    streamed, reading `stream_chunk_size` rows from the database at a time (see `JSONRenderer.render_stream`).
+
+    With `compile_serializers = True`, list responses that include nothing have their resource objects built by a
+    function generated for the serializer (see `zc_common.remote_resource.compiler`) instead of going through
+    `serializer.data`. Serializers that can't be compiled are rendered as usual. `render_from_values = True` goes
+    further for read-only exports: rows are fetched with `values_list()` and built without creating model instances.
+    List responses of serializers using the fragment cache (see `zc_common.remote_resource.fragment_cache`) only
+    serialize the rows whose resource objects aren't cached.
+
+    With `bulk_writes = True`, up to `bulk_max_items` resource objects can be created, updated or deleted in one
+    request by sending an array as `data` to the collection (see `zc_common.remote_resource.bulk`); PATCH and DELETE
+    on the collection are routed by `zc_common.remote_resource.routers.BulkRouter`.
     """
+    prefetch_includes = True
+    defer_unrequested_fields = True
+    stream_list_responses = False
+    stream_chunk_size = 100
+    compile_serializers = False
+    render_from_values = False
+    bulk_writes = False
+    bulk_max_items = 1000
+    bulk_batch_size = None
 
     @property
     def filterset_fields(self):
-        queryset = self.get_queryset()
-        return_fields = {}
-
-        fields = queryset.model._meta.get_fields()
-        for field in fields:
-            # For backwards compatibility GenericForeignKey should not be
-            # included in the results.
-            if field.is_relation and field.many_to_one and field.related_model is None:
-                continue
-            # Relations to child proxy models should not be included.
-            if (field.model != queryset.model._meta.model and
-                    field.model._meta.concrete_model == queryset.model._meta.concrete_model):
+        model = self.get_queryset().model
+        try:
+            return_fields = model_filterset_fields[model]
+        except KeyError:
+            return_fields = model_filterset_fields[model] = get_model_filterset_fields(model)
+
+        return dict((name, list(lookups)) for name, lookups in return_fields.items())
+
+    def filter_queryset(self, queryset):
+        queryset = super(ModelViewSet, self).filter_queryset(queryset)
+
+        if isinstance(queryset, QuerySet):
+            serializer_class = self.get_serializer_class()
+            include_tree = IncludeTree.parse(utils.get_included_resources(self.request, serializer_class))
+            if include_tree:
+                self.check_include_cost(queryset, serializer_class, include_tree)
+
+            if self.prefetch_includes:
+                queryset = prefetch_included_resources(
+                    queryset, serializer_class, include_tree, self.get_serializer_context())
+
+        if self.defer_unrequested_fields and self.request.method in SAFE_METHODS and isinstance(queryset, QuerySet):
+            queryset = self.defer_fields(queryset)
+
+        return queryset
+
+    def check_include_cost(self, queryset, serializer_class, included_resources):
+        """
+        Raises a `ParseError` if `included_resources` (a list of paths or an `IncludeTree`) go deeper than
+        `INCLUDE_MAX_DEPTH`, or if rendering them is estimated to cost more than `INCLUDE_COST_BUDGET`. The cost is
+        the number of included objects to build, plus `INCLUDE_QUERY_COST` for every query and
+        `INCLUDE_REMOTE_CALL_COST` for every remote call. With `DEBUG` on the estimate is kept as `include_cost`,
+        which the renderer adds to `meta`. Unpaginated lists are only checked where the planner can estimate their
+        rows (PostgreSQL), rather than paying for a `COUNT(*)`.
+        """
+        include_tree = IncludeTree.parse(included_resources)
+
+        max_depth = getattr(settings, 'INCLUDE_MAX_DEPTH', None)
+        if max_depth is not None and include_tree.depth > max_depth:
+            raise ParseError('Include paths may be at most {} relations deep'.format(max_depth))
+
+        budget = getattr(settings, 'INCLUDE_COST_BUDGET', None)
+        if budget is None and not settings.DEBUG:
+            return
+
+        rows = self.get_estimated_rows(queryset)
+        if rows is None:
+            return
+
+        cost = estimate_include_cost(
+            queryset.model, serializer_class, include_tree, rows, self.get_serializer_context())
+        cost['rows'] = rows
+        cost['total'] = (cost['objects'] +
+                         cost['queries'] * getattr(settings, 'INCLUDE_QUERY_COST', 10) +
+                         cost['remote_calls'] * getattr(settings, 'INCLUDE_REMOTE_CALL_COST', 100))
+
+        if settings.DEBUG:
+            self.include_cost = cost
+
+        if budget is not None and cost['total'] > budget:
+            raise ParseError('The include parameter is estimated to cost {}, over the budget of {}'.format(
+                cost['total'], budget))
+
+    def get_estimated_rows(self, queryset):
+        """
+        Returns the number of rows the response is expected to hold, without counting them: one for a single object,
+        the page size for a page, PostgreSQL's planner estimate otherwise, and None on other databases.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            return 1
+
+        get_page_size = getattr(self.paginator, 'get_page_size', None)
+        page_size = get_page_size(self.request) if get_page_size else None
+        return page_size or estimate_count(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(ModelViewSet, self).get_serializer(*args, **kwargs)
+        if self.request.method in SAFE_METHODS:
+            included_resources = utils.get_included_resources(self.request, serializer)
+            restrict_to_sparse_fieldset(serializer, self.request, included_resources)
+        return serializer
+
+    def defer_fields(self, queryset):
+        """
+        Narrows `queryset` to the columns read by the fields of the request's sparse fieldset.
+        """
+        deferred_fields, defer = queryset.query.deferred_loading
+        if deferred_fields or not defer:
+            # The view already chose which columns to load
+            return queryset
+
+        serializer = self.get_serializer()
+        if getattr(serializer, 'sparse_fieldset', None) is None:
+            return queryset
+
+        only_fields = get_only_fields(queryset.model, serializer)
+        if only_fields is None:
+            return queryset
+
+        # Django refuses to defer a foreign key that is followed with select_related()
+        if isinstance(queryset.query.select_related, dict):
+            only_fields.extend(name for name in queryset.query.select_related if name not in only_fields)
+
+        return queryset.only(*only_fields)
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if self.stream_list_responses and hasattr(renderer, 'render_stream'):
+            return self.stream_list(request, *args, **kwargs)
+        if not hasattr(renderer, 'build_compiled_resources'):
+            return super(ModelViewSet, self).list(request, *args, **kwargs)
+
+        # Rows whose resource objects are in the fragment cache are left for the renderer not to serialize
+        fragment_cached = get_fragment_cache(self.get_serializer(), request) is not None
+        if not (self.compile_serializers or self.render_from_values or fragment_cached):
+            return super(ModelViewSet, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        builder = self.get_resource_builder(queryset)
+
+        rows = queryset
+        if builder is not None and builder.values is not None:
+            rows = queryset.prefetch_related(None).values_list(*builder.values)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            rows = page
+
+        if builder is None and not fragment_cached:
+            data = self.get_serializer(rows, many=True).data
+        else:
+            instances = rows
+            if builder is not None and builder.values is not None:
+                # Only loaded if something other than the renderer reads the serializer's data
+                instances = queryset if page is None else queryset.filter(pk__in=[row[0] for row in rows])
+            data = CompiledResourceList(self.get_serializer(instances, many=True), builder, rows)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_resource_builder(self, queryset):
+        """
+        Returns the builder compiled for the serializer (see `zc_common.remote_resource.compiler`), or None if the
+        view doesn't compile it, related resources are to be included or the serializer can't be compiled. With
+        `render_from_values` a builder reading `values_list()` rows is tried first.
+        """
+        if not (self.compile_serializers or self.render_from_values):
+            return None
+
+        serializer = self.get_serializer()
+        if utils.get_included_resources(self.request, serializer):
+            return None
+
+        builder = None
+        if self.render_from_values and getattr(getattr(serializer, 'Meta', None), 'model', None) is queryset.model:
+            builder = get_resource_builder(serializer, values=True)
+        if builder is None:
+            builder = get_resource_builder(serializer)
+        return builder
+
+    def stream_list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        queryset = self.filter_queryset(self.get_queryset())
+
+        links = None
+        meta = None
+        if self.paginator is not None:
+            if not hasattr(self.paginator, 'get_page_queryset'):
+                return super(ModelViewSet, self).list(request, *args, **kwargs)
+
+            page_queryset = self.paginator.get_page_queryset(queryset, request, view=self)
+            if page_queryset is not None:
+                queryset = page_queryset
+                links = self.paginator.get_pagination_links()
+                meta = self.paginator.get_pagination_meta()
+
+        content_type = request.accepted_media_type
+        if renderer.charset:
+            content_type = '{}; charset={}'.format(content_type, renderer.charset)
+
+        return StreamingHttpResponse(
+            renderer.render_stream(queryset, request.accepted_media_type, self.get_renderer_context(),
+                                   self.stream_chunk_size, links, meta),
+            content_type=content_type,
+        )
+
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request, *args, **kwargs)
+        return super(ModelViewSet, self).create(request, *args, **kwargs)
+
+    def bulk_create(self, request, *args, **kwargs):
+        self.check_bulk_request(request)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(get_error_objects(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            self.perform_bulk_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_bulk_create(self, serializer):
+        create_rows(serializer, self.bulk_batch_size)
+
+    def bulk_update(self, request, *args, **kwargs):
+        self.check_bulk_request(request)
+
+        instances, errors = self.get_bulk_instances(request.data)
+        serializers = list()
+        for index, (resource, instance) in enumerate(zip(request.data, instances)):
+            if instance is None:
                 continue
+            serializer = self.get_serializer(instance, data=resource, partial=True)
+            if serializer.is_valid():
+                serializers.append(serializer)
+            else:
+                errors[index] = serializer.errors
+
+        if any(errors):
+            return Response(get_error_objects(errors), status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            instances = self.perform_bulk_update(serializers)
+        return Response(self.get_serializer(instances, many=True).data)
+
+    def perform_bulk_update(self, serializers):
+        return update_rows(serializers, self.bulk_batch_size)
+
+    def bulk_destroy(self, request, *args, **kwargs):
+        self.check_bulk_request(request)
+
+        instances, errors = self.get_bulk_instances(request.data)
+        if any(errors):
+            return Response(get_error_objects(errors), status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            self.perform_bulk_destroy(instances)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def perform_bulk_destroy(self, instances):
+        # `delete()` still sends `post_delete` for every row, which invalidates the fragment cache
+        self.get_queryset().model._default_manager.filter(pk__in=[instance.pk for instance in instances]).delete()
+
+    def check_bulk_request(self, request):
+        if not self.bulk_writes:
+            raise ParseError('This endpoint only accepts one resource object at a time')
+        if not isinstance(request.data, list):
+            raise ParseError('Received data is not an array of JSONAPI Resource Objects')
+        if len(request.data) > self.bulk_max_items:
+            raise ParseError('At most {} resource objects can be sent at a time'.format(self.bulk_max_items))
+
+    def get_bulk_instances(self, resources):
+        """
+        Looks up the instances that `resources` identify, the way `get_object()` does for one, in a single query.
+        Returns them, None for the resources that can't be found or that repeat an earlier id, and a list of the
+        errors of each resource.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        pk_field = queryset.model._meta.pk
+
+        pks = list()
+        seen = set()
+        errors = list()
+        for resource in resources:
+            pk = None
+            item_errors = dict()
+            if resource.get('id') is None:
+                item_errors['id'] = ['This field is required.']
+            else:
+                try:
+                    pk = pk_field.to_python(resource['id'])
+                except ValidationError:
+                    item_errors['id'] = ['Invalid id "{}".'.format(resource['id'])]
+                else:
+                    if pk in seen:
+                        item_errors['id'] = ['Duplicate id "{}".'.format(resource['id'])]
+                        pk = None
+                    else:
+                        seen.add(pk)
+            pks.append(pk)
+            errors.append(item_errors)
+
+        found = queryset.in_bulk([pk for pk in pks if pk is not None])
 
-            name = field.attname if hasattr(field, 'attname') else field.name
-            if hasattr(field, 'primary_key') and field.primary_key:
-                return_fields['id'] = ['in', 'exact']
-            elif CharField in field.__class__.__mro__ or TextField in field.__class__.__mro__:
-                return_fields[name] = ['icontains', 'exact']
+        instances = list()
+        for index, pk in enumerate(pks):
+            instance = found.get(pk)
+            if instance is None:
+                if pk is not None:
+                    errors[index]['id'] = ['Not found.']
             else:
-                return_fields[name] = ['exact']
+                self.check_object_permissions(self.request, instance)
+            instances.append(instance)
 
-        return return_fields
+        return instances, errors
 
     def has_ids_query_params(self):
         return hasattr(self.request, 'query_params') and 'filter[id__in]' in self.request.query_params